@@ -0,0 +1 @@
+ZYNC_URL = "http://127.0.0.1:1"
@@ -0,0 +1,185 @@
+"""
+Local HTTP servers for the tests: a generic one for httplib2, and a
+stand-in for the ZYNC web API.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import StringIO
+import gzip
+import json
+import socket
+import threading
+import time
+import urlparse
+import zlib
+
+def lines(n):
+    return ''.join('line %d of data\n' % i for i in xrange(n))
+
+def gzipped(data):
+    f = StringIO.StringIO()
+    g = gzip.GzipFile(fileobj=f, mode='wb')
+    g.write(data)
+    g.close()
+    return f.getvalue()
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread,
+            args=(request, client_address))
+        thread.daemon = True
+        self.requests[request] = thread
+        thread.start()
+
+    def shutdown_request(self, request):
+        self.requests.pop(request, None)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def handle_error(self, request, client_address):
+        pass
+
+    def stop(self):
+        """
+        Stops serving and drops the connections clients have open.
+        """
+        self.shutdown()
+        self.server_close()
+        for request, thread in self.requests.items():
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join(1)
+
+def _start(handler, port=0):
+    server = _Server(('127.0.0.1', port), handler)
+    server.requests = {}
+    server.log = []
+    server.delay = 0
+    # The most requests handled at once, to check clients' serialization.
+    server.active = server.max_active = 0
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:%d' % server.server_address[1]
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body, status=200, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(url.query)
+        data = ''
+        if self.command == 'POST':
+            data = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.log.append((self.command, url.path, query, self.headers.get('cookie'), data))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            if self.server.delay:
+                time.sleep(self.server.delay)
+            self.route(url.path, query, data)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    do_HEAD = do_POST = do_GET
+
+class HTTPHandler(_Handler):
+    def route(self, path, query, data):
+        n = int(query.get('n', ['1000'])[0])
+        if path == '/auth' and not self.headers.get('authorization'):
+            return self.reply('', 401, [('WWW-Authenticate', 'Basic realm="test"')])
+        if path == '/temporary':
+            return self.reply('', 307, [('Location', '/plain')])
+        if self.command == 'POST':
+            return self.reply('got %d' % len(data))
+        if path == '/close':
+            self.close_connection = 1
+            return self.reply(lines(n), headers=[('Connection', 'close')])
+        if path == '/redirect':
+            return self.reply('', 302, [('Location', '/plain')])
+        if path == '/status':
+            return self.reply('<html>error</html>', int(query['code'][0]))
+        if path == '/sleep':
+            time.sleep(float(query.get('t', ['1'])[0]))
+        if path == '/gzip':
+            return self.reply(gzipped(lines(n)), headers=[('Content-Encoding', 'gzip')])
+        if path == '/deflate':
+            return self.reply(zlib.compress(lines(n)), headers=[('Content-Encoding', 'deflate')])
+        if path == '/rawdeflate':
+            # Deflate without the zlib header, as some servers send it.
+            return self.reply(zlib.compress(lines(n))[2:-4], headers=[('Content-Encoding', 'deflate')])
+        if path == '/gzipmembers':
+            # The first half and the second half as separate gzip members.
+            data = lines(n)
+            return self.reply(gzipped(data[:len(data) // 2]) + gzipped(data[len(data) // 2:]),
+                headers=[('Content-Encoding', 'gzip')])
+        if path == '/badgzip':
+            return self.reply('not gzip at all', headers=[('Content-Encoding', 'gzip')])
+        if path == '/cached':
+            return self.reply(lines(n), headers=[('Cache-Control', 'max-age=300'), ('ETag', '"abc"')])
+        return self.reply(lines(n))
+
+class ZyncHandler(_Handler):
+    def route(self, path, query, data):
+        status = self.server.fail.get(path, getattr(self.server, 'status', 200))
+        if status != 200:
+            return self.reply('<html>%d</html>' % (status,), status)
+        if path in self.server.bodies:
+            return self.reply(self.server.bodies[path])
+        if path == '/validate.php':
+            return self.reply(json.dumps({'code': 0, 'response': 'ok'}), headers=[('Set-Cookie', 'session=abc')])
+        if path == '/lib/submit_job_v2.php':
+            return self.reply(json.dumps({'code': 0, 'response': 4242}))
+        if path == '/lib/set_job_status.php':
+            return self.reply(json.dumps({'code': 0, 'response': 'ok'}))
+        if path == '/lib/get_project_name.php':
+            return self.reply(json.dumps('proj_%s' % (query.get('file', [''])[0].split('/')[-1],)))
+        if path == '/lib/get_jobs.php':
+            return self.reply(json.dumps([{'id': 1}]))
+        if path == '/lib/get_project_list.php':
+            return self.reply(json.dumps([{'name': 'p'}]))
+        if path == '/lib/check_server.php':
+            return self.reply('up')
+        if path == '/lib/get_instance_types.php':
+            return self.reply(json.dumps({'code': 0, 'response': {'ZYNC16': {'cost': 1.0}}}))
+        if path.startswith('/lib/'):
+            return self.reply(json.dumps({'code': 0, 'response': []}))
+        return self.reply('<html>zync</html>')
+
+def start_http(port=0):
+    """
+    Starts the generic server, returning it and its base URL.
+    """
+    return _start(HTTPHandler, port)
+
+def start_zync(port=0):
+    """
+    Starts the ZYNC stand-in, returning it and its base URL. Set the
+    server's status to make every request fail with it, add a path and
+    status to its fail dict to make requests for that path fail, or a
+    path and body to its bodies dict to answer with that instead.
+    """
+    server, url = _start(ZyncHandler, port)
+    server.fail = {}
+    server.bodies = {}
+    return server, url
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from zync_lib import fingerprint
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.directory, 'cache', 'fingerprints.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data):
+        path = os.path.join(self.directory, name)
+        f = open(path, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        return path
+
+    def test_hash_file(self):
+        for data in ['', 'abc', os.urandom(100000)]:
+            path = self.write('file', data)
+            self.assertEqual(fingerprint.hash_file(path), hashlib.sha1(data).hexdigest())
+
+    def test_windows(self):
+        data = os.urandom(3 * 4096 + 17)
+        path = self.write('file', data)
+        size = fingerprint.WINDOW_SIZE
+        fingerprint.WINDOW_SIZE = 4096
+        try:
+            self.assertEqual(fingerprint.hash_file(path), hashlib.sha1(data).hexdigest())
+        finally:
+            fingerprint.WINDOW_SIZE = size
+
+    def test_fingerprint(self):
+        a = self.write('a', 'aaa')
+        b = self.write('b', 'bbb')
+        missing = os.path.join(self.directory, 'missing')
+        manifest = fingerprint.fingerprint([a, b, a, missing], workers=2)
+        self.assertEqual(len(manifest), 2)
+        self.assertTrue(a in manifest)
+        self.assertEqual(manifest.digest(b), hashlib.sha1('bbb').hexdigest())
+        self.assertEqual(manifest.missing, [missing])
+
+    def test_cache(self):
+        a = self.write('a', 'aaa')
+        first = fingerprint.fingerprint([a], cache_path=self.cache_path)
+        self.assertTrue(os.path.exists(self.cache_path))
+        hash_file = fingerprint.hash_file
+        fingerprint.hash_file = None
+        try:
+            second = fingerprint.fingerprint([a], cache_path=self.cache_path)
+        finally:
+            fingerprint.hash_file = hash_file
+        self.assertEqual(second.digests(), first.digests())
+        #
+        #   A changed size means the file is hashed again.
+        #
+        self.write('a', 'changed')
+        third = fingerprint.fingerprint([a], cache_path=self.cache_path)
+        self.assertEqual(third.digest(a), hashlib.sha1('changed').hexdigest())
+
+    def test_load_bad_cache(self):
+        path = self.write('cache.json', 'not json')
+        self.assertEqual(len(fingerprint.Manifest.load(path)), 0)
+        self.assertEqual(len(fingerprint.Manifest.load(os.path.join(self.directory, 'nothing'))), 0)
+
+    def test_save_load(self):
+        manifest = fingerprint.Manifest({'a': (3, 1.5, 'abc')}, ['b'])
+        manifest.save(self.cache_path)
+        loaded = fingerprint.Manifest.load(self.cache_path)
+        self.assertEqual(loaded.entries, {u'a': (3, 1.5, u'abc')})
+        self.assertEqual(os.listdir(os.path.dirname(self.cache_path)), ['fingerprints.json'])
+
+    def test_diff(self):
+        old = fingerprint.Manifest({'a': (1, 0, 'x'), 'b': (1, 0, 'y'), 'c': (1, 0, 'z')})
+        new = fingerprint.Manifest({'a': (1, 0, 'x'), 'b': (1, 0, 'changed'), 'd': (1, 0, 'w')})
+        self.assertEqual(new.diff(old), (['d'], ['c'], ['b']))
+
+    def test_attach(self):
+        manifest = fingerprint.Manifest({'a': (1, 0, 'x')})
+        params = fingerprint.attach({'scene_info': {'files': ['a']}}, manifest)
+        self.assertEqual(params['scene_info']['files'], ['a'])
+        self.assertEqual(params['scene_info']['manifest'], {'algorithm': 'sha1', 'files': {'a': 'x'}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import random
+import unittest
+
+from zync_lib import frange
+from zync_lib.frange import FrameRange
+
+class ParseTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(frange.parse('1-24,30-40x2'), [(1, 24, 1), (30, 40, 2)])
+        self.assertEqual(frange.parse('1-11x3'), [(1, 10, 3)])
+        self.assertEqual(frange.parse('1-9', step=2), [(1, 9, 2)])
+        self.assertEqual(frange.parse('-5--1 3'), [(-5, -1, 1), (3, 3, 1)])
+
+    def test_invalid(self):
+        for expr in ['1-', 'a', '10-1', '1-10x0']:
+            self.assertRaises(ValueError, frange.parse, expr)
+            self.assertRaises(ValueError, FrameRange, expr)
+
+    def test_empty(self):
+        for expr in ['', '   ', ',', ' , ']:
+            self.assertRaises(ValueError, FrameRange, expr)
+
+class FrameRangeTest(unittest.TestCase):
+    def test_merges(self):
+        self.assertEqual(str(FrameRange('1-5,6-10, 20')), '1-10,20')
+        self.assertEqual(str(FrameRange('1-10x2,2-10x2')), '1-10')
+        self.assertEqual(str(FrameRange('1-10,5-15')), '1-15')
+        self.assertEqual(str(FrameRange('1-100', step=4)), '1-97x4')
+
+    def test_frames(self):
+        r = FrameRange('1-24,30-40x2')
+        self.assertEqual(len(r), 30)
+        self.assertEqual(list(r), range(1, 25) + range(30, 41, 2))
+        self.assertEqual(list(r.frames()), list(r))
+        self.assertTrue(32 in r)
+        self.assertFalse(31 in r)
+        self.assertEqual((r.first(), r.last()), (1, 40))
+
+    def test_chunks(self):
+        r = FrameRange('1-24,30-40x2')
+        self.assertEqual(r.chunks(10), [(1, 10), (11, 20), (21, 24)] + [(f, f) for f in range(30, 41, 2)])
+        self.assertEqual(r.num_chunks(10), 9)
+        self.assertEqual(FrameRange('1-1000000').num_chunks(7), 142858)
+
+class CompressTest(unittest.TestCase):
+    def test_compress(self):
+        self.assertEqual(frange.compress([1, 2, 3, 5, 7, 9, 20]), '1-3,5-9x2,20')
+        self.assertEqual(frange.compress([9, 1, 3, 3]), '1,3,9')
+        self.assertEqual(frange.compress([1, 3, 5, 6, 7]), '1-5x2,6-7')
+        self.assertEqual(frange.compress([1, 2, 4, 6, 8]), '1-2,4-8x2')
+        self.assertEqual(frange.compress([5]), '5')
+        self.assertEqual(frange.compress([]), '')
+
+    def test_round_trip(self):
+        rng = random.Random(41)
+        for i in range(300):
+            frames = rng.sample(range(200), rng.randint(1, 60))
+            self.assertEqual(list(FrameRange(frange.compress(frames)).frames()), sorted(frames))
+
+    def test_large(self):
+        r = FrameRange('1-500000,500010-900000x3')
+        self.assertEqual(frange.compress(r.frames()), str(r))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+import unittest
+
+from zync_lib import futures
+
+class FutureTest(unittest.TestCase):
+    def test_result(self):
+        future = futures.Future()
+        self.assertFalse(future.done())
+        self.assertRaises(futures.TimeoutError, future.result, 0.01)
+        future.set_result(5)
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(), 5)
+        self.assertEqual(future.exception(), None)
+
+    def test_exception(self):
+        future = futures.Future()
+        try:
+            raise KeyError('x')
+        except KeyError:
+            future.set_exception(sys.exc_info())
+        self.assertRaises(KeyError, future.result)
+        self.assertTrue(isinstance(future.exception(), KeyError))
+
+    def test_callbacks_go_through_dispatcher(self):
+        dispatched = []
+        future = futures.Future(lambda function, *args: dispatched.append((function, args)))
+        called = []
+        future.add_done_callback(called.append)
+        future.set_result(1)
+        future.add_done_callback(called.append)
+        self.assertEqual(called, [])
+        for function, args in dispatched:
+            function(*args)
+        self.assertEqual(called, [future, future])
+
+    def test_broken_callback(self):
+        future = futures.Future()
+        excepthook, sys.excepthook = sys.excepthook, lambda *exc_info: None
+        try:
+            future.add_done_callback(lambda future: 1 / 0)
+            called = []
+            future.add_done_callback(called.append)
+            future.set_result(1)
+        finally:
+            sys.excepthook = excepthook
+        self.assertEqual(called, [future])
+
+    def test_chain(self):
+        source, target = futures.Future(), futures.Future()
+        futures.chain(source, target)
+        source.set_result('done')
+        self.assertEqual(target.result(0), 'done')
+
+class SerialExecutorTest(unittest.TestCase):
+    def test_runs_in_order_on_one_thread(self):
+        executor = futures.SerialExecutor()
+        order = []
+        threads = set()
+        def call(n):
+            time.sleep(0.01)
+            order.append(n)
+            threads.add(threading.current_thread())
+            return n * 2
+        submitted = [executor.submit(call, (n,)) for n in range(5)]
+        executor.wait()
+        self.assertEqual(order, range(5))
+        self.assertEqual([future.result(0) for future in submitted], [0, 2, 4, 6, 8])
+        self.assertEqual(len(threads), 1)
+        self.assertFalse(threading.current_thread() in threads)
+
+    def test_is_current(self):
+        executor = futures.SerialExecutor()
+        self.assertFalse(executor.is_current())
+        self.assertTrue(executor.submit(executor.is_current).result(1))
+
+    def test_errors(self):
+        executor = futures.SerialExecutor()
+        future = executor.submit(lambda: {}['missing'])
+        self.assertTrue(isinstance(future.exception(1), KeyError))
+        self.assertEqual(executor.submit(lambda x, y=0: x + y, (1,), {'y': 2}).result(1), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import email.Utils
+import mmap
+import shutil
+import tempfile
+import unittest
+
+from zync_lib import httplib2
+from zync_lib.httplib2 import caches
+from tests import servers
+
+class TrackedFileCache(httplib2.FileCache):
+    def __init__(self, *args):
+        httplib2.FileCache.__init__(self, *args)
+        self.buffers = []
+
+    def get_buffer(self, key):
+        value = httplib2.FileCache.get_buffer(self, key)
+        if isinstance(value, mmap.mmap):
+            self.buffers.append(value)
+        return value
+
+class CacheEntryTest(unittest.TestCase):
+    def test_round_trip(self):
+        info = {'status': '200', 'etag': '"x"', u'content-type': u'text/plain'}
+        entry = httplib2._CacheEntry(httplib2._packCacheEntry(info, 'body'))
+        self.assertEqual(entry.info, {'status': '200', 'etag': '"x"', 'content-type': 'text/plain'})
+        self.assertEqual(entry.body(), 'body')
+
+    def test_truncated(self):
+        data = httplib2._packCacheEntry({'status': '200', 'etag': '"x"'}, 'body')
+        for length in (3, httplib2._CACHE_ENTRY_HEADER.size, len(data) - 8):
+            self.assertRaises(Exception, httplib2._CacheEntry, data[:length])
+
+    def test_other_version(self):
+        data = httplib2._packCacheEntry({'status': '200'}, 'body')
+        data = data[:4] + chr(1) + data[5:]
+        self.assertRaises(ValueError, httplib2._CacheEntry, data)
+
+    def test_rfc822_entry(self):
+        entry = httplib2._CacheEntry('status: 200\r\nETag: "x"\r\n\r\nbody')
+        self.assertEqual(entry.info, {'status': '200', 'etag': '"x"'})
+        self.assertEqual(entry.body(), 'body')
+
+    def test_corrupt_headers(self):
+        headers = 'status\x00200\x00orphan'
+        data = httplib2._CACHE_ENTRY_HEADER.pack(httplib2.CACHE_ENTRY_MAGIC,
+            httplib2.CACHE_ENTRY_VERSION, 0, len(headers)) + headers
+        self.assertRaises(ValueError, httplib2._CacheEntry, data)
+
+class CachedRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_hit(self, http, path):
+        response, content = http.request(self.base + path)
+        self.assertFalse(response.fromcache)
+        response, cached = http.request(self.base + path)
+        self.assertTrue(response.fromcache)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response['etag'], '"abc"')
+        self.assertEqual(cached, content)
+
+    def test_file_cache_closes_mapped_entries(self):
+        cache = TrackedFileCache(self.directory)
+        self.check_hit(httplib2.Http(cache=cache), '/cached?n=30000')
+        self.assertEqual(len(cache.buffers), 1)
+        self.assertRaises(ValueError, cache.buffers[0].read, 1)
+
+    def test_corrupt_file_entry_is_refetched(self):
+        http = httplib2.Http(cache=self.directory)
+        http.request(self.base + '/cached?n=5')
+        key = self.base + '/cached?n=5'
+        http.cache.set(key, http.cache.get(key)[:30])
+        response, content = http.request(key)
+        self.assertFalse(response.fromcache)
+        self.assertEqual(content, servers.lines(5))
+
+    def test_legacy_entry(self):
+        http = httplib2.Http(cache=caches.MemoryCache())
+        http.cache.set(self.base + '/legacy', 'status: 200\r\ncache-control: max-age=100\r\n'
+            'date: %s\r\ncontent-type: text/plain\r\n\r\nlegacy body' % (email.Utils.formatdate(usegmt=True),))
+        response, content = http.request(self.base + '/legacy')
+        self.assertTrue(response.fromcache)
+        self.assertEqual(content, 'legacy body')
+
+    def test_memory_cache(self):
+        self.check_hit(httplib2.Http(cache=caches.MemoryCache()), '/cached?n=10')
+
+    def test_lru_file_cache(self):
+        self.check_hit(httplib2.Http(cache=caches.LRUFileCache(self.directory, compress=True)), '/cached?n=10')
+
+    def test_sqlite_cache(self):
+        cache = caches.SQLiteCache(self.directory + '/cache.db')
+        try:
+            self.check_hit(httplib2.Http(cache=cache), '/cached?n=10')
+        finally:
+            cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from zync_lib.httplib2 import caches
+
+class BackendTests(object):
+    """
+    Checks every backend makes: mix in with a make_cache(max_bytes).
+    """
+    def test_get_set_delete(self):
+        cache = self.make_cache(1000)
+        self.assertEqual(cache.get('a'), None)
+        cache.set('a', 'one')
+        self.assertEqual(cache.get('a'), 'one')
+        cache.set('a', 'two')
+        self.assertEqual(cache.get('a'), 'two')
+        cache.delete('a')
+        self.assertEqual(cache.get('a'), None)
+        cache.delete('a')
+
+    def test_binary(self):
+        cache = self.make_cache(1000)
+        value = ''.join(chr(i) for i in xrange(256))
+        cache.set('b', value)
+        self.assertEqual(cache.get('b'), value)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_cache(100)
+        cache.set('old', 'x' * 40)
+        cache.set('used', 'x' * 40)
+        self.touch(cache, 'used')
+        cache.set('new', 'x' * 40)
+        self.assertEqual(cache.get('old'), None)
+        self.assertEqual(cache.get('used'), 'x' * 40)
+        self.assertEqual(cache.get('new'), 'x' * 40)
+
+    def touch(self, cache, key):
+        cache.get(key)
+
+class MemoryCacheTest(BackendTests, unittest.TestCase):
+    def make_cache(self, max_bytes):
+        return caches.MemoryCache(max_bytes)
+
+    def test_too_big(self):
+        cache = caches.MemoryCache(10)
+        cache.set('a', 'small')
+        cache.set('a', 'x' * 20)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.size, 0)
+
+    def test_stats(self):
+        cache = caches.MemoryCache(100)
+        cache.set('a', 'abc')
+        cache.get('a')
+        cache.get('missing')
+        stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['size'], stats['hits'], stats['misses']), (1, 3, 1, 1))
+        self.assertEqual(cache.stats('a')['hits'], 1)
+        self.assertEqual(cache.stats('missing'), None)
+        cache.clear()
+        self.assertEqual(cache.stats()['entries'], 0)
+
+class LRUFileCacheTest(BackendTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_cache(self, max_bytes, compress=False):
+        return caches.LRUFileCache(self.directory, max_bytes, compress)
+
+    def touch(self, cache, key):
+        # Access times only have a second's resolution on some
+        # filesystems, so age the other entries instead.
+        past = time.time() - 1000
+        for mtime, size, path in cache._entries():
+            if path != cache._path(key):
+                os.utime(path, (past, past))
+
+    def test_compress(self):
+        cache = self.make_cache(None, compress=True)
+        cache.set('a', 'x' * 10000)
+        self.assertEqual(cache.get('a'), 'x' * 10000)
+        self.assertTrue(os.path.getsize(cache._path('a')) < 1000)
+
+    def test_unicode_key(self):
+        cache = self.make_cache(1000)
+        cache.set(u'caf\xe9', 'value')
+        self.assertEqual(cache.get(u'caf\xe9'), 'value')
+
+    def test_usage(self):
+        cache = self.make_cache(1000)
+        cache.set('a', 'abc')
+        cache.set('b', 'defg')
+        cache.delete('a')
+        self.assertEqual(cache._read_usage(), len('rdefg'))
+
+class SQLiteCacheTest(BackendTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        shutil.rmtree(self.directory)
+
+    def make_cache(self, max_bytes, **kwargs):
+        cache = caches.SQLiteCache(os.path.join(self.directory, 'cache.db'), max_bytes, **kwargs)
+        self.caches.append(cache)
+        return cache
+
+    def touch(self, cache, key):
+        past = time.time() - 1000
+        cache._db().execute('UPDATE entries SET accessed = ? WHERE key != ?', (past, key))
+
+    def test_ttl(self):
+        cache = self.make_cache(1000, ttl=-1)
+        cache.set('a', 'value')
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.expire(), 1)
+        self.assertEqual(cache._db().execute('SELECT total FROM usage').fetchone(), (0,))
+
+    def test_shared(self):
+        first = self.make_cache(1000)
+        first.set('a', 'value')
+        self.assertEqual(self.make_cache(1000).get('a'), 'value')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import select
+import socket
+import time
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+def address(port):
+    return (socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', ('127.0.0.1', port))
+
+def unused_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+class CreateConnectionTest(unittest.TestCase):
+    host = 'connect.invalid'
+
+    def setUp(self):
+        self.sockets = []
+
+    def tearDown(self):
+        httplib2.dns_cache.forget(self.host, 80)
+        for sock in self.sockets:
+            sock.close()
+
+    def resolve(self, *addresses):
+        httplib2.dns_cache._entries[(self.host, 80)] = (time.time() + 60, list(addresses))
+
+    def listener(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(0)
+        self.sockets.append(sock)
+        return sock
+
+    def test_falls_back(self):
+        listening = self.listener()
+        self.resolve(address(unused_port()), address(listening.getsockname()[1]))
+        sock = httplib2._create_connection(self.host, 80, 5)
+        self.sockets.append(sock)
+        self.assertEqual(sock.getpeername(), listening.getsockname())
+        self.assertEqual(sock.gettimeout(), 5)
+
+    def test_all_refused(self):
+        self.resolve(address(unused_port()), address(unused_port()))
+        self.assertRaises(socket.error, httplib2._create_connection, self.host, 80, 5)
+        self.assertFalse((self.host, 80) in httplib2.dns_cache._entries)
+
+    def test_timeout(self):
+        #
+        #   A listener that never accepts: once its backlog is full,
+        #   connections to it neither succeed nor fail.
+        #
+        listening = self.listener()
+        port = listening.getsockname()[1]
+        while True:
+            sock = socket.socket()
+            sock.setblocking(0)
+            self.sockets.append(sock)
+            sock.connect_ex(('127.0.0.1', port))
+            if not select.select([], [sock], [], 0.2)[1]:
+                break
+        self.resolve(address(port), address(port))
+        start = time.time()
+        self.assertRaises(socket.timeout, httplib2._create_connection, self.host, 80, 0.5)
+        self.assertTrue(0.4 < time.time() - start < 2)
+
+    def test_interleave_families(self):
+        v4 = [(socket.AF_INET, 1, 6, '', ('10.0.0.%d' % i, 80)) for i in range(3)]
+        v6 = [(socket.AF_INET6, 1, 6, '', ('::%d' % i, 80, 0, 0)) for i in range(2)]
+        self.assertEqual(httplib2._interleave_families(v6 + v4),
+            [v6[0], v4[0], v6[1], v4[1], v4[2]])
+
+class DNSCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.lookups = []
+        self.getaddrinfo = socket.getaddrinfo
+        socket.getaddrinfo = self.fake_getaddrinfo
+
+    def tearDown(self):
+        socket.getaddrinfo = self.getaddrinfo
+
+    def fake_getaddrinfo(self, host, port, *args):
+        self.lookups.append((host, port))
+        return [address(port)]
+
+    def test_cached(self):
+        cache = httplib2.DNSCache(ttl=60)
+        self.assertEqual(cache.getaddrinfo('a.invalid', 80), [address(80)])
+        cache.getaddrinfo('a.invalid', 80)
+        cache.getaddrinfo('b.invalid', 80)
+        self.assertEqual(self.lookups, [('a.invalid', 80), ('b.invalid', 80)])
+
+    def test_ttl(self):
+        cache = httplib2.DNSCache(ttl=0.1)
+        cache.getaddrinfo('a.invalid', 80)
+        cache.getaddrinfo('a.invalid', 80)
+        time.sleep(0.15)
+        cache.getaddrinfo('a.invalid', 80)
+        self.assertEqual(len(self.lookups), 2)
+
+    def test_forget(self):
+        cache = httplib2.DNSCache(ttl=60)
+        cache.getaddrinfo('a.invalid', 80)
+        cache.forget('a.invalid', 80)
+        cache.forget('never.invalid', 80)
+        cache.getaddrinfo('a.invalid', 80)
+        cache.clear()
+        cache.getaddrinfo('a.invalid', 80)
+        self.assertEqual(len(self.lookups), 3)
+
+class ConnectTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.base = servers.start_http()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_request_falls_back(self):
+        port = self.server.server_address[1]
+        host = 'fallback.invalid'
+        httplib2.dns_cache._entries[(host, port)] = (time.time() + 60,
+            [address(unused_port()), address(port)])
+        try:
+            response, content = httplib2.Http(timeout=5).request('http://%s:%d/plain?n=3' % (host, port))
+        finally:
+            httplib2.dns_cache.forget(host, port)
+        self.assertEqual(content, servers.lines(3))
+
+if __name__ == '__main__':
+    unittest.main()
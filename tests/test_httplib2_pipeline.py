@@ -0,0 +1,63 @@
+import socket
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class PipelineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        del self.server.log[:]
+
+    def test_in_order(self):
+        http = httplib2.Http()
+        uris = [self.base + '/plain?n=%d' % (n,) for n in range(1, 10)]
+        uris += [self.base + '/gzip?n=50', self.base + '/redirect']
+        results = http.pipeline(uris)
+        self.assertEqual([content for response, content in results[:9]],
+            [servers.lines(n) for n in range(1, 10)])
+        self.assertEqual(results[9][1], servers.lines(50))
+        self.assertEqual(results[10][0].previous.status, 302)
+
+    def test_server_closes_part_way(self):
+        http = httplib2.Http()
+        results = http.pipeline([self.base + '/plain?n=1', self.base + '/close?n=2',
+            self.base + '/plain?n=3'])
+        self.assertEqual([content for response, content in results],
+            [servers.lines(n) for n in (1, 2, 3)])
+
+    def test_stale_connection_is_retried(self):
+        http = httplib2.Http()
+        http.request(self.base + '/close?n=1')
+        results = http.pipeline([self.base + '/plain?n=5', self.base + '/plain?n=6'])
+        self.assertEqual([content for response, content in results],
+            [servers.lines(5), servers.lines(6)])
+
+    def test_timeout_is_not_resent(self):
+        http = httplib2.Http(timeout=0.3)
+        self.assertRaises(socket.timeout, http.pipeline,
+            [self.base + '/plain?n=1', self.base + '/sleep?t=1'])
+        self.assertEqual([entry[1] for entry in self.server.log], ['/plain', '/sleep'])
+        self.assertEqual(http.connections.values()[0].sock, None)
+
+    def test_bad_content_closes_connection(self):
+        http = httplib2.Http()
+        self.assertRaises(httplib2.FailedToDecompressContent, http.pipeline,
+            [self.base + '/badgzip', self.base + '/plain?n=1'])
+        self.assertEqual(http.connections.values()[0].sock, None)
+        response, content = http.request(self.base + '/plain?n=2')
+        self.assertEqual(content, servers.lines(2))
+
+    def test_only_get_and_head(self):
+        http = httplib2.Http()
+        self.assertRaises(ValueError, http.pipeline, [self.base + '/plain'], method='POST')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import httplib
+import socket
+import time
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class PlainConnection(httplib.HTTPConnection):
+    """
+    A connection type without the attributes httplib2's own have.
+    """
+    def __init__(self, host, port=None, strict=None, timeout=None, proxy_info=None):
+        httplib.HTTPConnection.__init__(self, host, port, strict)
+
+class PoolTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def test_reuse(self):
+        http = httplib2.Http()
+        http.request(self.base + '/plain?n=1')
+        conn = http.connections.values()[0]
+        sock = conn.sock
+        http.request(self.base + '/plain?n=2')
+        self.assertTrue(conn.sock is sock)
+
+    def test_idle_connection_reconnects(self):
+        http = httplib2.Http()
+        http.idle_timeout = 0.1
+        http.request(self.base + '/plain?n=1')
+        conn = http.connections.values()[0]
+        sock = conn.sock
+        time.sleep(0.2)
+        response, content = http.request(self.base + '/plain?n=2')
+        self.assertEqual(content, servers.lines(2))
+        self.assertFalse(conn.sock is sock)
+
+    def test_closed_by_server(self):
+        http = httplib2.Http()
+        http.request(self.base + '/close?n=1')
+        response, content = http.request(self.base + '/plain?n=2')
+        self.assertEqual(content, servers.lines(2))
+
+    def test_close_idle_connections(self):
+        http = httplib2.Http()
+        http.request(self.base + '/plain?n=1')
+        time.sleep(0.1)
+        http.close_idle_connections(0.05)
+        self.assertEqual(http.connections.values()[0].sock, None)
+
+    def test_custom_connection_type(self):
+        http = httplib2.Http()
+        http.idle_timeout = 0.1
+        for n in range(1, 4):
+            response, content = http.request(self.base + '/plain?n=%d' % (n,),
+                connection_type=PlainConnection)
+            self.assertEqual(content, servers.lines(n))
+        http.close_idle_connections(0)
+
+    def test_pooled_connection_without_last_used(self):
+        http = httplib2.Http()
+        conn = PlainConnection(self.base[len('http://'):])
+        conn.connect()
+        http.connections['http:' + conn.host] = conn
+        self.assertFalse(httplib2._is_stale(conn, 10))
+        http.close_idle_connections(10)
+        self.assertFalse(conn.sock is None)
+        conn.close()
+
+class SSLContextTest(unittest.TestCase):
+    def setUp(self):
+        self.contexts = dict(httplib2._ssl_contexts)
+        httplib2._ssl_contexts.clear()
+        self.made = []
+        self.SSLContext = SSLContext = httplib2.ssl.SSLContext
+        made = self.made
+        class CountedContext(SSLContext):
+            def __init__(self, *args):
+                SSLContext.__init__(self, *args)
+                made.append(self)
+        httplib2.ssl.SSLContext = CountedContext
+
+    def tearDown(self):
+        httplib2.ssl.SSLContext = self.SSLContext
+        httplib2._ssl_contexts.clear()
+        httplib2._ssl_contexts.update(self.contexts)
+
+    def wrap(self, disable_validation):
+        sock = socket.socket()
+        try:
+            return httplib2._ssl_wrap_socket(sock, None, None, disable_validation,
+                httplib2.CA_CERTS, 'example.com').context
+        finally:
+            sock.close()
+
+    def test_context_reused(self):
+        first = self.wrap(False)
+        self.assertTrue(self.wrap(False) is first)
+        self.assertEqual(len(self.made), 1)
+        unvalidated = self.wrap(True)
+        self.assertFalse(unvalidated is first)
+        self.assertEqual(unvalidated.verify_mode, httplib2.ssl.CERT_NONE)
+        self.assertEqual(first.verify_mode, httplib2.ssl.CERT_REQUIRED)
+        self.assertTrue(self.wrap(True) is unvalidated)
+        self.assertEqual(len(self.made), 2)
+
+if __name__ == '__main__':
+    unittest.main()
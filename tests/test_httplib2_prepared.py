@@ -0,0 +1,56 @@
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class RecordingConnection(httplib2.HTTPConnectionWithTimeout):
+    """
+    Records the proxy each connection is made through, then connects
+    directly.
+    """
+    proxies = []
+
+    def connect(self):
+        RecordingConnection.proxies.append(self.proxy_info and self.proxy_info.proxy_host)
+        proxy_info, self.proxy_info = self.proxy_info, None
+        try:
+            httplib2.HTTPConnectionWithTimeout.connect(self)
+        finally:
+            self.proxy_info = proxy_info
+
+class PreparedRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        RecordingConnection.proxies = []
+
+    def test_query(self):
+        http = httplib2.Http()
+        prepared = http.prepare(self.base + '/plain')
+        response, content = prepared.request(query={'n': 3})
+        self.assertEqual(content, servers.lines(3))
+        response, content = http.request(prepared.with_query('n=2'))
+        self.assertEqual(content, servers.lines(2))
+
+    def test_proxy_resolved_when_sent(self):
+        proxy = httplib2.ProxyInfo(3, 'proxy.example', 3128)
+        settings = [None]
+        http = httplib2.Http(proxy_info=lambda scheme: settings[0])
+        prepared = http.prepare(self.base + '/plain?n=1')
+        http.request(prepared, connection_type=RecordingConnection)
+        http.request(prepared, connection_type=RecordingConnection)
+        settings[0] = proxy
+        http.request(prepared, connection_type=RecordingConnection)
+        http.request(prepared, connection_type=RecordingConnection)
+        settings[0] = None
+        http.request(prepared, connection_type=RecordingConnection)
+        self.assertEqual(RecordingConnection.proxies, [None, 'proxy.example', None])
+
+if __name__ == '__main__':
+    unittest.main()
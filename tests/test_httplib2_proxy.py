@@ -0,0 +1,114 @@
+import os
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class ProxyResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.environ = dict((name, os.environ.get(name)) for name in httplib2.ProxyResolver.ENVIRONMENT)
+        for name in httplib2.ProxyResolver.ENVIRONMENT:
+            os.environ.pop(name, None)
+        self.resolver = httplib2.ProxyResolver()
+
+    def tearDown(self):
+        for name, value in self.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def proxy(self, authority, scheme='http'):
+        proxy_info = self.resolver.resolve(scheme, authority)
+        return proxy_info and (proxy_info.proxy_host, proxy_info.proxy_port)
+
+    def test_no_proxy_configured(self):
+        self.assertEqual(self.proxy('example.com'), None)
+        self.assertEqual(self.resolver('http'), None)
+
+    def test_environment_change(self):
+        self.assertEqual(self.proxy('example.com'), None)
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        self.assertEqual(self.proxy('example.com'), ('proxy.example', 3128))
+        os.environ['http_proxy'] = 'http://other.example:8080'
+        self.assertEqual(self.proxy('example.com'), ('other.example', 8080))
+        os.environ['no_proxy'] = 'example.com'
+        self.assertEqual(self.proxy('example.com'), None)
+        del os.environ['no_proxy']
+        self.assertEqual(self.proxy('example.com'), ('other.example', 8080))
+        del os.environ['http_proxy']
+        self.assertEqual(self.proxy('example.com'), None)
+
+    def test_answer_is_cached(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        first = self.resolver.resolve('http', 'example.com')
+        self.assertTrue(self.resolver.resolve('http', 'example.com') is first)
+
+    def test_schemes(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        os.environ['HTTPS_PROXY'] = 'http://secure.example'
+        self.assertEqual(self.proxy('example.com'), ('proxy.example', 3128))
+        self.assertEqual(self.proxy('example.com', 'https'), ('secure.example', 443))
+
+    def test_no_proxy_suffix(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        os.environ['no_proxy'] = 'localhost, .internal.example,'
+        self.assertEqual(self.proxy('localhost'), None)
+        self.assertEqual(self.proxy('localhost:8000'), None)
+        self.assertEqual(self.proxy('render.internal.example'), None)
+        self.assertEqual(self.proxy('internal.example'), ('proxy.example', 3128))
+        self.assertEqual(self.proxy('example.com'), ('proxy.example', 3128))
+
+    def test_no_proxy_port(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        os.environ['no_proxy'] = 'example.com:8080'
+        self.assertEqual(self.proxy('example.com:8080'), None)
+        self.assertEqual(self.proxy('example.com:9090'), ('proxy.example', 3128))
+        self.assertEqual(self.proxy('example.com'), ('proxy.example', 3128))
+
+    def test_empty_no_proxy_entries(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        os.environ['no_proxy'] = ' , ,'
+        self.assertEqual(self.resolver('http').bypass_hosts, ())
+        self.assertEqual(self.proxy('example.com'), ('proxy.example', 3128))
+
+    def test_no_proxy_everything(self):
+        os.environ['http_proxy'] = 'http://proxy.example:3128'
+        os.environ['NO_PROXY'] = '*'
+        self.assertEqual(self.proxy('example.com'), None)
+
+class TrackedConnection(httplib2.HTTPConnectionWithTimeout):
+    def __init__(self, *args, **kwargs):
+        httplib2.HTTPConnectionWithTimeout.__init__(self, *args, **kwargs)
+        self.closes = 0
+
+    def close(self):
+        self.closes += 1
+        httplib2.HTTPConnectionWithTimeout.close(self)
+
+class PooledProxyTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.base = servers.start_http()
+        self.authority = self.base[len('http://'):]
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_changed_proxy_closes_connection(self):
+        http = httplib2.Http(proxy_info=None)
+        http.request(self.base + '/plain?n=1', connection_type=TrackedConnection)
+        conn_key, conn = http.connections.items()[0]
+        self.assertTrue(conn.sock is not None)
+        self.assertTrue(http._get_connection(conn_key, 'http', self.authority, None) is conn)
+        self.assertEqual(conn.closes, 0)
+        proxy = httplib2.ProxyInfo(3, 'proxy.example', 3128)
+        self.assertTrue(http._get_connection(conn_key, 'http', self.authority, proxy) is conn)
+        self.assertEqual(conn.closes, 1)
+        self.assertTrue(conn.sock is None)
+        self.assertTrue(conn.proxy_info is proxy)
+        same = httplib2.ProxyInfo(3, 'proxy.example', 3128)
+        http._get_connection(conn_key, 'http', self.authority, same)
+        self.assertEqual(conn.closes, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import copy
+import httplib
+import StringIO
+import unittest
+
+from zync_lib import httplib2
+from zync_lib.httplib2 import caches
+from tests import servers
+
+RAW = ('HTTP/1.1 200 OK\r\n'
+       'Content-Type: text/plain\r\n'
+       'ETag: "abc"\r\n'
+       'Content-Length: 4\r\n\r\nbody')
+
+class FakeSocket(object):
+    def makefile(self, *args):
+        return StringIO.StringIO(RAW)
+
+def httplib_response():
+    response = httplib.HTTPResponse(FakeSocket())
+    response.begin()
+    return response
+
+def without_date(response):
+    return dict((key, value) for key, value in response.items() if key != 'date')
+
+class CompactResponseTest(unittest.TestCase):
+    def check_same(self, info):
+        expected = httplib2.Response(info)
+        compact = httplib2.CompactResponse(info)
+        self.assertEqual(compact.status, expected.status)
+        self.assertEqual(compact.reason, expected.reason)
+        self.assertEqual(compact.version, expected.version)
+        self.assertEqual(compact.fromcache, expected.fromcache)
+        self.assertEqual(sorted(compact.keys()), sorted(expected.keys()))
+        self.assertEqual(dict(compact.items()), dict(expected.items()))
+        self.assertEqual(len(compact), len(expected))
+        for key in expected:
+            self.assertEqual(compact[key], expected[key])
+            self.assertEqual(compact.get(key), expected.get(key))
+            self.assertTrue(key in compact)
+            self.assertTrue(compact.has_key(key))
+        self.assertEqual(compact.get('missing', 'x'), expected.get('missing', 'x'))
+        self.assertFalse('missing' in compact)
+        self.assertRaises(KeyError, compact.__getitem__, 'missing')
+        self.assertEqual(compact, expected)
+
+    def test_from_httplib_response(self):
+        self.check_same(httplib_response())
+
+    def test_from_dict(self):
+        self.check_same({'status': '304', 'etag': '"abc"'})
+        self.check_same({'status': '200', 'content-type': 'text/plain'})
+
+    def test_status_key(self):
+        response = httplib2.CompactResponse(httplib_response())
+        self.assertEqual(response['status'], '200')
+        response['status'] = '404'
+        self.assertEqual(response.status, 404)
+        self.assertEqual(response.get('status'), '404')
+        self.assertRaises(KeyError, response.__delitem__, 'status')
+
+    def test_copy_on_write(self):
+        info = httplib_response()
+        response = httplib2.CompactResponse(info)
+        other = copy.copy(response)
+        other['x-extra'] = '1'
+        response['content-type'] = 'text/html'
+        self.assertFalse('x-extra' in response)
+        self.assertEqual(other['content-type'], 'text/plain')
+        self.assertEqual(response['content-type'], 'text/html')
+        self.assertEqual(info.msg.dict['content-type'], 'text/plain')
+        self.assertFalse('x-extra' in info.msg.dict)
+
+class ResponseClassTest(unittest.TestCase):
+    def setUp(self):
+        self.server, self.base = servers.start_http()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def fetch_twice(self, response_class, path, **kwargs):
+        http = httplib2.Http(cache=caches.MemoryCache())
+        http.response_class = response_class
+        first = http.request(self.base + path, **kwargs)
+        second = http.request(self.base + path, **kwargs)
+        return first, second
+
+    def test_matches_response(self):
+        for path in ('/plain', '/gzip', '/cached', '/redirect'):
+            expected = self.fetch_twice(httplib2.Response, path)
+            compact = self.fetch_twice(httplib2.CompactResponse, path)
+            for (want, want_content), (got, got_content) in zip(expected, compact):
+                self.assertTrue(isinstance(got, httplib2.CompactResponse))
+                self.assertEqual(got_content, want_content)
+                self.assertEqual(got.status, want.status)
+                self.assertEqual(got.reason, want.reason)
+                self.assertEqual(got.fromcache, want.fromcache, path)
+                self.assertEqual(without_date(got), without_date(want))
+                self.assertEqual(bool(got.previous), bool(want.previous))
+
+    def test_cached(self):
+        (first, _), (second, content) = self.fetch_twice(httplib2.CompactResponse, '/cached')
+        self.assertFalse(first.fromcache)
+        self.assertTrue(second.fromcache)
+        self.assertTrue(isinstance(second, httplib2.CompactResponse))
+        self.assertEqual(second['etag'], '"abc"')
+        self.assertEqual(content, servers.lines(1000))
+
+    def test_redirect(self):
+        http = httplib2.Http()
+        http.response_class = httplib2.CompactResponse
+        response, content = http.request(self.base + '/redirect')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response['content-location'], self.base + '/plain')
+        self.assertTrue(isinstance(response.previous, httplib2.CompactResponse))
+        self.assertEqual(response.previous.status, 302)
+        self.assertEqual(response.previous['content-location'], self.base + '/redirect')
+
+    def test_exception_to_status_code(self):
+        http = httplib2.Http()
+        http.response_class = httplib2.CompactResponse
+        http.force_exception_to_status_code = True
+        response, content = http.request('http://127.0.0.1:1/')
+        self.assertTrue(isinstance(response, httplib2.CompactResponse))
+        self.assertEqual(response.status, 400)
+
+if __name__ == '__main__':
+    unittest.main()
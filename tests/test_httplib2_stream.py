@@ -0,0 +1,121 @@
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class TrackedConnection(httplib2.HTTPConnectionWithTimeout):
+    made = []
+
+    def __init__(self, *args, **kwargs):
+        httplib2.HTTPConnectionWithTimeout.__init__(self, *args, **kwargs)
+        self.closed = False
+        TrackedConnection.made.append(self)
+
+    def close(self):
+        self.closed = True
+        httplib2.HTTPConnectionWithTimeout.close(self)
+
+class BrokenConnection(TrackedConnection):
+    def getresponse(self):
+        raise RuntimeError('broken')
+
+class StreamTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        TrackedConnection.made = []
+
+    def test_stream_decodes(self):
+        http = httplib2.Http()
+        for path in ['/plain', '/gzip', '/deflate']:
+            response, content = http.request(self.base + path + '?n=20000', stream=True)
+            self.assertTrue(isinstance(content, httplib2.ResponseStream))
+            self.assertEqual(http.connections, {})
+            self.assertEqual(content.read(10) + ''.join(content), servers.lines(20000))
+            self.assertEqual(len(http.connections), 1)
+
+    def test_stream_redirect(self):
+        http = httplib2.Http()
+        response, content = http.request(self.base + '/redirect?n=5', stream=True)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.previous.status, 302)
+        self.assertEqual(content.read(), servers.lines(1000))
+
+    def test_closed_stream_leaves_pool_usable(self):
+        http = httplib2.Http()
+        response, content = http.request(self.base + '/plain?n=50000', stream=True)
+        content.read(5)
+        content.close()
+        response, content = http.request(self.base + '/plain?n=3')
+        self.assertEqual(content, servers.lines(3))
+
+    def test_failed_stream_closes_connection(self):
+        http = httplib2.Http()
+        self.assertRaises(RuntimeError, http.request, self.base + '/plain',
+            stream=True, connection_type=BrokenConnection)
+        self.assertEqual(len(TrackedConnection.made), 1)
+        self.assertTrue(TrackedConnection.made[0].closed)
+        self.assertEqual(http.connections, {})
+
+class DecodeTest(unittest.TestCase):
+    """
+    Checks each kind of encoded body both buffered and streamed.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def fetch(self, http, path, stream):
+        response, content = http.request(self.base + path, stream=stream)
+        if stream:
+            content = content.read()
+        return response, content
+
+    def test_raw_deflate(self):
+        for stream in (False, True):
+            response, content = self.fetch(httplib2.Http(), '/rawdeflate?n=20000', stream)
+            self.assertEqual(content, servers.lines(20000))
+
+    def test_gzip_members(self):
+        for stream in (False, True):
+            response, content = self.fetch(httplib2.Http(), '/gzipmembers?n=20000', stream)
+            self.assertEqual(content, servers.lines(20000))
+
+    def test_bad_gzip(self):
+        for stream in (False, True):
+            self.assertRaises(httplib2.FailedToDecompressContent,
+                self.fetch, httplib2.Http(), '/badgzip', stream)
+
+    def test_limit(self):
+        size = len(servers.lines(20000))
+        for stream in (False, True):
+            for path in ('/gzip?n=20000', '/deflate?n=20000', '/rawdeflate?n=20000', '/gzipmembers?n=20000'):
+                http = httplib2.Http()
+                http.max_decompressed_size = size - 1
+                self.assertRaises(httplib2.DecompressionLimitExceeded, self.fetch, http, path, stream)
+                http.max_decompressed_size = size
+                self.assertEqual(self.fetch(http, path, stream)[1], servers.lines(20000))
+
+    def test_limit_is_checked_while_decoding(self):
+        http = httplib2.Http()
+        http.max_decompressed_size = 1000
+        response, content = http.request(self.base + '/gzip?n=20000', stream=True)
+        self.assertRaises(httplib2.DecompressionLimitExceeded, content.read, 10)
+        decoder = httplib2._ContentDecoder(None, 'gzip', 2 * httplib2.DECOMPRESS_CHUNK_SIZE)
+        chunks = decoder.decode(servers.gzipped('x' * 10 ** 7))
+        self.assertEqual(len(chunks.next()), httplib2.DECOMPRESS_CHUNK_SIZE)
+        self.assertEqual(len(chunks.next()), httplib2.DECOMPRESS_CHUNK_SIZE)
+        self.assertRaises(httplib2.DecompressionLimitExceeded, chunks.next)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import StringIO
+import httplib
+import tempfile
+import unittest
+
+from zync_lib import httplib2
+from tests import servers
+
+class FlakyConnection(httplib2.HTTPConnectionWithTimeout):
+    """
+    Loses the first response, as if the server had closed a kept alive
+    connection.
+    """
+    failed = False
+
+    def getresponse(self):
+        if not FlakyConnection.failed:
+            FlakyConnection.failed = True
+            raise httplib.BadStatusLine('')
+        return httplib2.HTTPConnectionWithTimeout.getresponse(self)
+
+class UnseekableFile(object):
+    def __init__(self, data):
+        self.data = StringIO.StringIO(data)
+
+    def read(self, *args):
+        return self.data.read(*args)
+
+class UploadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_http()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        FlakyConnection.failed = False
+        self.calls = []
+
+    def post(self, body, **kwargs):
+        http = httplib2.Http()
+        return http.request(self.base + '/upload', 'POST', body=body,
+            progress=lambda *args: self.calls.append(args), **kwargs)
+
+    def test_string(self):
+        response, content = self.post('x' * 200000)
+        self.assertEqual(content, 'got 200000')
+        self.assertEqual(self.calls[0][:2], (0, 200000))
+        self.assertEqual(self.calls[-1][:2], (200000, 200000))
+        self.assertEqual(len(self.calls), 2 + 199999 // httplib2.UPLOAD_BLOCK_SIZE)
+
+    def test_unicode(self):
+        body = u'caf\xe9 ' * 1000
+        response, content = self.post(body)
+        self.assertEqual(content, 'got %d' % (len(body.encode('utf-8')),))
+        self.assertEqual(self.calls[-1][:2], (6000, 6000))
+        self.assertEqual(self.server.log[-1][4], body.encode('utf-8'))
+
+    def test_files(self):
+        f = tempfile.TemporaryFile()
+        f.write('z' * 150000)
+        f.seek(10)
+        response, content = self.post(f)
+        self.assertEqual(content, 'got 149990')
+        response, content = self.post(StringIO.StringIO('y' * 1000))
+        self.assertEqual(content, 'got 1000')
+
+    def test_file_resent_from_start(self):
+        f = tempfile.TemporaryFile()
+        f.write('a' * 5000 + 'b' * 100000)
+        f.seek(5000)
+        response, content = self.post(f, connection_type=FlakyConnection)
+        self.assertTrue(FlakyConnection.failed)
+        self.assertEqual(content, 'got 100000')
+        self.assertEqual(self.server.log[-1][4], 'b' * 100000)
+
+    def test_file_resent_after_challenge(self):
+        f = tempfile.TemporaryFile()
+        f.write('a' * 10 + 'd' * 100000)
+        f.seek(10)
+        http = httplib2.Http(timeout=5)
+        http.add_credentials('user', 'pass')
+        response, content = http.request(self.base + '/auth', 'POST', body=f,
+            progress=lambda *args: self.calls.append(args))
+        self.assertEqual(response.status, 200)
+        self.assertEqual(content, 'got 100000')
+        self.assertEqual([entry[4] for entry in self.server.log[-2:]], ['d' * 100000] * 2)
+        self.assertEqual(self.calls[-1][:2], (100000, 100000))
+
+    def test_file_resent_after_redirect(self):
+        f = tempfile.TemporaryFile()
+        f.write('e' * 5000)
+        f.seek(0)
+        http = httplib2.Http(timeout=5)
+        http.follow_all_redirects = True
+        response, content = http.request(self.base + '/temporary', 'POST', body=f)
+        self.assertEqual(response.previous.status, 307)
+        self.assertEqual(content, 'got 5000')
+
+    def test_unseekable_file_not_resent_after_challenge(self):
+        http = httplib2.Http(timeout=5)
+        http.add_credentials('user', 'pass')
+        response, content = http.request(self.base + '/auth?test=unseekable', 'POST',
+            body=UnseekableFile('f' * 1000))
+        self.assertEqual(response.status, 401)
+        # The server is shared, so only count this test's requests.
+        self.assertEqual([entry[2] for entry in self.server.log].count({'test': ['unseekable']}), 1)
+
+    def test_unseekable_file_not_resent(self):
+        self.assertRaises(httplib.BadStatusLine, self.post,
+            UnseekableFile('c' * 1000), connection_type=FlakyConnection)
+
+if __name__ == '__main__':
+    unittest.main()
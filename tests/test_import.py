@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import unittest
+
+import zync
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prints the modules a statement imports, with the milliseconds each took
+# including what it imported, like python -X importtime.
+REPORT = r'''
+import sys, time, __builtin__
+original = __builtin__.__import__
+rows = []
+def timed_import(name, *args, **kwargs):
+    before = len(sys.modules)
+    start = time.time()
+    try:
+        return original(name, *args, **kwargs)
+    finally:
+        if len(sys.modules) != before:
+            rows.append((time.time() - start, name))
+__builtin__.__import__ = timed_import
+before = set(sys.modules)
+exec sys.argv[1]
+__builtin__.__import__ = original
+for seconds, name in rows:
+    sys.stderr.write('%8.2f ms  %s\n' % (seconds * 1000, name))
+print ' '.join(sorted(name for name in set(sys.modules) - before if sys.modules[name] is not None))
+'''
+
+# Modules that shouldn't load until they're needed.
+LAZY = {
+    'import zync': ['zync_lib.httplib2', 'urllib', 'email', 'ssl', 'socket'],
+    'import zync_lib.httplib2': ['zync_lib.httplib2.auth', 'zync_lib.httplib2.socks',
+                                 'zync_lib.httplib2.caches', 'email', 'gzip', 'hmac'],
+}
+
+class ImportTest(unittest.TestCase):
+    def imported(self, statement):
+        process = subprocess.Popen([sys.executable, '-c', REPORT, statement], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, report = process.communicate()
+        self.assertEqual(process.returncode, 0, report)
+        return set(out.split()), report
+
+    def test_lazy_imports(self):
+        for statement, lazy in sorted(LAZY.items()):
+            imported, report = self.imported(statement)
+            for name in lazy:
+                self.assertFalse(name in imported,
+                    '%s imported %s:\n%s' % (statement, name, report))
+
+    def test_auth_names(self):
+        imported, report = self.imported(
+            'import zync_lib.httplib2 as h; assert h.BasicAuthentication is h.AUTH_SCHEME_CLASSES["basic"]; '
+            'assert issubclass(h.DigestAuthentication, h.Authentication); assert not hasattr(h, "Nothing")')
+        self.assertTrue('zync_lib.httplib2.auth' in imported)
+
+    def test_parsedate(self):
+        from zync_lib import httplib2
+        self.assertEqual(httplib2._parsedate_tz('Tue, 15 Nov 1994 08:12:31 GMT')[:6], (1994, 11, 15, 8, 12, 31))
+
+    def test_zync_url_defined(self):
+        self.imported('import zync; assert zync.ZYNC_URL is None')
+
+    def test_load_config_keeps_assigned_url(self):
+        url = zync.ZYNC_URL
+        zync.ZYNC_URL = 'http://example.invalid'
+        try:
+            zync.load_config()
+            self.assertEqual(zync.ZYNC_URL, 'http://example.invalid')
+        finally:
+            zync.ZYNC_URL = url
+
+if __name__ == '__main__':
+    unittest.main()
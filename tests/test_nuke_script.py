@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import zync
+from zync_lib import nuke_script, frange
+from zync_lib.scene_scan import nuke_value, nuke_node_body
+
+SCRIPT = r'''Root {
+ inputs 0
+ name /proj/comp/shot.nk
+ first_frame 1001
+ last_frame 1100
+}
+Read {
+ file /plates/bg.####.exr
+ first 1001
+ last 1100
+ name Read1
+}
+Write {
+ file /out/main.####.exr
+ file_type exr
+ name WriteMain
+}
+Write {
+ beforeRender {
+if {[value disable]} {
+ name NotAKnob
+}
+}
+ label "not the end \} }"
+ file "/out/slap comp.####.jpg"
+ disable true
+ name WriteSlap
+}
+Group {
+ name Precomp
+}
+ Group {
+  name Empty
+ }
+ end_group
+ Write {
+  file /out/pre.####.exr
+  use_limit true
+  first 1050
+  last 1060
+  name Write1
+ }
+end_group
+Write {
+ file /out/late.####.exr
+ use_limit true
+ first {frame_expression}
+ last 2010
+ name WriteLate
+}
+'''
+
+class WriteNodesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'shot.nk')
+        f = open(self.path, 'w')
+        f.write(SCRIPT)
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_write_nodes(self):
+        nodes = nuke_script.write_nodes(self.path)
+        self.assertEqual([node.name for node in nodes],
+            ['WriteMain', 'WriteSlap', 'Precomp.Write1', 'WriteLate'])
+        self.assertEqual([node.enabled for node in nodes], [True, False, True, True])
+        self.assertEqual(nodes[1].path, '/out/slap comp.####.jpg')
+        self.assertEqual([(node.first, node.last) for node in nodes],
+            [(1001, 1100), (1001, 1100), (1050, 1060), (1001, 2010)])
+        self.assertEqual(repr(nodes[2]), "WriteNode('Precomp.Write1', enabled=True, "
+            "path='/out/pre.####.exr', first=1050, last=1060)")
+
+    def test_resolve(self):
+        self.assertEqual(len(nuke_script.resolve(self.path)), 3)
+        nodes = nuke_script.resolve(self.path, 'All', frange.FrameRange('1055-1056'))
+        self.assertEqual([node.name for node in nodes], ['WriteMain', 'Precomp.Write1', 'WriteLate'])
+        self.assertTrue(nuke_script.resolve(self.path, 'Precomp.Write1', frange.FrameRange('1048-1062x12')))
+        for name, frame_range in [('WriteSlap', None), ('Nope', None),
+                                  ('Precomp.Write1', frange.FrameRange('1001-1049')),
+                                  ('Precomp.Write1', frange.FrameRange('1049-1061x12'))]:
+            self.assertRaises(ValueError, nuke_script.resolve, self.path, name, frame_range)
+
+    def test_empty_script(self):
+        open(self.path, 'w').close()
+        self.assertEqual(nuke_script.write_nodes(self.path), [])
+
+    def test_check_write_nodes(self):
+        job = zync.NukeJob.__new__(zync.NukeJob)
+        job._check_write_nodes({'file': self.path, 'write_node': 'All', 'frange': '1001-1100'})
+        self.assertRaises(zync.ZyncError, job._check_write_nodes,
+            {'file': self.path, 'write_node': 'WriteSlap'})
+        self.assertRaises(zync.ZyncError, job._check_write_nodes,
+            {'file': os.path.join(self.dir, 'none.nk'), 'write_node': 'All'})
+
+class NukeValueTest(unittest.TestCase):
+    def test_nuke_value(self):
+        self.assertEqual(nuke_value('plain'), 'plain')
+        self.assertEqual(nuke_value('{braced value}'), 'braced value')
+        self.assertEqual(nuke_value(r'"quoted \"value\""'), 'quoted "value"')
+        self.assertEqual(nuke_value(r'"\[value root.name]"'), '[value root.name]')
+
+    def test_nuke_node_body(self):
+        text = 'X {\n a {1\n}\n b "}"\n c \\}\n}\nY {\n}\n'
+        body, end = nuke_node_body(text, len('X {'))
+        self.assertEqual(body, '\n a {1\n b "}"\n c \\}\n')
+        self.assertEqual(text[end:], '\nY {\n}\n')
+        self.assertEqual(nuke_node_body('X {\n a 1\n', 3), ('\n a 1\n', 9))
+
+if __name__ == '__main__':
+    unittest.main()
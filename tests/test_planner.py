@@ -0,0 +1,69 @@
+import heapq
+import random
+import unittest
+
+from zync_lib import planner, frange
+
+TYPES = {'ZYNC8': {'cost': 1.0}, 'ZYNC16': {'cost': 2.0}}
+
+class PlanTest(unittest.TestCase):
+    def test_even_split(self):
+        plan = planner.plan('1-100', 60, TYPES, start_up=0, task_overhead=0, max_instances=10)
+        self.assertEqual((plan.wall_time, plan.num_instances), (600, 10))
+
+    def test_frame_time_by_type(self):
+        plan = planner.plan('1-100', {'ZYNC8': 120, 'ZYNC16': 60}, TYPES,
+            start_up=60, task_overhead=30, max_instances=10)
+        self.assertEqual(plan.instance_type, 'ZYNC16')
+        plan = planner.plan('1-100', {'ZYNC8': 120, 'OTHER': 1}, TYPES)
+        self.assertEqual(plan.instance_type, 'ZYNC8')
+
+    def test_deadline(self):
+        fastest = planner.plan('1-100', 60, TYPES, start_up=120, task_overhead=30)
+        plan = planner.plan('1-100', 60, TYPES, deadline=3600, start_up=120, task_overhead=30)
+        self.assertTrue(plan.wall_time <= 3600)
+        self.assertTrue(fastest.wall_time <= plan.wall_time and fastest.cost >= plan.cost)
+        impossible = planner.plan('1-100', 60, TYPES, deadline=1, start_up=120, task_overhead=30)
+        self.assertEqual(impossible.wall_time, fastest.wall_time)
+
+    def test_stepped_range(self):
+        plan = planner.plan('1-100x2', 60, TYPES)
+        self.assertEqual(plan.chunk_size, 1)
+        params = plan.apply({'frange': '1-100x2'})
+        self.assertEqual(params['num_instances'], plan.num_instances)
+        self.assertEqual(params['instance_type'], plan.instance_type)
+
+    def test_unknown_instance_types(self):
+        try:
+            planner.plan('1-100', {'ZYNC99': 60, 'BIG': 30}, TYPES)
+        except ValueError, e:
+            self.assertTrue('BIG, ZYNC99' in str(e), str(e))
+        else:
+            self.fail('ValueError not raised')
+
+    def test_no_instance_types(self):
+        self.assertRaises(ValueError, planner.plan, '1-100', 60, {})
+
+    def test_tasks_match_chunks(self):
+        for expr in ['1-100', '1-7,20-25', '1-9x2,30-41', '5', '1-3x3,10-12x3']:
+            frames = frange.FrameRange(expr)
+            for chunk_size in (1, 2, 5, 12):
+                counts = {}
+                for start, end in frames.chunks(chunk_size):
+                    counts[end - start + 1] = counts.get(end - start + 1, 0) + 1
+                self.assertEqual(planner._tasks(frames, chunk_size),
+                    sorted(counts.items(), reverse=True), (expr, chunk_size))
+
+    def test_finish_time_matches_scheduling(self):
+        rng = random.Random(42)
+        for i in range(200):
+            tasks = sorted([(rng.randint(1, 9), rng.randint(1, 30)) for j in range(3)], reverse=True)
+            num_instances = rng.randint(1, 12)
+            loads = [0] * num_instances
+            for duration, count in tasks:
+                for k in range(count):
+                    heapq.heapreplace(loads, loads[0] + duration)
+            self.assertEqual(planner._finish_time(tasks, num_instances), max(loads))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from zync_lib import scene_scan
+
+MAYA_SCENE = r'''//Maya ASCII 2014 scene
+requires maya "2014";
+file -rdi 1 -ns "rig" -rfn "rigRN" -op "v=0;" -typ "mayaAscii" "%(dir)s/rig.ma";
+file -r -ns "rig" -dr 1 -rfn "rigRN" -op "v=0;" -typ "mayaAscii" "%(dir)s/rig.ma";
+file -rdi 1 -ns "env" -rfn "envRN" -typ "mayaBinary" "/proj/env \"v2\".mb";
+createNode file -n "file1";
+	setAttr ".ftn" -type "string" "/proj/sourceimages/wood.<UDIM>.tx";
+createNode file -n "file2";
+	setAttr ".ftn" -type "string" "/proj/sourceimages/a_very_long"
+		+ "_name.exr";
+createNode file -n "file3";
+	setAttr ".ftn" -type "string" ("/proj/tex/" + "b.tx");
+createNode AlembicNode -n "abc";
+	setAttr ".fn" -type "string" "C:\\proj\\cache\\anim.abc";
+createNode transform -n "x";
+	setAttr ".notes" -type "string" "/not/a/dep.txt";
+'''
+
+RIG_SCENE = r'''createNode file -n "rigtex";
+	setAttr ".fileTextureName" -type "string" "/proj/rig/skin.tif";
+'''
+
+NUKE_SCRIPT = r'''#! nuke
+Root {
+ inputs 0
+ name %(dir)s/comp.nk
+ project_directory "\[python \{nuke.script_directory()\}]"
+ proxy true
+}
+Read {
+ inputs 0
+ file plates/bg.####.exr
+ proxy {plates/proxy/bg.####.jpg}
+ name Read1
+}
+Read {
+ file "[getenv SHOW]/x.exr"
+ name Read2
+}
+Read {
+ onCreate {
+if {1} {
+ file /not/a/dep.exr
+}
+}
+ file plates/fg.####.exr
+}
+Group {
+ name G
+}
+ ReadGeo2 {
+  file /abs/geo.abc
+ }
+end_group
+Write {
+ file /out/comp.####.exr
+ name Write1
+}
+'''
+
+ASS_SCENE = r'''options
+{
+ AA_samples 3
+}
+image
+{
+ name tex
+ filename "/proj/tex/a.tx"
+}
+procedural
+{
+ dso "/proj/proc.so"
+}
+driver_exr
+{
+ filename "/out/beauty.exr"
+}
+'''
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name, text in [('shot.ma', MAYA_SCENE), ('rig.ma', RIG_SCENE),
+                           ('comp.nk', NUKE_SCRIPT), ('scene.1.ass', ASS_SCENE),
+                           ('scene.2.ass', ASS_SCENE), ('empty.ma', '')]:
+            f = open(self.path(name), 'w')
+            f.write(text % {'dir': self.dir} if '%(dir)s' in text else text)
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_maya(self):
+        self.assertEqual(scene_scan.scan_file(self.path('shot.ma')), [
+            self.path('rig.ma'), '/proj/env "v2".mb', '/proj/sourceimages/wood.<UDIM>.tx',
+            '/proj/sourceimages/a_very_long_name.exr', '/proj/tex/b.tx',
+            'C:\\proj\\cache\\anim.abc'])
+
+    def test_nuke(self):
+        self.assertEqual(scene_scan.scan_file(self.path('comp.nk')), [
+            self.path('plates/bg.####.exr'), self.path('plates/proxy/bg.####.jpg'),
+            self.path('plates/fg.####.exr'), '/abs/geo.abc'])
+
+    def test_ass(self):
+        self.assertEqual(scene_scan.scan_file(self.path('scene.1.ass')), ['/proj/tex/a.tx', '/proj/proc.so'])
+
+    def test_empty_and_unsupported(self):
+        self.assertEqual(scene_scan.scan_file(self.path('empty.ma')), [])
+        self.assertRaises(ValueError, scene_scan.scan_file, self.path('shot.mb'))
+
+    def test_expand(self):
+        self.assertEqual(scene_scan.expand(self.path('scene.*.ass')),
+            [self.path('scene.1.ass'), self.path('scene.2.ass')])
+        self.assertEqual(scene_scan.expand(self.path('missing.ass')), [])
+
+    def test_recursive_and_cached(self):
+        cache_path = self.path('cache/scan.json')
+        found = scene_scan.scan([self.path('shot.ma'), self.path('comp.nk')],
+            cache_path=cache_path, processes=False)
+        self.assertEqual(found[self.path('rig.ma')], ['/proj/rig/skin.tif'])
+        calls = []
+        scan_file = scene_scan.scan_file
+        scene_scan.scan_file = lambda path: calls.append(path) or scan_file(path)
+        try:
+            again = scene_scan.scan([self.path('shot.ma'), self.path('comp.nk')],
+                cache_path=cache_path, processes=False)
+        finally:
+            scene_scan.scan_file = scan_file
+        self.assertEqual(calls, [])
+        self.assertEqual(again, found)
+
+    def test_missing(self):
+        found = scene_scan.scan([self.path('missing.ma'), self.path('rig.ma')], processes=False)
+        self.assertEqual(found, {self.path('missing.ma'): None,
+                                 self.path('rig.ma'): ['/proj/rig/skin.tif']})
+        self.assertEqual(scene_scan.dependencies([self.path('missing.ma'), self.path('rig.ma')],
+            processes=False), ['/proj/rig/skin.tif'])
+
+    def test_processes(self):
+        paths = scene_scan.expand(self.path('scene.*.ass'))
+        found = scene_scan.scan(paths, workers=2, processes=True)
+        self.assertEqual(sorted(found), paths)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import zync
+from zync_lib import submit_queue
+from tests import servers
+from tests.test_zync import ZyncTestCase
+
+class SubmitQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.queue = submit_queue.SubmitQueue(os.path.join(self.dir, 'q.db'), url='http://127.0.0.1:1')
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.dir)
+
+    def test_order(self):
+        a = self.queue.submit_job('nuke', '/a/shot.nk', 'All', {'frange': '1-10'})
+        b = self.queue.pause(4242)
+        c = self.queue.put('cancel', (4242,))
+        self.assertEqual([operation['id'] for operation in self.queue.pending()], [a, b, c])
+        self.assertEqual(self.queue.get(a)['state'], 'pending')
+        self.assertEqual(self.queue.get(12345), None)
+
+    def test_unknown_operation(self):
+        self.assertRaises(ValueError, self.queue.put, 'delete_everything')
+
+    def test_claim_and_finish(self):
+        a = self.queue.cancel(1)
+        operation, wait = self.queue.claim()
+        self.assertEqual(operation, (a, 'cancel', [1], {}))
+        self.queue.finish(a, retry_in=60)
+        operation, wait = self.queue.claim()
+        self.assertEqual(operation, None)
+        self.assertTrue(50 < wait <= 60)
+        self.queue.finish(a, result='ok')
+        self.assertEqual(self.queue.get(a)['result'], 'ok')
+        self.assertEqual(self.queue.claim(), (None, None))
+
+class WorkerTest(ZyncTestCase):
+    def setUp(self):
+        ZyncTestCase.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.queue = submit_queue.SubmitQueue(os.path.join(self.dir, 'q.db'), url=self.base)
+        self.worker = submit_queue.Worker(self.queue, 'script', 'token')
+        self.worker.base_delay = 0
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.dir)
+
+    def test_sends_in_order(self):
+        a = self.queue.submit_job('nuke', '/a/shot.nk', 'All', {'frange': '1-10'})
+        b = self.queue.pause(4242)
+        self.assertEqual(self.worker.run_once(), 0)
+        self.assertEqual(self.worker.run_once(), 0)
+        self.assertEqual(self.worker.run_once(), None)
+        self.assertEqual(self.queue.get(a)['result'], 4242)
+        self.assertEqual(self.queue.get(b)['state'], 'done')
+        self.assertEqual([path for path in self.paths() if path.startswith('/lib/s')],
+            ['/lib/submit_job_v2.php', '/lib/set_job_status.php'])
+
+    def test_unreachable_is_retried(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        queue = submit_queue.SubmitQueue(os.path.join(self.dir, 'q.db'), url='http://127.0.0.1:%d' % (port,))
+        a = queue.submit_job('nuke', '/a/shot.nk', 'All', {})
+        b = queue.cancel(1)
+        submit_queue.Worker(queue, 'script', 'token').run_once()
+        self.assertEqual(queue.get(a)['state'], 'pending')
+        self.assertEqual(queue.get(a)['attempts'], 1)
+        self.assertEqual(queue.get(b)['attempts'], 0)
+
+    def test_server_errors_are_retried(self):
+        a = self.queue.submit_job('nuke', '/a/shot.nk', 'All', {'frange': '1-10'})
+        for status in (503, 502, 429):
+            self.server.fail['/lib/submit_job_v2.php'] = status
+            self.assertEqual(self.worker.run_once(), 0)
+            self.assertEqual(self.queue.get(a)['state'], 'pending', status)
+        self.server.fail.clear()
+        self.server.fail['/lib/get_preflight_checks.php'] = 503
+        self.assertEqual(self.worker.run_once(), 0)
+        self.assertEqual(self.queue.get(a)['state'], 'pending')
+        self.server.fail.clear()
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(a)['state'], 'done')
+        self.assertEqual(self.queue.get(a)['attempts'], 5)
+
+    def test_submit_errors_are_not_retried(self):
+        a = self.queue.submit_job('nuke', '/a/shot.nk', 'All', {'frange': '1-10'})
+        self.server.fail['/lib/submit_job_v2.php'] = 400
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(a)['state'], 'failed')
+        self.assertTrue('HTTP 400' in self.queue.get(a)['error'])
+
+    def test_job_control_errors(self):
+        a = self.queue.cancel(1)
+        self.server.fail['/lib/set_job_status.php'] = 500
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(a)['state'], 'pending')
+        self.server.fail['/lib/set_job_status.php'] = 403
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(a)['state'], 'failed')
+        self.assertTrue('403' in self.queue.get(a)['error'])
+        b = self.queue.pause(1)
+        self.server.fail.clear()
+        self.server.bodies['/lib/set_job_status.php'] = json.dumps({'code': 1, 'response': 'No such job.'})
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(b)['state'], 'failed')
+        self.assertTrue('No such job.' in self.queue.get(b)['error'])
+
+    def test_permanent_errors(self):
+        a = self.queue.submit_job('bogus', '/x')
+        b = self.queue.resume(1)
+        self.worker.run_once()
+        self.worker.run_once()
+        self.assertEqual(self.queue.get(a)['state'], 'failed')
+        self.assertTrue('Unrecognized' in self.queue.get(a)['error'])
+        self.assertEqual(self.queue.get(b)['state'], 'done')
+
+    def test_local_errors_are_not_retried(self):
+        self.assertFalse(self.worker._transient(IOError(2, 'No such file')))
+        self.assertTrue(self.worker._transient(socket.error(104, 'Connection reset')))
+        self.assertTrue(self.worker._transient(zync.ZyncError('busy', status=503)))
+        self.assertTrue(self.worker._transient(zync.ZyncError('slow down', status=429)))
+        self.assertFalse(self.worker._transient(zync.ZyncError('rejected', status=200)))
+        self.assertFalse(self.worker._transient(zync.ZyncError('rejected')))
+
+if __name__ == '__main__':
+    unittest.main()
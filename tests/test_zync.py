@@ -0,0 +1,260 @@
+import Queue
+import json
+import os
+import shutil
+import tempfile
+import socket
+import threading
+import time
+import unittest
+
+import zync
+from tests import servers
+
+class ZyncTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.base = servers.start_zync()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        del self.server.log[:]
+        self.server.status = 200
+        self.server.delay = 0
+        self.server.max_active = 0
+        self.server.fail.clear()
+        self.server.bodies.clear()
+
+    def paths(self):
+        return [entry[1] for entry in self.server.log]
+
+class ZyncTest(ZyncTestCase):
+    def test_calls(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        self.assertEqual(z.get_jobs(), [{'id': 1}])
+        self.assertEqual(z.get_project_name('/a/b/shot.nk'), 'proj_shot.nk')
+        self.assertEqual(self.server.log[-1][3], 'session=abc')
+
+    def test_endpoints_prepared_once(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        endpoint = z._endpoint('lib/get_jobs.php')
+        self.assertTrue(z._endpoint('lib/get_jobs.php') is endpoint)
+        job = zync.Job(z.cookie, z.url, http=z.http)
+        self.assertEqual(job._endpoint('lib/get_jobs.php').target, endpoint.target)
+
+    def test_submit_job(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        self.assertEqual(z.submit_job('nuke', '/a/s.nk', 'Write1', {'frange': '1-10'}), 4242)
+        self.assertTrue('/lib/submit_job_v2.php' in self.paths())
+
+class JobHttpTest(ZyncTestCase):
+    def test_jobs_have_own_connections_and_timeout(self):
+        z = zync.Zync('script', 'token', timeout=0.3, url=self.base)
+        self.assertTrue(z._job_http() is z._job_http())
+        self.assertFalse(z._job_http().connections is z.http.connections)
+        self.assertEqual(z._job_http().timeout, None)
+        self.assertEqual(z._job_http().cache, None)
+        self.server.delay = 0.5
+        self.assertRaises(socket.timeout, z.get_jobs)
+        self.assertEqual(z.submit_job('nuke', '/a/s.nk', 'Write1', {'frange': '1-10'}), 4242)
+        self.server.delay = 0
+        z.get_jobs()
+        for http, timeout in ((z.http, 0.3), (z._job_http(), None)):
+            for conn in http.connections.values():
+                self.assertEqual(conn.timeout, timeout)
+                self.assertEqual(conn.sock.gettimeout(), timeout)
+
+class BackgroundTest(ZyncTestCase):
+    def test_job_requests_wait_for_background(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        job = z._prepare_job('nuke')
+        self.server.delay = 0.2
+        future = z._background(job.submit, '/a/s.nk', 'Write1', {'frange': '1-10'})
+        job.cancel(4242)
+        self.assertTrue(future.done())
+        self.assertEqual(self.server.max_active, 1)
+        self.assertEqual(self.paths()[-2:], ['/lib/submit_job_v2.php', '/lib/set_job_status.php'])
+
+    def test_warm(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        self.server.delay = 0.1
+        z.warm('nuke', '/a/shot.nk')
+        self.assertEqual(z.get_project_name('/a/shot.nk'), 'proj_shot.nk')
+        self.assertEqual(z.submit_job('nuke', '/a/s.nk', 'Write1', {'frange': '1-10'}), 4242)
+        self.assertEqual(self.server.max_active, 1)
+        self.assertEqual(self.paths().count('/lib/get_preflight_checks.php'), 1)
+
+    def test_warm_errors(self):
+        z = zync.Zync('script', 'token', url=self.base)
+        def unreachable(scene):
+            raise socket.error(111, 'Connection refused')
+        z.get_project_name = unreachable
+        future = z.warm(scene='/a/shot.nk')
+        z._finish_warming()
+        self.assertEqual(future.exception(), None)
+        del z.get_project_name
+        z.cookie = None
+        future = z.warm(scene='/a/shot.nk')
+        z._finish_warming()
+        self.assertTrue(isinstance(future.exception(), zync.ZyncAuthenticationError))
+
+class AsyncTest(ZyncTestCase):
+    def setUp(self):
+        ZyncTestCase.setUp(self)
+        self.posted = Queue.Queue()
+        self.z = zync.Zync('script', 'token', url=self.base,
+            dispatcher=lambda function, *args: self.posted.put((function, args)))
+
+    def pump(self, until, limit=5):
+        """
+        Runs dispatched calls, as an application's event loop would,
+        until until() is true.
+        """
+        end = time.time() + limit
+        while not until() and time.time() < end:
+            try:
+                function, args = self.posted.get(timeout=0.05)
+            except Queue.Empty:
+                continue
+            function(*args)
+
+    def test_callbacks_on_main_thread(self):
+        self.server.delay = 0.2
+        got = []
+        future = self.z.get_project_list_async()
+        future.add_done_callback(lambda future: got.append(
+            (threading.current_thread().name, future.result())))
+        self.assertFalse(future.done())
+        self.pump(lambda: got)
+        self.assertEqual(got, [(threading.current_thread().name, [{'name': 'p'}])])
+
+    def test_submit_job_async(self):
+        progress = []
+        future = self.z.submit_job_async('maya', '/a/b.ma', {'frange': '1-2'},
+            progress=lambda *args: progress.append(args))
+        self.pump(future.done)
+        self.assertEqual(future.result(), 4242)
+        self.assertTrue(progress)
+        bad = self.z.submit_job_async('bogus', '/x')
+        self.pump(bad.done)
+        self.assertTrue(isinstance(bad.exception(), zync.ZyncError))
+
+    def test_blocking_calls_wait(self):
+        self.server.delay = 0.2
+        future = self.z.get_jobs_async()
+        self.assertTrue(self.z.up())
+        self.assertTrue(future.done())
+        future = self.z.get_jobs_async()
+        self.assertEqual(self.z.get_jobs(), [{'id': 1}])
+        self.assertTrue(future.done())
+        self.assertEqual(self.server.max_active, 1)
+
+class ArnoldJobTest(ZyncTestCase):
+    def setUp(self):
+        ZyncTestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.write('tex/wood.tx')
+        self.write('grain.tx')
+        self.scene = self.write('scene.ass', '\n'.join([
+            'options {', ' texture_searchpath "/textures"', '}',
+            'image {', ' name wood', ' filename "%s"' % os.path.join(self.directory, 'tex/wood.tx'), '}',
+            'image {', ' name udim', ' filename "%s"' % os.path.join(self.directory, 'tex/color.<udim>.tx'), '}',
+            'image {', ' name grain', ' filename "grain.tx"', '}',
+            'image {', ' name searched', ' filename "maps/metal.tx"', '}',
+            'driver_exr {', ' filename "/renders/out.exr"', '}', '']))
+        z = zync.Zync('script', 'token', url=self.base)
+        self.job = zync.ArnoldJob(z.cookie, z.url, http=z.http)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, data=''):
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        return path
+
+    def test_scan_files(self):
+        params = {'scene_info': {'files': ['/extra/file.abc']}}
+        self.job._scan_files(self.scene, params)
+        self.assertEqual(params['scene_info']['files'], ['/extra/file.abc',
+            os.path.join(self.directory, 'tex/wood.tx'),
+            os.path.join(self.directory, 'tex/color.<udim>.tx'),
+            os.path.join(self.directory, 'grain.tx'),
+            'maps/metal.tx'])
+
+    def test_missing_file(self):
+        f = open(self.scene, 'ab')
+        f.write('image {\n filename "%s"\n}\n' % os.path.join(self.directory, 'gone.tx'))
+        f.close()
+        try:
+            self.job._scan_files(self.scene, {})
+        except zync.ZyncError, e:
+            self.assertTrue('gone.tx' in str(e))
+            self.assertFalse('metal.tx' in str(e))
+        else:
+            self.fail('No ZyncError for a missing texture.')
+        self.assertRaises(zync.ZyncError, self.job._scan_files, os.path.join(self.directory, 'none.*.ass'), {})
+
+    def test_submit(self):
+        self.assertEqual(self.job.submit(self.scene, {'scene_info': {}}, scan_files=True), 4242)
+        self.assertTrue('grain.tx' in self.server.log[-1][4])
+
+class SitesTest(ZyncTestCase):
+    @classmethod
+    def setUpClass(cls):
+        ZyncTestCase.setUpClass()
+        cls.other, cls.other_base = servers.start_zync()
+
+    @classmethod
+    def tearDownClass(cls):
+        ZyncTestCase.tearDownClass()
+        cls.other.stop()
+
+    def setUp(self):
+        ZyncTestCase.setUp(self)
+        del self.other.log[:]
+        self.other.status = 200
+        self.other.delay = 0
+        self.other.fail.clear()
+        self.other.bodies.clear()
+        self.other.bodies['/lib/get_jobs.php'] = json.dumps([{'id': 2}, {'id': 3}])
+
+    def sites(self):
+        return zync.ZyncSites({self.base: ('script', 'token'), self.other_base: ('script', 'token')})
+
+    def test_merge(self):
+        sites = self.sites()
+        self.assertEqual(sites[self.base].url, self.base)
+        jobs = sites.get_jobs()
+        self.assertEqual(sorted(jobs), sorted([(self.base, {'id': 1}),
+            (self.other_base, {'id': 2}), (self.other_base, {'id': 3})]))
+        self.assertEqual(sites.call('get_project_name', '/a/shot.nk'),
+            {self.base: 'proj_shot.nk', self.other_base: 'proj_shot.nk'})
+        self.assertEqual(self.server.log[-1][2], {'file': ['/a/shot.nk']})
+
+    def test_parallel(self):
+        sites = self.sites()
+        self.server.delay = self.other.delay = 0.3
+        start = time.time()
+        sites.get_project_list()
+        self.assertTrue(time.time() - start < 0.55)
+
+    def test_site_error(self):
+        sites = self.sites()
+        self.other.fail['/lib/get_jobs.php'] = 500
+        self.assertRaises(ValueError, sites.get_jobs)
+        self.assertTrue('/lib/get_jobs.php' in self.paths())
+        self.other.status = 500
+        self.assertRaises(zync.ZyncConnectionError, self.sites)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,15 +4,24 @@ ZYNC Python Library
 A module for interacting with ZYNC.
 """
 
-import sys, os, json, platform
-from urllib import urlencode
-import zync_lib.httplib2
+import sys, os, json, threading
+#
+#   zync_lib.httplib2 and urllib are imported where they're used, the
+#   first time a connection is made, so that importing this module from
+#   a Maya or Nuke startup script is quick.
+#
 
 class ZyncAuthenticationError(Exception):
     pass
 
 class ZyncError(Exception):
-    pass
+    """
+    An error reported by ZYNC. status is the HTTP status of the response
+    it came with, if there was one.
+    """
+    def __init__(self, message='', status=None):
+        Exception.__init__(self, message)
+        self.status = status
 
 class ZyncConnectionError(Exception):
     pass
@@ -20,19 +29,36 @@ class ZyncConnectionError(Exception):
 class ZyncPreflightError(Exception):
     pass
 
-config_path = os.path.dirname(__file__)
-if config_path != '':
-    config_path += '/'
-config_path += 'config.py'
-if not os.path.exists(config_path):
-    raise ZyncError('Could not locate config.py, please create.')
-from config import *
-
 required_config = ['ZYNC_URL']
 
-for key in required_config:
-    if not key in globals():
-        raise Exception('config.py must define a value for %s.' % (key,))
+#
+#   Set from config.py by load_config(), when the first Zync is made.
+#
+ZYNC_URL = None
+
+def load_config():
+    """
+    Loads the settings in config.py into this module. This is done the
+    first time a connection is made rather than on import, and not at
+    all if the required settings have been set already, e.g. by
+    assigning zync.ZYNC_URL.
+    """
+    if all(globals().get(key) is not None for key in required_config):
+        return
+    config_path = os.path.dirname(__file__)
+    if config_path != '':
+        config_path += '/'
+    config_path += 'config.py'
+    if not os.path.exists(config_path):
+        raise ZyncError('Could not locate config.py, please create.')
+    import config
+    for key, value in vars(config).items():
+        if not key.startswith('_') and globals().get(key) is None:
+            globals()[key] = value
+
+    for key in required_config:
+        if globals().get(key) is None:
+            raise Exception('config.py must define a value for %s.' % (key,))
 
 DEFAULT_INSTANCE_TYPE = 'ZYNC16'
 MAYA_DEFAULT_RENDERER = 'vray'
@@ -50,30 +76,93 @@ def load_json(content):
 
     return json.loads(content)
 
+def _prepare_endpoint(client, path):
+    """
+    Returns a prepared request for path on the ZYNC site of client, a
+    HTTPBackend or Job, made with its http and kept in its _endpoints.
+    """
+    try:
+        return client._endpoints[path]
+    except KeyError:
+        prepared = client.http.prepare('%s/%s' % (client.url, path))
+        client._endpoints[path] = prepared
+        return prepared
+
 class HTTPBackend(object):
     """
     Methods for talking to services over http.
     """
-    def __init__(self, script_name, token, timeout=10.0, validate=True):
+    def __init__(self, script_name, token, timeout=10.0, validate=True, cache=None, url=None,
+                 dispatcher=None):
         """
+        The optional cache is passed on to httplib2.Http, e.g. an instance
+        of zync_lib.httplib2.caches.MemoryCache.
+
+        url is the address of the ZYNC site, ZYNC_URL from config.py by
+        default.
+
+        dispatcher runs the callbacks of Futures from the *_async
+        methods; see zync_lib.futures.
         """
-        self.url = ZYNC_URL
+        import zync_lib.httplib2
+        if url is None:
+            load_config()
+            url = ZYNC_URL
+        self.url = url
         self.validate = validate
         if self.validate:
-            self.http = zync_lib.httplib2.Http(timeout=timeout) 
+            self.http = zync_lib.httplib2.Http(timeout=timeout, cache=cache) 
         else:
-            self.http = zync_lib.httplib2.Http(timeout=timeout, disable_ssl_certificate_validation=True) 
+            self.http = zync_lib.httplib2.Http(timeout=timeout, cache=cache, disable_ssl_certificate_validation=True) 
         self.script_name = script_name
         self.token = token
+        self._endpoints = {}
+        self.dispatcher = dispatcher
+        self._executor = None
         if self.up():
             self.cookie = self.__auth(self.script_name, self.token)
         else:
             raise ZyncConnectionError('ZYNC is down at URL: %s' % self.url)
 
+    def _endpoint(self, path):
+        """
+        Returns a prepared request for the given ZYNC endpoint, e.g.
+        'lib/get_jobs.php', so its URL is only parsed once.
+        """
+        #
+        #   self.http isn't thread safe, so requests made while calls are
+        #   running in the background wait for them to finish; every use
+        #   of it goes through here or waits itself, as up() does.
+        #
+        self._wait_background()
+        return _prepare_endpoint(self, path)
+
+    def _background(self, function, *args, **kwargs):
+        """
+        Calls function on this object's background thread, after any
+        calls there already, and returns a zync_lib.futures.Future of
+        its result.
+        """
+        if self._executor is None:
+            from zync_lib import futures
+            self._executor = futures.SerialExecutor()
+        return self._executor.submit(function, args, kwargs, dispatcher=self.dispatcher)
+
+    def _wait_background(self):
+        """
+        Waits for the calls on the background thread to finish, unless
+        called from it.
+        """
+        executor = self._executor
+        if executor is not None and not executor.is_current():
+            executor.wait()
+
     def up(self):
         """
         Ensures that Zync is up and running
         """
+        import zync_lib.httplib2
+        self._wait_background()
         try:
             data = self.http.request(self.url, 'GET')
         except zync_lib.httplib2.ServerNotFoundError:
@@ -90,17 +179,18 @@ class HTTPBackend(object):
         Checks the server status
         """
         if self.up():
-            url = '%s/lib/check_server.php' % (self.url,)
-            resp, status = self.http.request(url, 'GET')
+            resp, status = self._endpoint('lib/check_server.php').request('GET')
             return status
         else:
             return 'down'
 
-    def set_cookie(self, headers={}):
+    def set_cookie(self, headers=None):
         """
         Adds the auth cookie to the given headers, raises
         ZyncAuthenticationError if cookie doesn't exist
         """
+        if headers is None:
+            headers = {}
         if self.cookie:
             headers['Cookie'] = self.cookie
             return headers
@@ -111,14 +201,14 @@ class HTTPBackend(object):
         """
         Authenticate with zync
         """
-        url = '%s/validate.php' % (self.url,)
+        from urllib import urlencode
         args = { 'script_name': script_name, 'token': token }
         if username != None:
             args['user'] = username
             args['pass'] = password
         data = urlencode(args)
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        resp, content = self.http.request(url, 'POST', data, headers=headers)
+        resp, content = self._endpoint('validate.php').request('POST', data, headers=headers)
         response_obj = json.loads( content )
         if response_obj['code'] == 0:
             return resp.get('set-cookie')
@@ -142,9 +232,19 @@ class Zync(HTTPBackend):
     and token to use most API methods.
     """
 
-    def __init__(self, script_name, token, timeout=10.0, application=None):
+    def __init__(self, script_name, token, timeout=10.0, application=None, cache=None, url=None,
+                 dispatcher=None):
         """
         Create a Zync object, for interacting with the ZYNC service.
+
+        Pass a cache object, such as zync_lib.httplib2.caches.MemoryCache(),
+        to cache responses according to their HTTP caching headers.
+
+        Pass url to talk to a site other than ZYNC_URL from config.py.
+
+        Pass a dispatcher, such as zync_lib.futures.qt_dispatcher(), to
+        have the callbacks of Futures from the *_async methods run on the
+        application's main thread.
         """
         #
         #   As of 4/14, with the release of Maya 2015, Autodesk has stopped supporting
@@ -167,7 +267,8 @@ class Zync(HTTPBackend):
         #
         #   Call the HTTPBackend.__init__() method.
         #
-        super(Zync, self).__init__(script_name, token, timeout=timeout, validate=validate)
+        super(Zync, self).__init__(script_name, token, timeout=timeout, validate=validate, cache=cache, url=url,
+                                   dispatcher=dispatcher)
         #
         #   Initialize class variables by pulling various info from ZYNC.
         #
@@ -176,33 +277,83 @@ class Zync(HTTPBackend):
         self.FEATURES = self.get_enabled_features()
         self.JOB_SUBTYPES = self.get_job_subtypes()
         self.MAYA_RENDERERS = self.get_maya_renderers()
+        #
+        #   Jobs and project names fetched ahead of time by warm().
+        #
+        self._warm_jobs = {}
+        self._warm_project_names = {}
+        #
+        #   The httplib2.Http that Jobs use, made when first needed.
+        #
+        self._jobs_http = None
+
+    def warm(self, job_type=None, scene=None):
+        """
+        Gets ready for a submission in the background, e.g. while the user
+        fills in a submit dialog. This opens the connection to ZYNC and,
+        if given, fetches the preflight checks for job_type and the project
+        name for scene, so that submit_job() and get_project_name() don't
+        have to wait for them later. Returns a zync_lib.futures.Future
+        that's done when it has. Not being able to reach ZYNC is ignored,
+        as everything is fetched again when it's needed, but other errors,
+        such as failing to authenticate, are set on the Future.
+        """
+        JobSelect = job_type and self._job_class(job_type)
+        return self._background(self._warm, JobSelect, scene)
+
+    def _warm(self, JobSelect, scene):
+        """
+        The body of warm(), run in the background.
+        """
+        import socket
+        import httplib
+        import zync_lib.httplib2
+        try:
+            if JobSelect:
+                job = self._new_job(JobSelect)
+                self._warm_jobs[job.job_type] = job
+            if scene:
+                self._warm_project_names[scene] = self.get_project_name(scene)
+            if not JobSelect and not scene:
+                self._endpoint('lib/check_server.php').request('GET')
+        except (ZyncConnectionError, socket.error, httplib.HTTPException,
+                zync_lib.httplib2.ServerNotFoundError):
+            #
+            #   Whatever wasn't fetched here is fetched again when it's
+            #   needed, and fails then if ZYNC is still out of reach.
+            #
+            pass
+
+    def _finish_warming(self):
+        """
+        Waits for a running warm() to finish.
+        """
+        self._wait_background()
 
     def get_config(self, var=None):
         """
         Get your site's configuration settings. Use the "var" argument to
         get a specific value, or leave it out to get all values.
         """
-        url = '%s/lib/get_config_api.php' % (self.url,)
+        endpoint = self._endpoint('lib/get_config_api.php')
         headers = self.set_cookie()
         if var == None:
-            resp, content = self.http.request(url, 'GET', headers=headers)
+            resp, content = endpoint.request('GET', headers=headers)
             try:
                 return load_json(content)
             except ValueError:
                 raise ZyncError(content)
         else:
             params = {'var': var}
-            url += '?%s' % (urlencode(params),)
-            resp, content = self.http.request(url, 'GET', headers=headers)
+            resp, content = endpoint.request('GET', headers=headers, query=params)
             return content
 
     def get_instance_types(self):
         """
         Get a list of instance types available to your site.
         """
-        url = '%s/lib/get_instance_types.php' % (self.url,)
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_instance_types.php').request('GET', headers=headers)
         response_obj = load_json(content)
         if response_obj['code'] == 1:
             raise ZyncError('Could not retrieve list of instance types: %s' % (response_obj['response'],))
@@ -212,9 +363,8 @@ class Zync(HTTPBackend):
         """
         Get a list of enabled features available to your site.
         """
-        url = '%s/lib/get_enabled_features.php' % (self.url,)
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_enabled_features.php').request('GET', headers=headers)
         response_obj = load_json(content)
         if response_obj['code'] == 1:
             raise ZyncError('Could not retrieve list of enabled features: %s' % (response_obj['response'],))
@@ -226,9 +376,8 @@ class Zync(HTTPBackend):
         typically only be "render" - in the future ZYNC will likely support
         other subtypes like Texture Baking, etc.
         """
-        url = '%s/lib/get_job_subtypes.php' % (self.url,)
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_job_subtypes.php').request('GET', headers=headers)
         response_obj = load_json(content)
         if response_obj['code'] == 1:
             raise ZyncError('Could not retrieve list of Job Types: %s' % (response_obj['response'],))
@@ -238,21 +387,29 @@ class Zync(HTTPBackend):
         """
         Get a list of Maya renderers available to your site.
         """
-        url = '%s/lib/get_maya_renderers.php' % (self.url,)
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_maya_renderers.php').request('GET', headers=headers)
         response_obj = load_json(content)
         if response_obj['code'] == 1:
             raise ZyncError('Could not retrieve list of Maya renderers: %s' % (response_obj['response'],))
         return response_obj['response']
 
+    def plan(self, frange, frame_time, **kwargs):
+        """
+        Recommends the instance_type, num_instances and chunk_size for a
+        job from the instance types available to your site. Returns a
+        zync_lib.planner.Plan; use its apply() method on your submit
+        params. See zync_lib.planner.plan() for the other arguments.
+        """
+        from zync_lib import planner
+        return planner.plan(frange, frame_time, self.INSTANCE_TYPES, **kwargs)
+
     def get_project_list(self):
         """
         Get a list of existing ZYNC projects on your site.
         """
-        url = '%s/lib/get_project_list.php' % (self.url,)
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_project_list.php').request('GET', headers=headers)
         return load_json(content)
 
     def get_project_name(self, in_file):
@@ -260,20 +417,21 @@ class Zync(HTTPBackend):
         Takes the name of a file - either a Maya or Nuke script - and returns
         the default ZYNC project name for it.
         """
+        self._finish_warming()
+        if in_file in self._warm_project_names:
+            return self._warm_project_names.pop(in_file)
         params = {'file': in_file}
-        url = '%s/lib/get_project_name.php?%s' % (self.url, urlencode(params))
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_project_name.php').request('GET', headers=headers, query=params)
         return load_json(content)
 
     def get_jobs(self, max=100):
         """
         Returns a list of existing ZYNC jobs. 
         """
-        url = '%s/lib/get_jobs.php' % (self.url,)
         params = dict(max=max)
-        url = '?'.join((url, urlencode(params)))
-        resp, content = self.http.request(url, 'GET', headers=headers) 
+        headers = self.set_cookie()
+        resp, content = self._endpoint('lib/get_jobs.php').request('GET', headers=headers, query=params)
         return load_json(content)
 
     def get_job_details(self, job_id):
@@ -281,40 +439,127 @@ class Zync(HTTPBackend):
         Get a list of a specific job's details.
         """
         params = {'job_id': job_id}
-        url = '%s/lib/get_job_params.php?%s' % (self.url, urlencode(params))
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
+        resp, content = self._endpoint('lib/get_job_params.php').request('GET', headers=headers, query=params)
         return content
 
-    def submit_job(self, job_type, *args, **kwargs):
+    def _job_class(self, job_type):
         """
-        Submit a new job to ZYNC.
+        Returns the Job subclass for the given job_type.
         """
-        #
-        #   Select a Job subclass based on the job_type argument.
-        #
         job_type = job_type.lower()
         if job_type == 'nuke':
-            JobSelect = NukeJob
+            return NukeJob
         elif job_type == 'maya':
-            JobSelect = MayaJob
+            return MayaJob
         elif job_type == 'arnold':
-            JobSelect = ArnoldJob
+            return ArnoldJob
         else:
             raise ZyncError('Unrecognized job_type "%s".' % (job_type,))
+
+    def _job_http(self):
+        """
+        Returns the httplib2.Http that Jobs use. It has connections of its
+        own, and not self.http's timeout or cache: sending a job can take
+        much longer than the timeout, and mustn't be cached.
+        """
+        if self._jobs_http is None:
+            import zync_lib.httplib2
+            self._jobs_http = zync_lib.httplib2.Http(
+                disable_ssl_certificate_validation=not self.validate)
+        return self._jobs_http
+
+    def _new_job(self, JobSelect):
+        """
+        Returns a new JobSelect with its preflight checks fetched.
+        """
+        job = JobSelect(self.cookie, self.url, validate=self.validate, http=self._job_http())
+        #
+        #   Jobs share one Http, which may be in use on the background
+        #   thread, so their requests wait for calls running there, as
+        #   this object's do.
+        #
+        job._wait = self._wait_background
+        job.preflight_checks = job.get_preflight_checks()
+        return job
+
+    def _prepare_job(self, job_type):
+        """
+        Returns a Job for job_type with its preflight checks fetched,
+        picking up the one warm() made if there is one.
+        """
         #
-        #   Initialize the Job subclass.
+        #   Select a Job subclass based on the job_type argument.
+        #
+        JobSelect = self._job_class(job_type)
         #
-        self.job = JobSelect(self.cookie, self.url, validate=self.validate)
+        #   Initialize the Job subclass, or pick up the one warm() made.
+        #
+        self._finish_warming()
+        job = self._warm_jobs.pop(job_type.lower(), None)
+        if job is None:
+            job = self._new_job(JobSelect)
+        else:
+            job.set_cookie(cookie=self.cookie)
+        self.job = job
+        return job
+
+    def submit_job(self, job_type, *args, **kwargs):
+        """
+        Submit a new job to ZYNC.
+        """
+        job = self._prepare_job(job_type)
         #
         #   Run job.preflight(). If preflight does not succeed, an error will be
         #   thrown, so no need to check output here.
         #
-        self.job.preflight()
+        job.preflight()
         #
         #   Submit the job and return the output of that method.
         #
-        return self.job.submit(*args, **kwargs)
+        return job.submit(*args, **kwargs)
+
+    def submit_job_async(self, job_type, *args, **kwargs):
+        """
+        Like submit_job(), but returns a zync_lib.futures.Future of the
+        job ID straight away. The preflight checks are fetched and the
+        job is sent in the background; the checks themselves are run in
+        between through the dispatcher, since they call Maya's or Nuke's
+        API, which only works from the main thread. A progress callback
+        is called through the dispatcher too.
+        """
+        from zync_lib import futures
+        result = futures.Future(self.dispatcher)
+        progress = kwargs.get('progress')
+        if progress is not None and self.dispatcher is not None:
+            kwargs['progress'] = lambda *args: self.dispatcher(progress, *args)
+        def prepared(future):
+            try:
+                job = future.result()
+                job.preflight()
+            except Exception:
+                result.set_exception(sys.exc_info())
+            else:
+                futures.chain(self._background(job.submit, *args, **kwargs), result)
+        self._background(self._prepare_job, job_type).add_done_callback(prepared)
+        return result
+
+    def call_async(self, method, *args, **kwargs):
+        """
+        Calls the named method in the background, after any calls
+        already there, and returns a zync_lib.futures.Future of its
+        result. Calls made the usual way meanwhile wait for it to finish.
+        """
+        return self._background(getattr(self, method), *args, **kwargs)
+
+    def get_project_list_async(self):
+        return self.call_async('get_project_list')
+
+    def get_project_name_async(self, in_file):
+        return self.call_async('get_project_name', in_file)
+
+    def get_jobs_async(self, max=100):
+        return self.call_async('get_jobs', max=max)
 
     def submit(self, *args, **kwargs):
         """
@@ -323,15 +568,105 @@ class Zync(HTTPBackend):
         """
         return self.job.submit(*args, **kwargs)
 
+class ZyncSites(object):
+    """
+    Talks to several ZYNC sites at once. Queries are sent to all of the
+    sites in parallel and their results merged. Each site has its own
+    Zync object, and so keeps its own connections open between queries.
+    """
+
+    def __init__(self, sites, timeout=10.0, application=None, cache=None):
+        """
+        sites is a dict of each site's URL to its (script_name, token).
+        The sites are connected to in parallel.
+
+        Pass a cache object to share it between the sites; responses are
+        cached by URL, so they won't be mixed up.
+        """
+        self.urls = sorted(sites)
+        calls = []
+        for url in self.urls:
+            script_name, token = sites[url]
+            calls.append((url, Zync, (script_name, token),
+                dict(timeout=timeout, application=application, cache=cache, url=url)))
+        self.sites = self._parallel(calls)
+
+    def __getitem__(self, url):
+        """
+        Returns the Zync object for the given site URL.
+        """
+        return self.sites[url]
+
+    def _parallel(self, calls):
+        """
+        Makes the given (url, function, args, kwargs) calls, each on its
+        own thread, and returns a dict of each url to its call's result.
+        If any of the calls raised an error, the first site's error is
+        raised once they have all finished.
+        """
+        results = {}
+        errors = {}
+        def run(url, function, args, kwargs):
+            try:
+                results[url] = function(*args, **kwargs)
+            except Exception:
+                errors[url] = sys.exc_info()
+        threads = []
+        for call in calls:
+            thread = threading.Thread(target=run, args=call)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        for url in self.urls:
+            if url in errors:
+                exc_type, exc_value, exc_tb = errors[url]
+                raise exc_type, exc_value, exc_tb
+        return results
+
+    def call(self, method, *args, **kwargs):
+        """
+        Calls the named Zync method on every site, in parallel, and
+        returns a dict of each site URL to what the method returned.
+        """
+        return self._parallel([(url, getattr(self.sites[url], method), args, kwargs)
+            for url in self.urls])
+
+    def _merge(self, method, *args, **kwargs):
+        """
+        Calls the named Zync method on every site and returns the lists
+        it returned joined together, as (site URL, item) pairs.
+        """
+        results = self.call(method, *args, **kwargs)
+        return [(url, item) for url in self.urls for item in results[url]]
+
+    def get_jobs(self, max=100):
+        """
+        Returns a list of (site URL, job) for the existing jobs on every
+        site, up to max from each.
+        """
+        return self._merge('get_jobs', max=max)
+
+    def get_project_list(self):
+        """
+        Returns a list of (site URL, project) for the projects on every
+        site.
+        """
+        return self._merge('get_project_list')
+
 class Job(object):
     """
     ZYNC Job main class.
     """
-    def __init__(self, cookie, url, validate=True):
+    def __init__(self, cookie, url, validate=True, http=None):
         """
         The base ZYNC Job object, not useful on its own, but should be
         the parent for application-specific Job implementations.
+
+        Pass an existing httplib2.Http as http to reuse its connections.
         """
+        import zync_lib.httplib2
         if cookie:
             self.cookie = cookie
         else:
@@ -339,19 +674,35 @@ class Job(object):
 
         self.url = url
         self.validate = validate
-        if self.validate:
+        if http is not None:
+            self.http = http
+        elif self.validate:
             self.http = zync_lib.httplib2.Http()
         else:
             self.http = zync_lib.httplib2.Http(disable_ssl_certificate_validation=True) 
             print 'ZYNC WARNING: disabling SSL validation due to out-of-date system libraries. Please contact ZYNC Tech Support for more info on this issue.'
 
         self.job_type = None
+        self.preflight_checks = None
+        self._endpoints = {}
+        self._wait = None
+
+    def _endpoint(self, path):
+        """
+        Returns a prepared request for the given ZYNC endpoint, e.g.
+        'lib/set_job_status.php', so its URL is only parsed once.
+        """
+        if self._wait is not None:
+            self._wait()
+        return _prepare_endpoint(self, path)
 
-    def set_cookie(self, headers={}, cookie=None):
+    def set_cookie(self, headers=None, cookie=None):
         """
         Adds the auth cookie to the given headers, raises
         ZyncAuthenticationError if cookie doesn't exist.
         """
+        if headers is None:
+            headers = {}
         if cookie:
             self.cookie = cookie
 
@@ -365,10 +716,8 @@ class Job(object):
         """
         Returns a dictionary of the job details.
         """
-        url = '/'.join((self.url, 'lib', 'get_job_params.php'))
-        data = urlencode({'job_id': job_id})
-        url = '?'.join((url, data))
-        resp, content = self.http.request(url, 'GET')
+        params = {'job_id': job_id}
+        resp, content = self._endpoint('lib/get_job_params.php').request('GET', query=params)
         return load_json(content)
 
     def set_status(self, job_id, status):
@@ -376,10 +725,8 @@ class Job(object):
         Sets the job status for the given job. This is the method by which most
         job controls are initiated.
         """
-        url = '%s/lib/set_job_status.php' % (self.url,)
-        data = urlencode(dict(job_id=job_id, status=status))
-        url = '?'.join((url, data))
-        return self.http.request(url, 'GET')
+        params = dict(job_id=job_id, status=status)
+        return self._endpoint('lib/set_job_status.php').request('GET', query=params)
 
     def cancel(self, job_id):
         """
@@ -415,10 +762,8 @@ class Job(object):
         """
         Retries the errored tasks for the given job ID.
         """
-        url = '%s/lib/retry_errors.php' % (self.url,)
-        data = urlencode({'job_id': job_id})
-        url = '?'.join((url, data))
-        return self.http.request(url, 'GET')
+        params = {'job_id': job_id}
+        return self._endpoint('lib/retry_errors.php').request('GET', query=params)
 
     def get_preflight_checks(self):
         """
@@ -427,14 +772,18 @@ class Job(object):
         if self.job_type == None:
             raise ZyncError('job_type parameter not set. This is probably because your subclass of Job doesn\'t define it.')
         params = {'job_type': self.job_type}
-        url = '%s/lib/get_preflight_checks.php?%s' % (self.url, urlencode(params)) 
         headers = self.set_cookie()
-        resp, content = self.http.request(url, 'GET', headers=headers)
-        content_obj = json.loads( content )
+        resp, content = self._endpoint('lib/get_preflight_checks.php').request('GET', headers=headers, query=params)
+        try:
+            content_obj = json.loads( content )
+        except ValueError:
+            raise ZyncError('Could not retrieve list of preflight checks: HTTP %d %s' % (resp.status, resp.reason),
+                            status=resp.status)
         if content_obj["code"] == 0:
             return content_obj["response"]
         else:
-            raise ZyncError('Could not retrieve list of preflight checks: %s' % (content_obj['response'],)) 
+            raise ZyncError('Could not retrieve list of preflight checks: %s' % (content_obj['response'],),
+                            status=resp.status)
 
     def preflight(self):
         """
@@ -442,9 +791,12 @@ class Job(object):
         submitting the job to ZYNC.
         """
         #
-        #   Get the list of preflight checks.
+        #   Get the list of preflight checks, unless it's been fetched
+        #   already.
         #
-        preflight_list = self.get_preflight_checks()
+        preflight_list = self.preflight_checks
+        if preflight_list is None:
+            preflight_list = self.get_preflight_checks()
         #
         #   Set up the environment needed to run the API commands passed to us. If
         #   Exceptions occur when loading the app APIs, return, as we're probably
@@ -497,14 +849,18 @@ class Job(object):
             if len(matches) > 0:
                 raise ZyncPreflightError(preflight_obj['error'].replace('%match%', ', '.join(matches)))
 
-    def submit(self, params):
+    def submit(self, params, progress=None):
         """
         Submit a new job to ZYNC.
+
+        progress is called as progress(sent, total, rate) while the
+        submission is uploaded, with the bytes sent so far, the total and
+        the bytes sent per second.
         """
+        from urllib import urlencode
         #
-        #   Build the base URL and headers.
+        #   Build the headers.
         #
-        url = '%s/lib/submit_job_v2.php' % (self.url,)
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         #
         #   The submit_params dict will store most job options. Build 
@@ -538,15 +894,19 @@ class Job(object):
         #
         #   Fire off the HTTP request to make the job submission.
         #
-        resp, content = self.http.request(url, 'POST', urlencode(submit_params), headers=headers)
+        resp, content = self._endpoint('lib/submit_job_v2.php').request('POST', urlencode(submit_params), headers=headers, progress=progress)
         #
         #   A return code of 0 means the submission succeeded. Return the job ID.
         #   Otherwise, an error occurred, and the response field contains the error
-        #   message; raise an error with that message.
+        #   message; raise an error with that message. A response that isn't
+        #   JSON at all is an error page, e.g. from a busy server.
         #
-        response_obj = load_json(content)
+        try:
+            response_obj = load_json(content)
+        except ValueError:
+            raise ZyncError('Could not submit job: HTTP %d %s' % (resp.status, resp.reason), status=resp.status)
         if response_obj['code'] != 0:
-            raise ZyncError('Could not submit job: %s' % (response_obj['response'],))
+            raise ZyncError('Could not submit job: %s' % (response_obj['response'],), status=resp.status)
         return response_obj['response']
  
 class NukeJob(Job):
@@ -560,10 +920,17 @@ class NukeJob(Job):
         super(NukeJob, self).__init__(*args, **kwargs)
         self.job_type = 'nuke'
 
-    def submit(self, script_path, write_name, params=None):
+    def submit(self, script_path, write_name, params=None, check_write_nodes=False, progress=None):
         """
         Submits a Nuke job to ZYNC.
 
+        With check_write_nodes, the script is read to make sure
+        write_name is an enabled Write node, or for 'All' that there are
+        some, and that they render some of frange, raising a ZyncError
+        before anything is sent if not. See zync_lib.nuke_script.
+
+        progress is as for Job.submit().
+
         Nuke-specific submit parameters. * == required.
 
         * write_node: The write node to render. Can be 'All' to render
@@ -588,10 +955,26 @@ class NukeJob(Job):
 	submit_params['file'] = script_path 
         if params:
             submit_params.update(params)
+        if check_write_nodes:
+            self._check_write_nodes(submit_params)
         #
         #   Fire Job.submit() to submit the job.
         #
-        return super(NukeJob, self).submit(submit_params)
+        return super(NukeJob, self).submit(submit_params, progress=progress)
+
+    def _check_write_nodes(self, submit_params):
+        """
+        Raises a ZyncError if the submit params' write_node won't render
+        anything.
+        """
+        from zync_lib import frange, nuke_script
+        frame_range = None
+        try:
+            if submit_params.get('frange'):
+                frame_range = frange.FrameRange(submit_params['frange'], int(submit_params.get('step', 1)))
+            nuke_script.resolve(submit_params['file'], submit_params['write_node'], frame_range)
+        except (IOError, OSError, ValueError), e:
+            raise ZyncError(str(e))
 
 class MayaJob(Job):
     """
@@ -604,10 +987,12 @@ class MayaJob(Job):
         super(MayaJob, self).__init__(*args, **kwargs)
         self.job_type = 'maya'
 
-    def submit(self, file, params=None):
+    def submit(self, file, params=None, progress=None):
         """
         Submits a Maya job to ZYNC.
 
+        progress is as for Job.submit().
+
         Maya-specific submit parameters. * == required.
 
         * camera: The name of the render camera.
@@ -715,7 +1100,7 @@ class MayaJob(Job):
         #
         #   Fire Job.submit() to submit the job.
         #
-        return super(MayaJob, self).submit(submit_params)
+        return super(MayaJob, self).submit(submit_params, progress=progress)
 
 class ArnoldJob(Job):
     """
@@ -728,10 +1113,17 @@ class ArnoldJob(Job):
         super(ArnoldJob, self).__init__(*args, **kwargs)
         self.job_type = 'arnold'
 
-    def submit(self, file, params=None):
+    def submit(self, file, params=None, scan_files=False, progress=None):
         """
         Submits an Arnold job to ZYNC.
 
+        With scan_files, the scenes matched by file are read for the
+        textures and procedurals they use, which are added to
+        scene_info['files'], and a ZyncError lists any that are missing,
+        before anything is sent. See zync_lib.scene_scan.
+
+        progress is as for Job.submit().
+
         Arnold-specific submit parameters. * == required.
 
         NOTE: the "file" param can contain a wildcard to render multiple Arnold
@@ -771,8 +1163,48 @@ class ArnoldJob(Job):
         submit_params['file'] = file
         if params:
             submit_params.update(params)
+        if scan_files:
+            self._scan_files(file, submit_params)
         #
         #   Fire Job.submit() to submit the job.
         #
-        return super(ArnoldJob, self).submit(submit_params)
+        return super(ArnoldJob, self).submit(submit_params, progress=progress)
+
+    def _scan_files(self, file, submit_params):
+        """
+        Adds the files the scenes matching file depend on to the submit
+        params' scene_info['files'].
+        """
+        from zync_lib import scene_scan
+        scenes = scene_scan.expand(file)
+        if not scenes:
+            raise ZyncError('No Arnold scenes match "%s".' % (file,))
+        directory = os.path.dirname(os.path.abspath(scenes[0]))
+        files = []
+        missing = []
+        for path in scene_scan.dependencies(scenes):
+            if any(c in path for c in '<#%'):
+                #
+                #   Paths with frame or UDIM tokens in them can't be checked here.
+                #
+                files.append(path)
+            elif not os.path.isabs(path):
+                #
+                #   Relative paths are looked for next to the scenes; if
+                #   they aren't there, Arnold finds them through a
+                #   searchpath, and they can't be checked here either.
+                #
+                resolved = os.path.join(directory, path)
+                files.append(resolved if os.path.exists(resolved) else path)
+            else:
+                files.append(path)
+                if not os.path.exists(path):
+                    missing.append(path)
+        if missing:
+            raise ZyncError('Missing files used by "%s":\n%s' % (file, '\n'.join(missing)))
+        scene_info = submit_params['scene_info'] = dict(submit_params.get('scene_info') or {})
+        existing = list(scene_info.get('files') or [])
+        seen = set(existing)
+        scene_info['files'] = existing + [path for path in files
+            if not (path in seen or seen.add(path))]
 
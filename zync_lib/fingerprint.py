@@ -0,0 +1,205 @@
+"""
+Content fingerprints for scene dependencies.
+
+Hashes the files a job depends on, so that what was submitted can be
+recorded and compared between submissions:
+
+    manifest = fingerprint.fingerprint(scene_info['files'],
+                                       cache_path='~/.zync/fingerprints.json')
+    fingerprint.attach(params, manifest)
+
+Files are hashed in parallel, through mmap so they aren't copied into
+Python strings. With a cache_path, each file's digest is remembered
+along with its size and modification time, so unchanged files, however
+big, are only hashed once.
+"""
+
+import os
+import json
+import mmap
+import hashlib
+import tempfile
+import multiprocessing.pool
+
+ALGORITHM = 'sha1'
+
+# Files are mapped this much at a time, so big files don't need a big
+# address space. A multiple of mmap.ALLOCATIONGRANULARITY.
+WINDOW_SIZE = 64 * 1024 * 1024
+
+def hash_file(path):
+    """
+    Returns the hex digest of the file at path.
+    """
+    digest = hashlib.new(ALGORITHM)
+    f = open(path, 'rb')
+    try:
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset < size:
+            length = min(WINDOW_SIZE, size - offset)
+            window = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=offset)
+            try:
+                digest.update(window)
+            finally:
+                window.close()
+            offset += length
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+def _key(path):
+    """
+    Returns path as it is keyed in a saved manifest: JSON gives back
+    unicode.
+    """
+    if isinstance(path, str):
+        return path.decode('utf-8', 'replace')
+    return path
+
+def _hash_entry(entry):
+    path, size, mtime = entry
+    return path, size, mtime, hash_file(path)
+
+class Manifest(object):
+    """
+    The fingerprints of a set of files, as a dict of each path to its
+    (size, mtime, digest). Paths that couldn't be read are listed in
+    missing.
+    """
+    def __init__(self, entries=None, missing=None):
+        self.entries = dict(entries or {})
+        self.missing = list(missing or [])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def digest(self, path):
+        return self.entries[path][2]
+
+    def digests(self):
+        """
+        Returns a dict of each path to its digest.
+        """
+        return dict((path, entry[2]) for path, entry in self.entries.iteritems())
+
+    def diff(self, other):
+        """
+        Compares this manifest with an earlier one. Returns the lists of
+        paths (added, removed, changed).
+        """
+        added = sorted(path for path in self.entries if path not in other.entries)
+        removed = sorted(path for path in other.entries if path not in self.entries)
+        changed = sorted(path for path in self.entries
+            if path in other.entries and self.digest(path) != other.digest(path))
+        return added, removed, changed
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a manifest saved with save(). A missing or unreadable file
+        gives an empty manifest.
+        """
+        try:
+            f = open(os.path.expanduser(path), 'rb')
+            try:
+                data = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return cls()
+        if data.get('algorithm') != ALGORITHM:
+            return cls()
+        return cls((path, tuple(entry)) for path, entry in data.get('files', {}).iteritems())
+
+    def save(self, path):
+        """
+        Writes the manifest to path as JSON. The file is replaced in one
+        step, so readers never see it half written.
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                json.dump({'algorithm': ALGORITHM, 'files': self.entries}, f)
+            finally:
+                f.close()
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+        except:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+def fingerprint(paths, cache_path=None, workers=None, processes=False):
+    """
+    Returns a Manifest of the given files.
+
+    cache_path is a JSON file of digests from earlier runs. A file whose
+    size and modification time haven't changed isn't hashed again, and
+    new digests are added to the cache.
+
+    Files are hashed by a pool of workers, one per CPU by default.
+    Threads are used unless processes is True; they're cheaper to start
+    and hashlib lets them run in parallel, and starting processes from
+    inside Maya or Nuke re-launches the application on Windows.
+    """
+    cache = None
+    if cache_path:
+        cache = Manifest.load(cache_path)
+    entries = {}
+    missing = []
+    todo = []
+    for path in set(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            missing.append(path)
+            continue
+        cached = cache is not None and cache.entries.get(_key(path))
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            entries[path] = cached
+        else:
+            todo.append((path, stat.st_size, stat.st_mtime))
+
+    if todo:
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        workers = max(1, min(workers, len(todo)))
+        if processes:
+            pool = multiprocessing.Pool(workers)
+        else:
+            pool = multiprocessing.pool.ThreadPool(workers)
+        try:
+            #
+            #   Biggest first, so one huge file doesn't start last.
+            #
+            todo.sort(key=lambda entry: entry[1], reverse=True)
+            for path, size, mtime, digest in pool.imap_unordered(_hash_entry, todo):
+                entries[path] = (size, mtime, digest)
+        finally:
+            pool.close()
+            pool.join()
+        if cache is not None:
+            for path, size, mtime in todo:
+                cache.entries[_key(path)] = entries[path]
+            cache.save(cache_path)
+
+    return Manifest(entries, sorted(missing))
+
+def attach(params, manifest):
+    """
+    Adds the manifest's digests to the scene_info of the given submit
+    params, as scene_info['manifest'], and returns the params.
+    """
+    scene_info = params.setdefault('scene_info', {})
+    scene_info['manifest'] = {'algorithm': ALGORITHM, 'files': manifest.digests()}
+    return params
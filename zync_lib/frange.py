@@ -0,0 +1,194 @@
+"""
+Frame ranges.
+
+Parses frame range expressions like "1-24,30-40x2", works out the tasks
+a job will be split into, and compresses lists of frames back into
+range notation, so jobs can be checked and sized before they are
+submitted. Ranges are kept as (start, end, step) triples and only
+expanded into frames when needed, and then into an array, so ranges of
+millions of frames stay cheap.
+"""
+
+import re
+import array
+import operator
+import itertools
+
+RANGE_RE = re.compile(r'^(-?\d+)(?:-(-?\d+)(?:[x:](\d+))?)?$')
+
+def _count(start, end, step):
+    return (end - start) // step + 1
+
+def _format(start, end, step):
+    if start == end:
+        return str(start)
+    elif step == 1:
+        return '%d-%d' % (start, end)
+    else:
+        return '%d-%dx%d' % (start, end, step)
+
+def parse(expr, step=1):
+    """
+    Parses a frame range expression into a list of (start, end, step)
+    triples, in the order given. Ranges without a step of their own use
+    step. Raises ValueError if the expression is malformed.
+    """
+    ranges = []
+    for part in re.split(r'[,\s]+', str(expr).strip()):
+        if not part:
+            continue
+        match = RANGE_RE.match(part)
+        if not match:
+            raise ValueError('Invalid frame range "%s".' % (part,))
+        start = int(match.group(1))
+        if match.group(2) is None:
+            ranges.append((start, start, 1))
+            continue
+        end = int(match.group(2))
+        range_step = int(match.group(3) or step)
+        if end < start or range_step < 1:
+            raise ValueError('Invalid frame range "%s".' % (part,))
+        ranges.append((start, start + (_count(start, end, range_step) - 1) * range_step, range_step))
+    return ranges
+
+def compress(frames):
+    """
+    Returns a compact range expression for the given frames, e.g.
+    [1, 2, 3, 5, 7, 9, 20] -> "1-3,5-9x2,20". Duplicates and order
+    don't matter. Runs are taken greedily, from the first frame on, so
+    the expression isn't always the shortest possible: [1, 2, 4, 6, 8]
+    gives "1-2,4-8x2" rather than "1,2-8x2".
+    """
+    if not isinstance(frames, array.array):
+        frames = array.array('l', frames)
+    if not all(itertools.imap(operator.lt, frames, itertools.islice(frames, 1, None))):
+        frames = array.array('l', sorted(set(frames)))
+    return ','.join(_format(*r) for r in _runs(frames))
+
+def _runs(frames):
+    """
+    Splits sorted, unique frames into (start, end, step) runs, each as
+    long as it can be from where the last one ended. The gaps between
+    frames are worked out and grouped in C, so only the runs, not the
+    frames, are looped over in Python.
+    """
+    if not frames:
+        return []
+    runs = []
+    diffs = itertools.imap(operator.sub, itertools.islice(frames, 1, None), frames)
+    done = 0    # index of the first frame not in a run yet
+    first = 0   # index of the first frame of the current group of gaps
+    for step, group in itertools.groupby(diffs):
+        last = first + len(list(group))
+        start = max(done, first)
+        if last - start >= 2 or (step == 1 and last > start):
+            runs.append((frames[start], frames[last], step))
+            done = last + 1
+        elif last > start:
+            #
+            #   Two frames with a gap between them; the second may start
+            #   the next run.
+            #
+            runs.append((frames[start], frames[start], 1))
+            done = start + 1
+        first = last
+    if done < len(frames):
+        runs.append((frames[done], frames[done], 1))
+    return runs
+
+class FrameRange(object):
+    """
+    A set of frames, e.g. FrameRange('1-24,30-40x2') or
+    FrameRange('1-100', step=2). Raises ValueError if the expression is
+    malformed or has no frames.
+    """
+    def __init__(self, expr, step=1):
+        ranges = sorted(parse(expr, step))
+        if not ranges:
+            raise ValueError('Empty frame range "%s".' % (expr,))
+        for previous, current in zip(ranges, ranges[1:]):
+            if current[0] <= previous[1]:
+                #
+                #   Overlapping ranges; work out which frames they cover.
+                #
+                frames = array.array('l', sorted(set(self._expand(ranges))))
+                self.ranges = _runs(frames)
+                break
+        else:
+            self.ranges = []
+            for current in ranges:
+                previous = self.ranges and self.ranges[-1]
+                if previous and previous[2] == 1 and current[2] == 1 and current[0] == previous[1] + 1:
+                    self.ranges[-1] = (previous[0], current[1], 1)
+                else:
+                    self.ranges.append(current)
+
+    @staticmethod
+    def _expand(ranges):
+        frames = array.array('l')
+        for start, end, step in ranges:
+            frames.extend(xrange(start, end + 1, step))
+        return frames
+
+    def frames(self):
+        """
+        Returns the frames, in order, as an array.
+        """
+        return self._expand(self.ranges)
+
+    def __len__(self):
+        return sum(_count(*r) for r in self.ranges)
+
+    def __iter__(self):
+        for start, end, step in self.ranges:
+            for frame in xrange(start, end + 1, step):
+                yield frame
+
+    def __contains__(self, frame):
+        for start, end, step in self.ranges:
+            if start <= frame <= end and (frame - start) % step == 0:
+                return True
+        return False
+
+    def __str__(self):
+        return ','.join(_format(*r) for r in self.ranges)
+
+    def __repr__(self):
+        return 'FrameRange(%r)' % (str(self),)
+
+    def first(self):
+        return self.ranges[0][0]
+
+    def last(self):
+        return self.ranges[-1][1]
+
+    def chunks(self, chunk_size=1):
+        """
+        Returns the (start, end) frames of each task the range will be
+        split into. A task renders up to chunk_size consecutive frames;
+        frames from a range with a step > 1 get a task each, as ZYNC
+        sets chunk_size to 1 for them.
+        """
+        chunk_size = max(1, int(chunk_size))
+        chunks = []
+        for start, end, step in self.ranges:
+            if step > 1:
+                chunks.extend((frame, frame) for frame in xrange(start, end + 1, step))
+            else:
+                chunks.extend((frame, min(frame + chunk_size - 1, end))
+                    for frame in xrange(start, end + 1, chunk_size))
+        return chunks
+
+    def num_chunks(self, chunk_size=1):
+        """
+        Returns the number of tasks chunks() would return, without
+        making them.
+        """
+        chunk_size = max(1, int(chunk_size))
+        total = 0
+        for start, end, step in self.ranges:
+            if step > 1:
+                total += _count(start, end, step)
+            else:
+                total += (end - start) // chunk_size + 1
+        return total
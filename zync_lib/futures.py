@@ -0,0 +1,219 @@
+"""
+Futures for ZYNC calls made in the background.
+
+Zync's *_async methods return a Future straight away and make their
+requests on a background thread, so Maya's or Nuke's UI doesn't freeze
+while they wait on the network. Results are picked up with callbacks:
+
+    z = zync.Zync('script_name', 'token', dispatcher=futures.qt_dispatcher())
+    z.get_project_list_async().add_done_callback(
+        lambda future: dialog.set_projects(future.result()))
+
+A dispatcher decides which thread callbacks run on. It's called as
+dispatcher(function, *args), and should arrange for function(*args) to
+be called soon, without waiting for it. Without one, callbacks run on
+the background thread, which mustn't touch the UI; qt_dispatcher(),
+maya_dispatcher() and nuke_dispatcher() run them on the main thread.
+"""
+
+import sys
+import threading
+import Queue
+
+class TimeoutError(Exception):
+    pass
+
+class Future(object):
+    """
+    The result of a call that's running in the background.
+    """
+    def __init__(self, dispatcher=None):
+        self.dispatcher = dispatcher
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to finish and returns what it returned, or
+        raises what it raised. Raises TimeoutError if it hasn't finished
+        after timeout seconds.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError()
+        if self._exc_info is not None:
+            exc_type, exc_value, exc_tb = self._exc_info
+            raise exc_type, exc_value, exc_tb
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Waits for the call to finish and returns what it raised, or None.
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError()
+        return self._exc_info and self._exc_info[1]
+
+    def add_done_callback(self, callback):
+        """
+        Arranges for callback(future) to be called, through the
+        dispatcher, when the call finishes, or now if it has.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._dispatch(callback)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, exc_info):
+        """
+        Finishes the future with the sys.exc_info() of an error.
+        """
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._dispatch(callback)
+
+    def _dispatch(self, callback):
+        if self.dispatcher is None:
+            _call(callback, self)
+        else:
+            self.dispatcher(_call, callback, self)
+
+def _call(callback, future):
+    try:
+        callback(future)
+    except Exception:
+        #
+        #   A broken callback mustn't take the background thread, or
+        #   the application's event loop, down with it.
+        #
+        sys.excepthook(*sys.exc_info())
+
+def chain(source, target):
+    """
+    Finishes target the same way source finishes.
+    """
+    def finished(future):
+        if future._exc_info is not None:
+            target.set_exception(future._exc_info)
+        else:
+            target.set_result(future._result)
+    source.add_done_callback(finished)
+
+class SerialExecutor(object):
+    """
+    Runs calls one at a time, in the order they're submitted, on a
+    background thread of their own, started when first needed. Zync
+    objects aren't thread safe, so each has one of these.
+    """
+    def __init__(self):
+        self._queue = Queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, function, args=(), kwargs=None, dispatcher=None):
+        """
+        Queues function(*args, **kwargs) and returns a Future of its
+        result, whose callbacks go through dispatcher.
+        """
+        future = Future(dispatcher)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='zync-background')
+                self._thread.daemon = True
+                self._thread.start()
+            self._queue.put((future, function, args, kwargs or {}))
+        return future
+
+    def is_current(self):
+        """
+        Returns True if called from the executor's thread.
+        """
+        return self._thread is threading.current_thread()
+
+    def wait(self):
+        """
+        Waits until everything submitted so far has run.
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            future, function, args, kwargs = self._queue.get()
+            try:
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    future.set_exception(sys.exc_info())
+                else:
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+def qt_dispatcher():
+    """
+    Returns a dispatcher that runs callbacks on the Qt application's
+    main thread, through its event loop. Works with PySide2, PySide,
+    PyQt5 and PyQt4, whichever is available.
+    """
+    try:
+        from PySide2 import QtCore
+    except ImportError:
+        try:
+            from PySide import QtCore
+        except ImportError:
+            try:
+                from PyQt5 import QtCore
+            except ImportError:
+                from PyQt4 import QtCore
+    Signal = getattr(QtCore, 'Signal', None) or QtCore.pyqtSignal
+
+    class Invoker(QtCore.QObject):
+        invoke = Signal(object)
+
+        def __init__(self):
+            super(Invoker, self).__init__()
+            self.invoke.connect(self.run, QtCore.Qt.QueuedConnection)
+
+        def run(self, call):
+            call()
+
+    invoker = Invoker()
+    application = QtCore.QCoreApplication.instance()
+    if application is not None:
+        invoker.moveToThread(application.thread())
+
+    def dispatch(function, *args):
+        invoker.invoke.emit(lambda: function(*args))
+    return dispatch
+
+def maya_dispatcher():
+    """
+    Returns a dispatcher that runs callbacks on Maya's main thread.
+    """
+    import maya.utils
+    return maya.utils.executeDeferred
+
+def nuke_dispatcher():
+    """
+    Returns a dispatcher that runs callbacks on Nuke's main thread.
+    """
+    import nuke
+    def dispatch(function, *args):
+        nuke.executeInMainThread(function, args)
+    return dispatch
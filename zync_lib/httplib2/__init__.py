@@ -26,23 +26,17 @@ __version__ = "0.7.4"
 
 import re
 import sys
-import email
-import email.Utils
-import email.Message
-import email.FeedParser
-import StringIO
-import gzip
 import zlib
 import httplib
 import urlparse
 import urllib
-import base64
 import os
 import copy
 import calendar
 import time
-import random
 import errno
+import mmap
+import struct
 try:
     from hashlib import sha1 as _sha, md5 as _md5
 except ImportError:
@@ -51,37 +45,86 @@ except ImportError:
     import md5
     _sha = sha.new
     _md5 = md5.new
-import hmac
-from gettext import gettext as _
 import socket
+import select
+import types
 
-try:
-    from httplib2 import socks
-except ImportError:
-    try:
-        import socks
-    except ImportError:
-        socks = None
+# socks, gettext, email and the authentication schemes (httplib2.auth)
+# are imported when they are first needed rather than up front, as
+# most programs never use them and they add to the time it takes to
+# import httplib2.
+
+def _(message):
+    from gettext import gettext
+    return gettext(message)
+
+def _parsedate_tz(data):
+    from email.Utils import parsedate_tz
+    return parsedate_tz(data)
+
+# The socks module, or None if it isn't available; False until looked for.
+_socks = False
+
+def _get_socks():
+    global _socks
+    if _socks is False:
+        try:
+            from httplib2 import socks
+        except ImportError:
+            try:
+                import socks
+            except ImportError:
+                socks = None
+        _socks = socks
+    return _socks
 
 # Build the appropriate socket wrapper for ssl
 try:
     import ssl # python 2.6
     ssl_SSLError = ssl.SSLError
+
+    # SSL contexts, by (key_file, cert_file, disable_validation, ca_certs).
+    # Sharing them means the CA bundle is loaded once per process rather
+    # than once per connection.
+    _ssl_contexts = {}
+
+    def _ssl_context(key_file, cert_file, disable_validation, ca_certs):
+        key = (key_file, cert_file, disable_validation, ca_certs)
+        context = _ssl_contexts.get(key)
+        if context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
+            if disable_validation:
+                context.verify_mode = ssl.CERT_NONE
+            else:
+                context.verify_mode = ssl.CERT_REQUIRED
+                context.load_verify_locations(ca_certs)
+            if cert_file:
+                context.load_cert_chain(cert_file, key_file)
+            context = _ssl_contexts.setdefault(key, context)
+        return context
+
     def _ssl_wrap_socket(sock, key_file, cert_file,
-                         disable_validation, ca_certs):
+                         disable_validation, ca_certs, host=None):
         if disable_validation:
             cert_reqs = ssl.CERT_NONE
         else:
             cert_reqs = ssl.CERT_REQUIRED
-        # We should be specifying SSL version 3 or TLS v1, but the ssl module
-        # doesn't expose the necessary knobs. So we need to go with the default
-        # of SSLv23.
-        return ssl.wrap_socket(sock, keyfile=key_file, certfile=cert_file,
-                               cert_reqs=cert_reqs, ca_certs=ca_certs)
+        if not hasattr(ssl, 'SSLContext'):
+            # Before Python 2.7.9.
+            # We should be specifying SSL version 3 or TLS v1, but the ssl module
+            # doesn't expose the necessary knobs. So we need to go with the default
+            # of SSLv23.
+            return ssl.wrap_socket(sock, keyfile=key_file, certfile=cert_file,
+                                   cert_reqs=cert_reqs, ca_certs=ca_certs)
+        context = _ssl_context(key_file, cert_file, disable_validation, ca_certs)
+        if host and getattr(ssl, 'HAS_SNI', False):
+            return context.wrap_socket(sock, server_hostname=host)
+        return context.wrap_socket(sock)
 except (AttributeError, ImportError):
     ssl_SSLError = None
     def _ssl_wrap_socket(sock, key_file, cert_file,
-                         disable_validation, ca_certs):
+                         disable_validation, ca_certs, host=None):
         if not disable_validation:
             raise CertificateValidationUnsupported(
                     "SSL certificate validation is not supported without "
@@ -102,8 +145,10 @@ def has_timeout(timeout): # python 2.6
         return (timeout is not None and timeout is not socket._GLOBAL_DEFAULT_TIMEOUT)
     return (timeout is not None)
 
-__all__ = ['Http', 'Response', 'ProxyInfo', 'HttpLib2Error',
+__all__ = ['Http', 'PreparedRequest', 'Response', 'CompactResponse', 'ResponseStream', 'ProxyInfo',
+  'ProxyResolver', 'HttpLib2Error',
   'RedirectMissingLocation', 'RedirectLimit', 'FailedToDecompressContent',
+  'DecompressionLimitExceeded',
   'UnimplementedDigestAuthOptionError', 'UnimplementedHmacDigestAuthOptionError',
   'debuglevel', 'ProxiesUnavailableError']
 
@@ -145,6 +190,8 @@ class FailedToDecompressContent(HttpLib2ErrorWithResponse): pass
 class UnimplementedDigestAuthOptionError(HttpLib2ErrorWithResponse): pass
 class UnimplementedHmacDigestAuthOptionError(HttpLib2ErrorWithResponse): pass
 
+class DecompressionLimitExceeded(FailedToDecompressContent): pass
+
 class MalformedHeader(HttpLib2Error): pass
 class RelativeURIError(HttpLib2Error): pass
 class ServerNotFoundError(HttpLib2Error): pass
@@ -180,6 +227,18 @@ class CertificateHostnameMismatch(SSLHandshakeError):
 # requesting that URI again.
 DEFAULT_MAX_REDIRECTS = 5
 
+# Compressed bodies are decoded into pieces of at most this many bytes.
+DECOMPRESS_CHUNK_SIZE = 64 * 1024
+
+# Request bodies are sent in blocks of this many bytes when a progress
+# callback is given, which is called after each one.
+UPLOAD_BLOCK_SIZE = 64 * 1024
+
+# The largest decompressed body accepted from a server, in bytes, as a
+# guard against decompression bombs. None means no limit. Can be set
+# per instance with Http.max_decompressed_size.
+MAX_DECOMPRESSED_SIZE = 1024 * 1024 * 1024
+
 # Default CA certificates file bundled with httplib2.
 CA_CERTS = os.path.join(
         os.path.dirname(os.path.abspath(__file__ )), "cacerts.txt")
@@ -222,13 +281,29 @@ def urlnorm(uri):
 re_url_scheme    = re.compile(r'^\w+://')
 re_slash         = re.compile(r'[?/:|]+')
 
+# safename() results, by filename. Cleared when it grows past
+# SAFENAME_CACHE_SIZE entries.
+_safename_cache = {}
+SAFENAME_CACHE_SIZE = 1000
+
 def safename(filename):
     """Return a filename suitable for the cache.
 
     Strips dangerous and common characters to create a filename we
     can use to store the cache in.
     """
-
+    try:
+        return _safename_cache[filename]
+    except KeyError:
+        pass
+    except TypeError:
+        return _safename(filename)
+    if len(_safename_cache) >= SAFENAME_CACHE_SIZE:
+        _safename_cache.clear()
+    result = _safename_cache[filename] = _safename(filename)
+    return result
+
+def _safename(filename):
     try:
         if re_url_scheme.match(filename):
             if isinstance(filename,str):
@@ -349,7 +424,7 @@ def _entry_disposition(response_headers, request_headers):
     elif cc.has_key('only-if-cached'):
         retval = "FRESH"
     elif response_headers.has_key('date'):
-        date = calendar.timegm(email.Utils.parsedate_tz(response_headers['date']))
+        date = calendar.timegm(_parsedate_tz(response_headers['date']))
         now = time.time()
         current_age = max(0, now - date)
         if cc_response.has_key('max-age'):
@@ -358,7 +433,7 @@ def _entry_disposition(response_headers, request_headers):
             except ValueError:
                 freshness_lifetime = 0
         elif response_headers.has_key('expires'):
-            expires = email.Utils.parsedate_tz(response_headers['expires'])
+            expires = _parsedate_tz(response_headers['expires'])
             if None == expires:
                 freshness_lifetime = 0
             else:
@@ -380,24 +455,201 @@ def _entry_disposition(response_headers, request_headers):
             retval = "FRESH"
     return retval
 
-def _decompressContent(response, new_content):
+class _ContentDecoder(object):
+    """Incrementally decodes a gzip or deflate encoded body.
+
+    Output comes out in chunks of at most DECOMPRESS_CHUNK_SIZE bytes,
+    so a small but highly compressed input never balloons in a single
+    step, and decoding stops with DecompressionLimitExceeded as soon as
+    more than 'max_size' bytes have been produced.
+    """
+    def __init__(self, response, encoding, max_size=None):
+        self.response = response
+        self.encoding = encoding
+        self.max_size = max_size
+        self.size = 0
+        self._started = False
+        if encoding == 'gzip':
+            self._wbits = 16 + zlib.MAX_WBITS
+        else:
+            self._wbits = zlib.MAX_WBITS
+        self._obj = zlib.decompressobj(self._wbits)
+
+    def _failed(self, exc_class, message):
+        return exc_class(message, self.response, "")
+
+    def _count(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise self._failed(DecompressionLimitExceeded, _("Content decompressed to more than %d bytes.") % self.max_size)
+        return data
+
+    def decode(self, data):
+        """Generate the decoded chunks for the next piece of input."""
+        out = ""
+        while data or len(out) == DECOMPRESS_CHUNK_SIZE:
+            try:
+                out = self._obj.decompress(data, DECOMPRESS_CHUNK_SIZE)
+            except zlib.error:
+                if self.encoding == 'deflate' and not self._started:
+                    # Plenty of servers send a raw deflate stream without
+                    # the zlib header; try again that way.
+                    self._started = True
+                    self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+                    continue
+                raise self._failed(FailedToDecompressContent, _("Content purported to be compressed with %s but failed to decompress.") % self.encoding)
+            self._started = True
+            data = self._obj.unconsumed_tail
+            unused = self._obj.unused_data
+            if unused:
+                # The stream ended. gzip allows several members to be
+                # concatenated; anything else left over is ignored.
+                data = ""
+                if self.encoding == 'gzip' and unused.startswith('\x1f\x8b'):
+                    self._obj = zlib.decompressobj(self._wbits)
+                    data = unused
+            if out:
+                yield self._count(out)
+
+    def flush(self):
+        """Return whatever output is left at the end of the input."""
+        try:
+            return self._count(self._obj.flush())
+        except zlib.error:
+            raise self._failed(FailedToDecompressContent, _("Content purported to be compressed with %s but failed to decompress.") % self.encoding)
+
+def _freshness_expiry(response_headers):
+    """Return the time at which a response stops being fresh, or 0 if it
+    never is, as _entry_disposition would decide it for a request with no
+    Cache-Control or Pragma headers of its own."""
+    cc_response = _parse_cache_control(response_headers)
+    if cc_response.has_key('no-cache') or not response_headers.has_key('date'):
+        return 0
+    date = _parsedate_tz(response_headers['date'])
+    if date is None:
+        return 0
+    date = calendar.timegm(date)
+    freshness_lifetime = 0
+    if cc_response.has_key('max-age'):
+        try:
+            freshness_lifetime = int(cc_response['max-age'])
+        except ValueError:
+            pass
+    elif response_headers.has_key('expires'):
+        expires = _parsedate_tz(response_headers['expires'])
+        if expires is not None:
+            freshness_lifetime = max(0, calendar.timegm(expires) - date)
+    if freshness_lifetime <= 0:
+        return 0
+    return date + freshness_lifetime
+
+
+# Cache entries are stored as a fixed header (magic, format version,
+# freshness expiry and the length of the response headers), then the
+# headers, as NUL separated names and values, then the body. Entries
+# with this header but another version, such as version 1's marshalled
+# headers, are discarded and refetched. Entries without it, an RFC 822
+# header block as httplib2 has always written them, are still read.
+CACHE_ENTRY_MAGIC = '\x89hc2'
+CACHE_ENTRY_VERSION = 2
+_CACHE_ENTRY_HEADER = struct.Struct('>4sBdI')
+
+# FileCache memory maps entries bigger than this when reading them.
+CACHE_MMAP_THRESHOLD = 256 * 1024
+
+class _CacheEntry(object):
+    """A cached response, parsed from what the cache returned.
+
+    'info' holds the response headers. The body is only sliced out of
+    the stored data when it is asked for, which matters for big entries
+    that are memory mapped.
+    """
+    def __init__(self, data):
+        self._data = data
+        if data[:4] == CACHE_ENTRY_MAGIC:
+            (magic, version, fresh_until, headers_length) = \
+                    _CACHE_ENTRY_HEADER.unpack(data[:_CACHE_ENTRY_HEADER.size])
+            if version != CACHE_ENTRY_VERSION:
+                raise ValueError("Unknown cache entry version %d" % version)
+            offset = _CACHE_ENTRY_HEADER.size + headers_length
+            if offset > len(data):
+                raise ValueError("Truncated cache entry")
+            fields = data[_CACHE_ENTRY_HEADER.size:offset].split('\0')
+            if len(fields) % 2:
+                raise ValueError("Corrupt cache entry headers")
+            self.info = dict(zip(fields[::2], fields[1::2]))
+            self.fresh_until = fresh_until
+            self._offset = offset
+        else:
+            # info = email.message_from_string(cached_value)
+            #
+            # Need to replace the line above with the kludge below
+            # to fix the non-existent bug not fixed in this
+            # bug report: http://mail.python.org/pipermail/python-bugs-list/2005-September/030289.html
+            import email.FeedParser
+            data = data[:]
+            info, self._data = data.split('\r\n\r\n', 1)
+            feedparser = email.FeedParser.FeedParser()
+            feedparser.feed(info)
+            info = feedparser.close()
+            feedparser._parse = None
+            self.info = dict([(key.lower(), value) for (key, value) in info.items()])
+            self.fresh_until = None
+            self._offset = 0
+
+    def body(self):
+        return self._data[self._offset:]
+
+    def disposition(self, request_headers):
+        """Return the _entry_disposition of the entry for a request,
+        using the precomputed expiry when the request allows it."""
+        if (self.fresh_until is None or request_headers.has_key('cache-control')
+                or request_headers.has_key('pragma')):
+            return _entry_disposition(self.info, request_headers)
+        if time.time() < self.fresh_until:
+            return "FRESH"
+        return "STALE"
+
+def _packCacheEntry(info, content):
+    fields = []
+    for key, value in info.iteritems():
+        for field in (key, value):
+            if isinstance(field, unicode):
+                field = field.encode('utf-8')
+            fields.append(str(field).replace('\0', ''))
+    headers = '\0'.join(fields)
+    return "".join([_CACHE_ENTRY_HEADER.pack(CACHE_ENTRY_MAGIC,
+            CACHE_ENTRY_VERSION, _freshness_expiry(info), len(headers)),
+        headers, content])
+
+def _decompressContent(response, new_content, max_size=None):
     content = new_content
-    try:
-        encoding = response.get('content-encoding', None)
-        if encoding in ['gzip', 'deflate']:
-            if encoding == 'gzip':
-                content = gzip.GzipFile(fileobj=StringIO.StringIO(new_content)).read()
-            if encoding == 'deflate':
-                content = zlib.decompress(content)
-            response['content-length'] = str(len(content))
-            # Record the historical presence of the encoding in a way the won't interfere.
-            response['-content-encoding'] = response['content-encoding']
-            del response['content-encoding']
-    except IOError:
-        content = ""
-        raise FailedToDecompressContent(_("Content purported to be compressed with %s but failed to decompress.") % response.get('content-encoding'), response, content)
+    encoding = response.get('content-encoding', None)
+    if encoding in ['gzip', 'deflate']:
+        decoder = _ContentDecoder(response, encoding, max_size)
+        chunks = list(decoder.decode(new_content))
+        chunks.append(decoder.flush())
+        content = "".join(chunks)
+        response['content-length'] = str(len(content))
+        # Record the historical presence of the encoding in a way the won't interfere.
+        response['-content-encoding'] = response['content-encoding']
+        del response['content-encoding']
     return content
 
+def _streamContent(response, fp, connection, max_size=None):
+    """Wrap the unread body of an httplib response in a ResponseStream,
+    fixing up the headers the same way _decompressContent does."""
+    encoding = response.get('content-encoding', None)
+    if encoding in ['gzip', 'deflate']:
+        # The decoded length isn't known until the body has been read.
+        if response.has_key('content-length'):
+            del response['content-length']
+        response['-content-encoding'] = response['content-encoding']
+        del response['content-encoding']
+    else:
+        encoding = None
+    return ResponseStream(fp, response, encoding, connection, max_size)
+
 def _updateCache(request_headers, response_headers, content, cache, cachekey):
     if cachekey:
         cc = _parse_cache_control(request_headers)
@@ -405,7 +657,7 @@ def _updateCache(request_headers, response_headers, content, cache, cachekey):
         if cc.has_key('no-store') or cc_response.has_key('no-store'):
             cache.delete(cachekey)
         else:
-            info = email.Message.Message()
+            info = {}
             for key, value in response_headers.iteritems():
                 if key not in ['status','content-encoding','transfer-encoding']:
                     info[key] = value
@@ -426,263 +678,16 @@ def _updateCache(request_headers, response_headers, content, cache, cachekey):
             if status == 304:
                 status = 200
 
-            status_header = 'status: %d\r\n' % status
+            info['status'] = str(status)
 
-            header_str = info.as_string()
-
-            header_str = re.sub("\r(?!\n)|(?<!\r)\n", "\r\n", header_str)
-            text = "".join([status_header, header_str, content])
-
-            cache.set(cachekey, text)
-
-def _cnonce():
-    dig = _md5("%s:%s" % (time.ctime(), ["0123456789"[random.randrange(0, 9)] for i in range(20)])).hexdigest()
-    return dig[:16]
-
-def _wsse_username_token(cnonce, iso_now, password):
-    return base64.b64encode(_sha("%s%s%s" % (cnonce, iso_now, password)).digest()).strip()
-
-
-# For credentials we need two things, first
-# a pool of credential to try (not necesarily tied to BAsic, Digest, etc.)
-# Then we also need a list of URIs that have already demanded authentication
-# That list is tricky since sub-URIs can take the same auth, or the
-# auth scheme may change as you descend the tree.
-# So we also need each Auth instance to be able to tell us
-# how close to the 'top' it is.
-
-class Authentication(object):
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        (scheme, authority, path, query, fragment) = parse_uri(request_uri)
-        self.path = path
-        self.host = host
-        self.credentials = credentials
-        self.http = http
-
-    def depth(self, request_uri):
-        (scheme, authority, path, query, fragment) = parse_uri(request_uri)
-        return request_uri[len(self.path):].count("/")
-
-    def inscope(self, host, request_uri):
-        # XXX Should we normalize the request_uri?
-        (scheme, authority, path, query, fragment) = parse_uri(request_uri)
-        return (host == self.host) and path.startswith(self.path)
-
-    def request(self, method, request_uri, headers, content):
-        """Modify the request headers to add the appropriate
-        Authorization header. Over-rise this in sub-classes."""
-        pass
-
-    def response(self, response, content):
-        """Gives us a chance to update with new nonces
-        or such returned from the last authorized response.
-        Over-rise this in sub-classes if necessary.
-
-        Return TRUE is the request is to be retried, for
-        example Digest may return stale=true.
-        """
-        return False
-
-
-
-class BasicAuthentication(Authentication):
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        Authentication.__init__(self, credentials, host, request_uri, headers, response, content, http)
-
-    def request(self, method, request_uri, headers, content):
-        """Modify the request headers to add the appropriate
-        Authorization header."""
-        headers['authorization'] = 'Basic ' + base64.b64encode("%s:%s" % self.credentials).strip()
-
-
-class DigestAuthentication(Authentication):
-    """Only do qop='auth' and MD5, since that
-    is all Apache currently implements"""
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        Authentication.__init__(self, credentials, host, request_uri, headers, response, content, http)
-        challenge = _parse_www_authenticate(response, 'www-authenticate')
-        self.challenge = challenge['digest']
-        qop = self.challenge.get('qop', 'auth')
-        self.challenge['qop'] = ('auth' in [x.strip() for x in qop.split()]) and 'auth' or None
-        if self.challenge['qop'] is None:
-            raise UnimplementedDigestAuthOptionError( _("Unsupported value for qop: %s." % qop))
-        self.challenge['algorithm'] = self.challenge.get('algorithm', 'MD5').upper()
-        if self.challenge['algorithm'] != 'MD5':
-            raise UnimplementedDigestAuthOptionError( _("Unsupported value for algorithm: %s." % self.challenge['algorithm']))
-        self.A1 = "".join([self.credentials[0], ":", self.challenge['realm'], ":", self.credentials[1]])
-        self.challenge['nc'] = 1
-
-    def request(self, method, request_uri, headers, content, cnonce = None):
-        """Modify the request headers"""
-        H = lambda x: _md5(x).hexdigest()
-        KD = lambda s, d: H("%s:%s" % (s, d))
-        A2 = "".join([method, ":", request_uri])
-        self.challenge['cnonce'] = cnonce or _cnonce()
-        request_digest  = '"%s"' % KD(H(self.A1), "%s:%s:%s:%s:%s" % (self.challenge['nonce'],
-                    '%08x' % self.challenge['nc'],
-                    self.challenge['cnonce'],
-                    self.challenge['qop'], H(A2)
-                    ))
-        headers['authorization'] = 'Digest username="%s", realm="%s", nonce="%s", uri="%s", algorithm=%s, response=%s, qop=%s, nc=%08x, cnonce="%s"' % (
-                self.credentials[0],
-                self.challenge['realm'],
-                self.challenge['nonce'],
-                request_uri,
-                self.challenge['algorithm'],
-                request_digest,
-                self.challenge['qop'],
-                self.challenge['nc'],
-                self.challenge['cnonce'],
-                )
-        if self.challenge.get('opaque'):
-            headers['authorization'] += ', opaque="%s"' % self.challenge['opaque']
-        self.challenge['nc'] += 1
-
-    def response(self, response, content):
-        if not response.has_key('authentication-info'):
-            challenge = _parse_www_authenticate(response, 'www-authenticate').get('digest', {})
-            if 'true' == challenge.get('stale'):
-                self.challenge['nonce'] = challenge['nonce']
-                self.challenge['nc'] = 1
-                return True
-        else:
-            updated_challenge = _parse_www_authenticate(response, 'authentication-info').get('digest', {})
-
-            if updated_challenge.has_key('nextnonce'):
-                self.challenge['nonce'] = updated_challenge['nextnonce']
-                self.challenge['nc'] = 1
-        return False
-
-
-class HmacDigestAuthentication(Authentication):
-    """Adapted from Robert Sayre's code and DigestAuthentication above."""
-    __author__ = "Thomas Broyer (t.broyer@ltgt.net)"
-
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        Authentication.__init__(self, credentials, host, request_uri, headers, response, content, http)
-        challenge = _parse_www_authenticate(response, 'www-authenticate')
-        self.challenge = challenge['hmacdigest']
-        # TODO: self.challenge['domain']
-        self.challenge['reason'] = self.challenge.get('reason', 'unauthorized')
-        if self.challenge['reason'] not in ['unauthorized', 'integrity']:
-            self.challenge['reason'] = 'unauthorized'
-        self.challenge['salt'] = self.challenge.get('salt', '')
-        if not self.challenge.get('snonce'):
-            raise UnimplementedHmacDigestAuthOptionError( _("The challenge doesn't contain a server nonce, or this one is empty."))
-        self.challenge['algorithm'] = self.challenge.get('algorithm', 'HMAC-SHA-1')
-        if self.challenge['algorithm'] not in ['HMAC-SHA-1', 'HMAC-MD5']:
-            raise UnimplementedHmacDigestAuthOptionError( _("Unsupported value for algorithm: %s." % self.challenge['algorithm']))
-        self.challenge['pw-algorithm'] = self.challenge.get('pw-algorithm', 'SHA-1')
-        if self.challenge['pw-algorithm'] not in ['SHA-1', 'MD5']:
-            raise UnimplementedHmacDigestAuthOptionError( _("Unsupported value for pw-algorithm: %s." % self.challenge['pw-algorithm']))
-        if self.challenge['algorithm'] == 'HMAC-MD5':
-            self.hashmod = _md5
-        else:
-            self.hashmod = _sha
-        if self.challenge['pw-algorithm'] == 'MD5':
-            self.pwhashmod = _md5
-        else:
-            self.pwhashmod = _sha
-        self.key = "".join([self.credentials[0], ":",
-                    self.pwhashmod.new("".join([self.credentials[1], self.challenge['salt']])).hexdigest().lower(),
-                    ":", self.challenge['realm']
-                    ])
-        self.key = self.pwhashmod.new(self.key).hexdigest().lower()
-
-    def request(self, method, request_uri, headers, content):
-        """Modify the request headers"""
-        keys = _get_end2end_headers(headers)
-        keylist = "".join(["%s " % k for k in keys])
-        headers_val = "".join([headers[k] for k in keys])
-        created = time.strftime('%Y-%m-%dT%H:%M:%SZ',time.gmtime())
-        cnonce = _cnonce()
-        request_digest = "%s:%s:%s:%s:%s" % (method, request_uri, cnonce, self.challenge['snonce'], headers_val)
-        request_digest  = hmac.new(self.key, request_digest, self.hashmod).hexdigest().lower()
-        headers['authorization'] = 'HMACDigest username="%s", realm="%s", snonce="%s", cnonce="%s", uri="%s", created="%s", response="%s", headers="%s"' % (
-                self.credentials[0],
-                self.challenge['realm'],
-                self.challenge['snonce'],
-                cnonce,
-                request_uri,
-                created,
-                request_digest,
-                keylist,
-                )
-
-    def response(self, response, content):
-        challenge = _parse_www_authenticate(response, 'www-authenticate').get('hmacdigest', {})
-        if challenge.get('reason') in ['integrity', 'stale']:
-            return True
-        return False
-
-
-class WsseAuthentication(Authentication):
-    """This is thinly tested and should not be relied upon.
-    At this time there isn't any third party server to test against.
-    Blogger and TypePad implemented this algorithm at one point
-    but Blogger has since switched to Basic over HTTPS and
-    TypePad has implemented it wrong, by never issuing a 401
-    challenge but instead requiring your client to telepathically know that
-    their endpoint is expecting WSSE profile="UsernameToken"."""
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        Authentication.__init__(self, credentials, host, request_uri, headers, response, content, http)
-
-    def request(self, method, request_uri, headers, content):
-        """Modify the request headers to add the appropriate
-        Authorization header."""
-        headers['authorization'] = 'WSSE profile="UsernameToken"'
-        iso_now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-        cnonce = _cnonce()
-        password_digest = _wsse_username_token(cnonce, iso_now, self.credentials[1])
-        headers['X-WSSE'] = 'UsernameToken Username="%s", PasswordDigest="%s", Nonce="%s", Created="%s"' % (
-                self.credentials[0],
-                password_digest,
-                cnonce,
-                iso_now)
-
-class GoogleLoginAuthentication(Authentication):
-    def __init__(self, credentials, host, request_uri, headers, response, content, http):
-        from urllib import urlencode
-        Authentication.__init__(self, credentials, host, request_uri, headers, response, content, http)
-        challenge = _parse_www_authenticate(response, 'www-authenticate')
-        service = challenge['googlelogin'].get('service', 'xapi')
-        # Bloggger actually returns the service in the challenge
-        # For the rest we guess based on the URI
-        if service == 'xapi' and  request_uri.find("calendar") > 0:
-            service = "cl"
-        # No point in guessing Base or Spreadsheet
-        #elif request_uri.find("spreadsheets") > 0:
-        #    service = "wise"
-
-        auth = dict(Email=credentials[0], Passwd=credentials[1], service=service, source=headers['user-agent'])
-        resp, content = self.http.request("https://www.google.com/accounts/ClientLogin", method="POST", body=urlencode(auth), headers={'Content-Type': 'application/x-www-form-urlencoded'})
-        lines = content.split('\n')
-        d = dict([tuple(line.split("=", 1)) for line in lines if line])
-        if resp.status == 403:
-            self.Auth = ""
-        else:
-            self.Auth = d['Auth']
-
-    def request(self, method, request_uri, headers, content):
-        """Modify the request headers to add the appropriate
-        Authorization header."""
-        headers['authorization'] = 'GoogleLogin Auth=' + self.Auth
-
-
-AUTH_SCHEME_CLASSES = {
-    "basic": BasicAuthentication,
-    "wsse": WsseAuthentication,
-    "digest": DigestAuthentication,
-    "hmacdigest": HmacDigestAuthentication,
-    "googlelogin": GoogleLoginAuthentication
-}
+            cache.set(cachekey, _packCacheEntry(info, content))
 
 AUTH_SCHEME_ORDER = ["hmacdigest", "googlelogin", "digest", "wsse", "basic"]
 
 class FileCache(object):
     """Uses a local directory as a store for cached files.
     Not really safe to use if multiple threads or processes are going to
-    be running on the same cache.
+    be running on the same cache; see caches.LRUFileCache for that.
     """
     def __init__(self, cache, safe=safename): # use safe=lambda x: md5.new(x).hexdigest() for the old behavior
         self.cache = cache
@@ -701,6 +706,23 @@ class FileCache(object):
             pass
         return retval
 
+    def get_buffer(self, key):
+        """Like get(), but entries over CACHE_MMAP_THRESHOLD bytes are
+        memory mapped rather than read in. The caller closes the mmap
+        when it's done with it."""
+        cacheFullPath = os.path.join(self.cache, self.safe(key))
+        try:
+            f = file(cacheFullPath, "rb")
+        except IOError:
+            return None
+        try:
+            size = os.fstat(f.fileno()).st_size
+            if size <= CACHE_MMAP_THRESHOLD:
+                return f.read()
+            return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
     def set(self, key, value):
         cacheFullPath = os.path.join(self.cache, self.safe(key))
         f = file(cacheFullPath, "wb")
@@ -830,6 +852,9 @@ class ProxyInfo(object):
         if self.bypass_hosts is AllHosts:
           return True
 
+        if isinstance(self.bypass_hosts, tuple):
+          return hostname.endswith(self.bypass_hosts)
+
         bypass = False
         for domain in self.bypass_hosts:
           if hostname.endswith(domain):
@@ -838,6 +863,262 @@ class ProxyInfo(object):
         return bypass
 
 
+class ProxyResolver(object):
+    """Works out proxies from the environment the way
+    ProxyInfo.from_environment does, but only parses the configuration
+    when it changes.
+
+    The proxy URLs are parsed and the no_proxy list is turned into a
+    tuple of suffixes once; the answer for each (scheme, host) is then
+    remembered. Every lookup compares the handful of environment
+    variables involved with the ones last seen, and starts over if any
+    of them changed.
+    """
+
+    ENVIRONMENT = ('http_proxy', 'HTTP_PROXY', 'https_proxy', 'HTTPS_PROXY',
+                   'no_proxy', 'NO_PROXY')
+
+    def __init__(self):
+        self._state = (None, {}, {})
+
+    def _current(self):
+        """Return (snapshot, proxies, decisions) for the environment as
+        it is now."""
+        # os.environ.data is the plain dict behind os.environ, which is
+        # much quicker to query.
+        environ = getattr(os.environ, 'data', os.environ)
+        snapshot = tuple(map(environ.get, self.ENVIRONMENT))
+        state = self._state
+        if state[0] != snapshot:
+            # Replaced in one go, so other threads see a consistent state.
+            state = self._state = (snapshot, {}, {})
+        return state
+
+    def __call__(self, method='http'):
+        """Return the ProxyInfo for 'method', or None; a drop-in for
+        ProxyInfo.from_environment."""
+        (snapshot, proxies, decisions) = self._current()
+        try:
+            return proxies[method]
+        except KeyError:
+            pass
+        proxy_info = ProxyInfo.from_environment(method)
+        if proxy_info is not None and proxy_info.bypass_hosts is not AllHosts:
+            proxy_info.bypass_hosts = tuple([host.strip()
+                    for host in proxy_info.bypass_hosts if host.strip()])
+        proxies[method] = proxy_info
+        return proxy_info
+
+    def resolve(self, scheme, authority):
+        """Return the ProxyInfo to use for a request to 'authority', a
+        host with or without a port, or None to connect directly. A
+        no_proxy entry with a port only matches requests to that port."""
+        (snapshot, proxies, decisions) = self._current()
+        try:
+            return decisions[(scheme, authority)]
+        except KeyError:
+            pass
+        proxy_info = self(scheme)
+        if proxy_info is not None:
+            hostname = urllib.splitport(authority)[0]
+            if proxy_info.bypass_host(hostname) or proxy_info.bypass_host(authority):
+                proxy_info = None
+        decisions[(scheme, authority)] = proxy_info
+        return proxy_info
+
+# The resolver Http uses by default.
+proxy_resolver = ProxyResolver()
+
+
+class DNSCache(object):
+    """Remembers getaddrinfo() results for 'ttl' seconds, so reconnecting
+    to a host doesn't wait on the resolver every time."""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+
+    def getaddrinfo(self, host, port):
+        """Return the getaddrinfo() list of stream addresses for a host."""
+        key = (host, port)
+        entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def forget(self, host, port):
+        self._entries.pop((host, port), None)
+
+    def clear(self):
+        self._entries.clear()
+
+# The DNS cache shared by all connections.
+dns_cache = DNSCache()
+
+# When an address hasn't accepted a connection after this many seconds,
+# the next one is tried alongside it ("Happy Eyeballs", RFC 6555).
+CONNECT_STAGGER = 0.25
+
+_CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                        getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK))
+
+def _interleave_families(addresses):
+    """Reorder getaddrinfo() results to alternate between address
+    families, keeping the resolver's preference within each."""
+    families = []
+    by_family = {}
+    for address in addresses:
+        if address[0] not in by_family:
+            families.append(address[0])
+            by_family[address[0]] = []
+        by_family[address[0]].append(address)
+    result = []
+    while len(result) < len(addresses):
+        for family in families:
+            if by_family[family]:
+                result.append(by_family[family].pop(0))
+    return result
+
+def _create_connection(host, port, timeout=None):
+    """Open a TCP connection to host:port.
+
+    The addresses come from dns_cache. Attempts are started
+    CONNECT_STAGGER seconds apart without waiting for earlier ones to
+    fail, and the first to connect wins, so a dead address costs a
+    fraction of a second rather than the whole timeout. 'timeout' bounds
+    the connection as a whole.
+    """
+    if not has_timeout(timeout):
+        timeout = socket.getdefaulttimeout()
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + timeout
+    addresses = _interleave_families(dns_cache.getaddrinfo(host, port))
+    attempts = {}
+    error = socket.error("getaddrinfo returns an empty list")
+    next_attempt = 0
+    try:
+        while addresses or attempts:
+            now = time.time()
+            if addresses and (not attempts or now >= next_attempt):
+                af, socktype, proto, canonname, sa = addresses.pop(0)
+                try:
+                    sock = socket.socket(af, socktype, proto)
+                except socket.error, error:
+                    continue
+                sock.setblocking(0)
+                err = sock.connect_ex(sa)
+                if err in _CONNECT_IN_PROGRESS:
+                    attempts[sock] = sa
+                    next_attempt = now + CONNECT_STAGGER
+                    continue
+                if err == 0:
+                    attempts[sock] = sa
+                    return _connected(attempts, sock, timeout)
+                sock.close()
+                error = socket.error(err, os.strerror(err))
+                continue
+            if deadline is not None and now >= deadline:
+                raise socket.timeout("timed out")
+            wait = None
+            if addresses:
+                wait = max(0, next_attempt - now)
+            if deadline is not None:
+                remaining = max(0, deadline - now)
+                if wait is None or remaining < wait:
+                    wait = remaining
+            pending = attempts.keys()
+            r, w, x = select.select([], pending, pending, wait)
+            for sock in set(w + x):
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    return _connected(attempts, sock, timeout)
+                sock.close()
+                del attempts[sock]
+                error = socket.error(err, os.strerror(err))
+        raise error
+    except:
+        for sock in attempts:
+            sock.close()
+        # The host may have moved; look it up afresh next time.
+        dns_cache.forget(host, port)
+        raise
+
+def _connected(attempts, sock, timeout):
+    """Abandon all the other connection attempts and ready the winner."""
+    del attempts[sock]
+    for other in attempts:
+        other.close()
+    attempts.clear()
+    sock.settimeout(timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+def _set_keepalive(sock, keepalive):
+    """Turn on TCP keepalive for 'sock'. 'keepalive' is True, to use the
+    system's timings, or a tuple of (idle, interval, count): the seconds
+    a connection sits idle before the first probe, the seconds between
+    probes and the number of unanswered probes before it is dropped.
+    Timings the platform can't set are left alone."""
+    if not keepalive:
+        return
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if keepalive is True:
+        return
+    (idle, interval, count) = keepalive
+    if hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS,
+                (1, int(idle * 1000), int(interval * 1000)))
+        return
+    for (name, value) in [('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval),
+                          ('TCP_KEEPCNT', count)]:
+        if hasattr(socket, name) and value is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), int(value))
+
+def _is_stale(conn, idle_timeout=None):
+    """Return True if the pooled connection 'conn' shouldn't be reused:
+    it has been idle for longer than 'idle_timeout' seconds, or the
+    server has closed it. Between requests nothing should arrive on a
+    keep-alive socket, so if it is readable the server has either hung
+    up or sent something we can't make sense of."""
+    # Connection types that aren't httplib2's own have no last_used.
+    last_used = getattr(conn, 'last_used', None)
+    if idle_timeout is not None and last_used is not None and \
+            time.time() - last_used > idle_timeout:
+        return True
+    sock = conn.sock
+    if hasattr(sock, 'pending') and sock.pending():
+        return True
+    try:
+        r, w, x = select.select([sock], [], [], 0)
+    except (select.error, socket.error, ValueError):
+        # Can't tell, e.g. the descriptor is too large for select();
+        # a dead connection is still caught when the request fails.
+        return False
+    return bool(r)
+
+def _proxied_connection(host, port, timeout, proxy_info, debuglevel=0):
+    """Open a connection to host:port through a proxy."""
+    msg = "getaddrinfo returns an empty list"
+    for af, socktype, proto, canonname, sa in dns_cache.getaddrinfo(host, port):
+        sock = _get_socks().socksocket(af, socktype, proto)
+        sock.setproxy(*proxy_info.astuple())
+        if has_timeout(timeout):
+            sock.settimeout(timeout)
+        try:
+            sock.connect((host, port) + sa[2:])
+        except socket.error, msg:
+            if debuglevel > 0:
+                print 'connect fail:', (host, port)
+            sock.close()
+            continue
+        return sock
+    raise socket.error, msg
+
+
 class HTTPConnectionWithTimeout(httplib.HTTPConnection):
     """
     HTTPConnection subclass that supports timeouts
@@ -848,6 +1129,11 @@ class HTTPConnectionWithTimeout(httplib.HTTPConnection):
     http://docs.python.org/library/socket.html#socket.setdefaulttimeout
     """
 
+    # When the connection last finished a request, and the TCP keepalive
+    # setting (see _set_keepalive); both are kept up to date by Http.
+    last_used = None
+    tcp_keepalive = None
+
     def __init__(self, host, port=None, strict=None, timeout=None, proxy_info=None):
         httplib.HTTPConnection.__init__(self, host, port, strict)
         self.timeout = timeout
@@ -855,39 +1141,17 @@ class HTTPConnectionWithTimeout(httplib.HTTPConnection):
 
     def connect(self):
         """Connect to the host and port specified in __init__."""
-        # Mostly verbatim from httplib.py.
-        if self.proxy_info and socks is None:
+        if self.proxy_info and _get_socks() is None:
             raise ProxiesUnavailableError(
                 'Proxy support missing but proxy use was requested!')
-        msg = "getaddrinfo returns an empty list"
-        for res in socket.getaddrinfo(self.host, self.port, 0,
-                socket.SOCK_STREAM):
-            af, socktype, proto, canonname, sa = res
-            try:
-                if self.proxy_info and self.proxy_info.isgood():
-                    self.sock = socks.socksocket(af, socktype, proto)
-                    self.sock.setproxy(*self.proxy_info.astuple())
-                else:
-                    self.sock = socket.socket(af, socktype, proto)
-                    self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                # Different from httplib: support timeouts.
-                if has_timeout(self.timeout):
-                    self.sock.settimeout(self.timeout)
-                    # End of difference from httplib.
-                if self.debuglevel > 0:
-                    print "connect: (%s, %s)" % (self.host, self.port)
-
-                self.sock.connect((self.host, self.port) + sa[2:])
-            except socket.error, msg:
-                if self.debuglevel > 0:
-                    print 'connect fail:', (self.host, self.port)
-                if self.sock:
-                    self.sock.close()
-                self.sock = None
-                continue
-            break
-        if not self.sock:
-            raise socket.error, msg
+        if self.debuglevel > 0:
+            print "connect: (%s, %s)" % (self.host, self.port)
+        if self.proxy_info and self.proxy_info.isgood():
+            self.sock = _proxied_connection(self.host, self.port,
+                    self.timeout, self.proxy_info, self.debuglevel)
+        else:
+            self.sock = _create_connection(self.host, self.port, self.timeout)
+        _set_keepalive(self.sock, self.tcp_keepalive)
 
 class HTTPSConnectionWithTimeout(httplib.HTTPSConnection):
     """
@@ -898,6 +1162,9 @@ class HTTPSConnectionWithTimeout(httplib.HTTPSConnection):
     the docs of socket.setdefaulttimeout():
     http://docs.python.org/library/socket.html#socket.setdefaulttimeout
     """
+    last_used = None
+    tcp_keepalive = None
+
     def __init__(self, host, port=None, key_file=None, cert_file=None,
                  strict=None, timeout=None, proxy_info=None,
                  ca_certs=None, disable_ssl_certificate_validation=False):
@@ -964,59 +1231,42 @@ class HTTPSConnectionWithTimeout(httplib.HTTPSConnection):
 
     def connect(self):
         "Connect to a host on a given (SSL) port."
-
-        msg = "getaddrinfo returns an empty list"
-        for family, socktype, proto, canonname, sockaddr in socket.getaddrinfo(
-            self.host, self.port, 0, socket.SOCK_STREAM):
-            try:
-                if self.proxy_info and self.proxy_info.isgood():
-                    sock = socks.socksocket(family, socktype, proto)
-                    sock.setproxy(*self.proxy_info.astuple())
-                else:
-                    sock = socket.socket(family, socktype, proto)
-                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-
-                if has_timeout(self.timeout):
-                    sock.settimeout(self.timeout)
-                sock.connect((self.host, self.port))
-                self.sock =_ssl_wrap_socket(
-                    sock, self.key_file, self.cert_file,
-                    self.disable_ssl_certificate_validation, self.ca_certs)
-                if self.debuglevel > 0:
-                    print "connect: (%s, %s)" % (self.host, self.port)
-                if not self.disable_ssl_certificate_validation:
-                    cert = self.sock.getpeercert()
-                    hostname = self.host.split(':', 0)[0]
-                    if not self._ValidateCertificateHostname(cert, hostname):
-                        raise CertificateHostnameMismatch(
-                            'Server presented certificate that does not match '
-                            'host %s: %s' % (hostname, cert), hostname, cert)
-            except ssl_SSLError, e:
-                if sock:
-                    sock.close()
-                if self.sock:
-                    self.sock.close()
-                self.sock = None
-                # Unfortunately the ssl module doesn't seem to provide any way
-                # to get at more detailed error information, in particular
-                # whether the error is due to certificate validation or
-                # something else (such as SSL protocol mismatch).
-                if e.errno == ssl.SSL_ERROR_SSL:
-                    raise SSLHandshakeError(e)
-                else:
-                    raise
-            except (socket.timeout, socket.gaierror):
-              raise
-            except socket.error, msg:
-              if self.debuglevel > 0:
-                  print 'connect fail:', (self.host, self.port)
-              if self.sock:
-                  self.sock.close()
-              self.sock = None
-              continue
-            break
-        if not self.sock:
-          raise socket.error, msg
+        if self.proxy_info and _get_socks() is None:
+            raise ProxiesUnavailableError(
+                'Proxy support missing but proxy use was requested!')
+        if self.proxy_info and self.proxy_info.isgood():
+            sock = _proxied_connection(self.host, self.port, self.timeout,
+                    self.proxy_info, self.debuglevel)
+        else:
+            sock = _create_connection(self.host, self.port, self.timeout)
+        _set_keepalive(sock, self.tcp_keepalive)
+        try:
+            self.sock =_ssl_wrap_socket(
+                sock, self.key_file, self.cert_file,
+                self.disable_ssl_certificate_validation, self.ca_certs,
+                self.host)
+            if self.debuglevel > 0:
+                print "connect: (%s, %s)" % (self.host, self.port)
+            if not self.disable_ssl_certificate_validation:
+                cert = self.sock.getpeercert()
+                hostname = self.host.split(':', 0)[0]
+                if not self._ValidateCertificateHostname(cert, hostname):
+                    raise CertificateHostnameMismatch(
+                        'Server presented certificate that does not match '
+                        'host %s: %s' % (hostname, cert), hostname, cert)
+        except ssl_SSLError, e:
+            sock.close()
+            if self.sock:
+                self.sock.close()
+            self.sock = None
+            # Unfortunately the ssl module doesn't seem to provide any way
+            # to get at more detailed error information, in particular
+            # whether the error is due to certificate validation or
+            # something else (such as SSL protocol mismatch).
+            if e.errno == ssl.SSL_ERROR_SSL:
+                raise SSLHandshakeError(e)
+            else:
+                raise
 
 SCHEME_TO_CONNECTION = {
     'http': HTTPConnectionWithTimeout,
@@ -1117,6 +1367,78 @@ except ImportError:
   pass
 
 
+def _send_request(conn, method, request_uri, body, headers, progress):
+    """Send a request like conn.request(), but write the body a block
+    at a time, calling progress(sent, total, rate) after each block with
+    the bytes sent so far, the body's length and the bytes per second
+    sent so far. 'body' is a string or a file object; unicode is sent
+    encoded as UTF-8."""
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+    if not hasattr(conn, 'putrequest'):
+        conn.request(method, request_uri, body, headers)
+        total = body and len(body) or 0
+        progress(total, total, 0.0)
+        return
+    names = dict((name.lower(), value) for (name, value) in headers.iteritems())
+    total = 0
+    if hasattr(body, 'read'):
+        if 'content-length' in names:
+            total = int(names['content-length'])
+        else:
+            try:
+                total = os.fstat(body.fileno()).st_size - body.tell()
+            except (AttributeError, EnvironmentError, ValueError):
+                body = body.read()
+    if isinstance(body, basestring):
+        total = len(body)
+    conn.putrequest(method, request_uri, skip_host='host' in names,
+                    skip_accept_encoding='accept-encoding' in names)
+    if body is not None and 'content-length' not in names:
+        conn.putheader('Content-Length', str(total))
+    for (name, value) in headers.iteritems():
+        conn.putheader(name, value)
+    conn.endheaders()
+    start = time.time()
+    sent = 0
+    progress(0, total, 0.0)
+    while sent < total:
+        if hasattr(body, 'read'):
+            block = body.read(UPLOAD_BLOCK_SIZE)
+            if not block:
+                break
+        else:
+            block = buffer(body, sent, UPLOAD_BLOCK_SIZE)
+        conn.send(block)
+        sent += len(block)
+        elapsed = time.time() - start
+        progress(sent, total, elapsed and sent / elapsed or 0.0)
+
+def _body_offset(body):
+    """Return where a file body will be read from, or None if it can't
+    be sent again: it isn't seekable. Bodies that aren't files can always
+    be sent again, and give 0."""
+    if not hasattr(body, 'read'):
+        return 0
+    try:
+        return body.tell()
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+
+def _rewind(body, offset):
+    """Get 'body' ready to be sent again, from 'offset', as returned by
+    _body_offset(). Return False if it can't be."""
+    if not hasattr(body, 'read'):
+        return True
+    if offset is None:
+        return False
+    try:
+        body.seek(offset)
+    except (AttributeError, EnvironmentError, ValueError):
+        return False
+    return True
+
+
 class Http(object):
     """An HTTP client that handles:
 - all methods
@@ -1131,7 +1453,7 @@ class Http(object):
 and more.
     """
     def __init__(self, cache=None, timeout=None,
-                 proxy_info=ProxyInfo.from_environment,
+                 proxy_info=proxy_resolver,
                  ca_certs=None, disable_ssl_certificate_validation=False):
         """
         If 'cache' is a string then it is used as a directory name for
@@ -1145,8 +1467,11 @@ and more.
 
         `proxy_info` may be:
           - a callable that takes the http scheme ('http' or 'https') and
-            returns a ProxyInfo instance per request. By default, uses
+            returns a ProxyInfo instance per request, such as
             ProxyInfo.from_environment.
+          - a ProxyResolver. By default, uses the shared proxy_resolver,
+            which reads the environment like ProxyInfo.from_environment
+            but caches the result.
           - a ProxyInfo instance (static proxy config).
           - None (proxy disabled).
 
@@ -1197,15 +1522,33 @@ and more.
 
         self.timeout = timeout
 
+        # Largest decompressed body to accept, in bytes, or None.
+        self.max_decompressed_size = MAX_DECOMPRESSED_SIZE
+
+        # Pooled connections idle for longer than this many seconds are
+        # closed rather than reused, or None to reuse them for as long as
+        # the server keeps them open. Set it a little below the server's
+        # keep-alive timeout.
+        self.idle_timeout = None
+
+        # TCP keepalive for new connections; see _set_keepalive.
+        self.tcp_keepalive = None
+
+        # The class responses are returned as. Set it to CompactResponse
+        # where many responses are made and only their headers are
+        # looked at, e.g. when polling.
+        self.response_class = Response
+
     def _auth_from_challenge(self, host, request_uri, headers, response, content):
         """A generator that creates Authorization objects
            that can be applied to requests.
         """
+        from . import auth
         challenges = _parse_www_authenticate(response, 'www-authenticate')
         for cred in self.credentials.iter(host):
             for scheme in AUTH_SCHEME_ORDER:
                 if challenges.has_key(scheme):
-                    yield AUTH_SCHEME_CLASSES[scheme](cred, host, request_uri, headers, response, content, self)
+                    yield auth.AUTH_SCHEME_CLASSES[scheme](cred, host, request_uri, headers, response, content, self)
 
     def add_credentials(self, name, password, domain=""):
         """Add a name and password that will be used
@@ -1223,12 +1566,18 @@ and more.
         self.credentials.clear()
         self.authorizations = []
 
-    def _conn_request(self, conn, request_uri, method, body, headers):
+    def _conn_request(self, conn, request_uri, method, body, headers, stream=False, progress=None):
+        # The request is sent again if the connection turns out to have
+        # been closed, so note where a file body starts.
+        body_offset = _body_offset(body)
         for i in range(2):
             try:
                 if conn.sock is None:
                   conn.connect()
-                conn.request(method, request_uri, body, headers)
+                if progress is None:
+                    conn.request(method, request_uri, body, headers)
+                else:
+                    _send_request(conn, method, request_uri, body, headers, progress)
             except socket.timeout:
                 raise
             except socket.gaierror:
@@ -1249,60 +1598,84 @@ and more.
                 # Just because the server closed the connection doesn't apparently mean
                 # that the server didn't send a response.
                 if conn.sock is None:
-                    if i == 0:
+                    if i == 0 and _rewind(body, body_offset):
                         conn.close()
                         conn.connect()
                         continue
                     else:
                         conn.close()
                         raise
-                if i == 0:
+                if i == 0 and _rewind(body, body_offset):
                     conn.close()
                     conn.connect()
                     continue
             try:
                 response = conn.getresponse()
             except (socket.error, httplib.HTTPException):
-                if i == 0:
+                if i == 0 and _rewind(body, body_offset):
                     conn.close()
                     conn.connect()
                     continue
                 else:
                     raise
             else:
+                if stream:
+                    fp = response
+                    if method == "HEAD":
+                        response.close()
+                        fp = None
+                    response = self.response_class(response)
+                    content = _streamContent(response, fp, conn, self.max_decompressed_size)
+                    if response.status in [300, 301, 302, 303, 307, 401]:
+                        # These bodies are small and may be thrown away
+                        # while the request is retried on this connection.
+                        content.buffer()
+                    break
+                fp = response
+                response = self.response_class(response)
                 content = ""
                 if method == "HEAD":
-                    response.close()
+                    fp.close()
+                elif (isinstance(fp, httplib.HTTPResponse) and
+                      response.get('content-encoding') in ['gzip', 'deflate']):
+                    # Decode the body as it comes off the socket instead of
+                    # holding the compressed and decoded copies together.
+                    content = _streamContent(response, fp, conn, self.max_decompressed_size).read()
+                    response['content-length'] = str(len(content))
                 else:
-                    content = response.read()
-                response = Response(response)
-                if method != "HEAD":
-                    content = _decompressContent(response, content)
+                    content = _decompressContent(response, fp.read(), self.max_decompressed_size)
+                conn.last_used = time.time()
             break
         return (response, content)
 
 
-    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey):
+    def _request(self, conn, host, absolute_uri, request_uri, method, body, headers, redirections, cachekey, stream=False, progress=None, body_offset=0):
         """Do the actual request using the connection object
-        and also follow one level of redirects if necessary"""
+        and also follow one level of redirects if necessary.
+        'body_offset' is where a file body starts, as returned by
+        _body_offset(), for sending it again."""
 
         auths = [(auth.depth(request_uri), auth) for auth in self.authorizations if auth.inscope(host, request_uri)]
         auth = auths and sorted(auths)[0][1] or None
         if auth:
             auth.request(method, request_uri, headers, body)
 
-        (response, content) = self._conn_request(conn, request_uri, method, body, headers)
+        (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream, progress)
 
         if auth:
-            if auth.response(response, body):
+            if auth.response(response, body) and _rewind(body, body_offset):
+                if stream:
+                    content.close()
                 auth.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream, progress)
                 response._stale_digest = 1
 
         if response.status == 401:
             for authorization in self._auth_from_challenge(host, request_uri, headers, response, content):
+                if not _rewind(body, body_offset):
+                    break
                 authorization.request(method, request_uri, headers, body)
-                (response, content) = self._conn_request(conn, request_uri, method, body, headers, )
+                (response, content) = self._conn_request(conn, request_uri, method, body, headers, stream, progress)
                 if response.status != 401:
                     self.authorizations.append(authorization)
                     authorization.response(response, body)
@@ -1332,15 +1705,16 @@ and more.
                         del headers['if-modified-since']
                     if response.has_key('location'):
                         location = response['location']
-                        old_response = copy.deepcopy(response)
+                        old_response = copy.copy(response)
                         if not old_response.has_key('content-location'):
                             old_response['content-location'] = absolute_uri
                         redirect_method = method
                         if response.status in [302, 303]:
                             redirect_method = "GET"
                             body = None
-                        (response, content) = self.request(location, redirect_method, body=body, headers = headers, redirections = redirections - 1)
-                        response.previous = old_response
+                        if _rewind(body, body_offset):
+                            (response, content) = self.request(location, redirect_method, body=body, headers = headers, redirections = redirections - 1, stream=stream, progress=progress)
+                            response.previous = old_response
                 else:
                     raise RedirectLimit("Redirected more times than rediection_limit allows.", response, content)
             elif response.status in [200, 203] and method in ["GET", "HEAD"]:
@@ -1354,15 +1728,32 @@ and more.
     def _normalize_headers(self, headers):
         return _normalize_headers(headers)
 
+    def _default_headers(self, headers):
+        """Normalize request headers and fill in the defaults."""
+        if headers is None:
+            headers = {}
+        else:
+            headers = self._normalize_headers(headers)
+
+        if not headers.has_key('user-agent'):
+            headers['user-agent'] = "Python-httplib2/%s (gzip)" % __version__
+        return headers
+
+    def prepare(self, uri, headers=None):
+        """Return a PreparedRequest for 'uri', with 'headers' sent on
+        every request made with it."""
+        return PreparedRequest(self, uri, headers)
+
 # Need to catch and rebrand some exceptions
 # Then need to optionally turn all exceptions into status codes
 # including all socket.* and httplib.* exceptions.
 
 
-    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=DEFAULT_MAX_REDIRECTS, connection_type=None, stream=False, progress=None):
         """ Performs a single HTTP request.
 The 'uri' is the URI of the HTTP resource and can begin
 with either 'http' or 'https'. The value of 'uri' must be an absolute URI.
+It may also be a PreparedRequest made by prepare().
 
 The 'method' is the HTTP method to perform, such as GET, POST, DELETE, etc.
 There is no restriction on the methods allowed.
@@ -1379,76 +1770,60 @@ exception is 'redirections. The default is 5.
 The return value is a tuple of (response, content), the first
 being and instance of the 'Response' class, the second being
 a string that contains the response entity body.
+
+If 'stream' is true the content is instead a ResponseStream, a
+file-like object that reads and decompresses the body as it is
+consumed. Streamed requests bypass the cache.
+
+If 'progress' is given, the body is sent in blocks and
+progress(sent, total, rate) is called after each one, with the bytes
+sent so far, the body's length and the bytes sent per second, so a
+slow upload can be told from a hung one.
         """
+        stream_conn = None
+        cached_buffer = None
+        # Where a file body starts, so that it can be sent again after an
+        # authentication challenge or a redirect.
+        body_offset = _body_offset(body)
         try:
-            if headers is None:
-                headers = {}
+            if isinstance(uri, PreparedRequest):
+                prepared = uri
+                if headers is None:
+                    headers = dict(prepared.headers)
+                else:
+                    headers = dict(prepared.headers, **self._normalize_headers(headers))
+                (uri, scheme, authority, request_uri, defrag_uri) = prepared.target
+                conn_key = prepared.conn_key
             else:
-                headers = self._normalize_headers(headers)
-
-            if not headers.has_key('user-agent'):
-                headers['user-agent'] = "Python-httplib2/%s (gzip)" % __version__
-
-            uri = iri2uri(uri)
-
-            (scheme, authority, request_uri, defrag_uri) = urlnorm(uri)
-            domain_port = authority.split(":")[0:2]
-            if len(domain_port) == 2 and domain_port[1] == '443' and scheme == 'http':
-                scheme = 'https'
-                authority = domain_port[0]
-
+                headers = self._default_headers(headers)
+                (uri, scheme, authority, request_uri, defrag_uri) = _request_target(uri)
+                conn_key = scheme+":"+authority
             proxy_info = self._get_proxy_info(scheme, authority)
 
-            conn_key = scheme+":"+authority
-            if conn_key in self.connections:
-                conn = self.connections[conn_key]
-            else:
-                if not connection_type:
-                  connection_type = SCHEME_TO_CONNECTION[scheme]
-                certs = list(self.certificates.iter(authority))
-                if issubclass(connection_type, HTTPSConnectionWithTimeout):
-                    if certs:
-                        conn = self.connections[conn_key] = connection_type(
-                                authority, key_file=certs[0][0],
-                                cert_file=certs[0][1], timeout=self.timeout,
-                                proxy_info=proxy_info,
-                                ca_certs=self.ca_certs,
-                                disable_ssl_certificate_validation=
-                                        self.disable_ssl_certificate_validation)
-                    else:
-                        conn = self.connections[conn_key] = connection_type(
-                                authority, timeout=self.timeout,
-                                proxy_info=proxy_info,
-                                ca_certs=self.ca_certs,
-                                disable_ssl_certificate_validation=
-                                        self.disable_ssl_certificate_validation)
-                else:
-                    conn = self.connections[conn_key] = connection_type(
-                            authority, timeout=self.timeout,
-                            proxy_info=proxy_info)
-                conn.set_debuglevel(debuglevel)
+            conn = self._get_connection(conn_key, scheme, authority, proxy_info, connection_type)
+
+            if stream:
+                # The connection is busy until the body has been read, so
+                # take it out of the pool; other requests made meanwhile
+                # get a connection of their own.
+                del self.connections[conn_key]
+                stream_conn = conn
 
             if 'range' not in headers and 'accept-encoding' not in headers:
                 headers['accept-encoding'] = 'gzip, deflate'
 
-            info = email.Message.Message()
+            info = {}
             cached_value = None
-            if self.cache:
+            if self.cache and not stream:
                 cachekey = defrag_uri
-                cached_value = self.cache.get(cachekey)
+                cached_value = getattr(self.cache, 'get_buffer', self.cache.get)(cachekey)
+                if isinstance(cached_value, mmap.mmap):
+                    cached_buffer = cached_value
                 if cached_value:
-                    # info = email.message_from_string(cached_value)
-                    #
-                    # Need to replace the line above with the kludge below
-                    # to fix the non-existent bug not fixed in this
-                    # bug report: http://mail.python.org/pipermail/python-bugs-list/2005-September/030289.html
                     try:
-                        info, content = cached_value.split('\r\n\r\n', 1)
-                        feedparser = email.FeedParser.FeedParser()
-                        feedparser.feed(info)
-                        info = feedparser.close()
-                        feedparser._parse = None
-                    except IndexError:
+                        cached_entry = _CacheEntry(cached_value)
+                        info = cached_entry.info
+                    except (ValueError, EOFError, TypeError, struct.error):
                         self.cache.delete(cachekey)
                         cachekey = None
                         cached_value = None
@@ -1470,7 +1845,7 @@ a string that contains the response entity body.
                 vary_headers = vary.lower().replace(' ', '').split(',')
                 for header in vary_headers:
                     key = '-varied-%s' % header
-                    value = info[key]
+                    value = info.get(key)
                     if headers.get(header, None) != value:
                             cached_value = None
                             break
@@ -1481,7 +1856,7 @@ a string that contains the response entity body.
                     if redirections <= 0:
                       raise RedirectLimit("Redirected more times than rediection_limit allows.", {}, "")
                     (response, new_content) = self.request(info['-x-permanent-redirect-url'], "GET", headers = headers, redirections = redirections - 1)
-                    response.previous = Response(info)
+                    response.previous = self.response_class(info)
                     response.previous.fromcache = True
                 else:
                     # Determine our course of action:
@@ -1492,13 +1867,15 @@ a string that contains the response entity body.
                     # 1. [FRESH] Return the cache entry w/o doing a GET
                     # 2. [STALE] Do the GET (but add in cache validators if available)
                     # 3. [TRANSPARENT] Do a GET w/o any cache validators (Cache-Control: no-cache) on the request
-                    entry_disposition = _entry_disposition(info, headers)
+                    entry_disposition = cached_entry.disposition(headers)
 
                     if entry_disposition == "FRESH":
                         if not cached_value:
                             info['status'] = '504'
                             content = ""
-                        response = Response(info)
+                        else:
+                            content = cached_entry.body()
+                        response = self.response_class(info)
                         if cached_value:
                             response.fromcache = True
                         return (response, content)
@@ -1511,7 +1888,7 @@ a string that contains the response entity body.
                     elif entry_disposition == "TRANSPARENT":
                         pass
 
-                    (response, new_content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey)
+                    (response, new_content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey, progress=progress, body_offset=body_offset)
 
                 if response.status == 304 and method == "GET":
                     # Rewrite the cache entry with the new end-to-end headers
@@ -1521,7 +1898,8 @@ a string that contains the response entity body.
 
                     for key in _get_end2end_headers(response):
                         info[key] = response[key]
-                    merged_response = Response(info)
+                    content = cached_entry.body()
+                    merged_response = self.response_class(info)
                     if hasattr(response, "_stale_digest"):
                         merged_response._stale_digest = response._stale_digest
                     _updateCache(headers, merged_response, content, self.cache, cachekey)
@@ -1538,11 +1916,23 @@ a string that contains the response entity body.
                 cc = _parse_cache_control(headers)
                 if cc.has_key('only-if-cached'):
                     info['status'] = '504'
-                    response = Response(info)
+                    response = self.response_class(info)
                     content = ""
                 else:
-                    (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey)
+                    (response, content) = self._request(conn, authority, uri, request_uri, method, body, headers, redirections, cachekey, stream, progress, body_offset)
+
+            if stream:
+                release = lambda: self._release_connection(conn_key, conn)
+                if isinstance(content, ResponseStream) and content.connection is conn:
+                    content._release_to(release)
+                else:
+                    release()
+                stream_conn = None
         except Exception, e:
+            if stream_conn is not None:
+                # The connection is out of the pool and may be part way
+                # through a response, so it can't be reused.
+                stream_conn.close()
             if self.force_exception_to_status_code:
                 if isinstance(e, HttpLib2ErrorWithResponse):
                     response = e.response
@@ -1551,7 +1941,7 @@ a string that contains the response entity body.
                     response.reason = str(e)
                 elif isinstance(e, socket.timeout):
                     content = "Request Timeout"
-                    response = Response( {
+                    response = self.response_class( {
                             "content-type": "text/plain",
                             "status": "408",
                             "content-length": len(content)
@@ -1559,7 +1949,7 @@ a string that contains the response entity body.
                     response.reason = "Request Timeout"
                 else:
                     content = str(e)
-                    response = Response( {
+                    response = self.response_class( {
                             "content-type": "text/plain",
                             "status": "400",
                             "content-length": len(content)
@@ -1567,16 +1957,198 @@ a string that contains the response entity body.
                     response.reason = "Bad Request"
             else:
                 raise
-
+        finally:
+            if cached_buffer is not None:
+                # Anything needed from a memory mapped entry has been
+                # copied out of it by now.
+                cached_buffer.close()
 
         return (response, content)
 
+    def pipeline(self, uris, method="GET", headers=None):
+        """Make a batch of GET or HEAD requests, pipelined.
+
+'uris' is a list of URIs or PreparedRequests. Requests to the same
+host are written back to back on one connection, without waiting for
+each response, and the responses are read off it in order. This saves
+a round trip per request when fetching many small resources.
+
+Pipelined requests neither read nor update the cache. A redirect or an
+authentication challenge is retried with request(), as is every request
+left over when the server closes the connection part way through or
+does not speak HTTP/1.1. A batch is only sent again if the connection
+is closed before any response arrives; a timeout is raised instead.
+
+Returns a list of (response, content) tuples, in the order of 'uris'.
+        """
+        if method not in ["GET", "HEAD"]:
+            raise ValueError("Only GET and HEAD requests can be pipelined.")
+        results = [None] * len(uris)
+        batches = {}
+        order = []
+        for index, uri in enumerate(uris):
+            if isinstance(uri, PreparedRequest):
+                prepared = uri
+            else:
+                prepared = PreparedRequest(self, uri)
+            if prepared.conn_key not in batches:
+                batches[prepared.conn_key] = []
+                order.append(prepared.conn_key)
+            batches[prepared.conn_key].append((index, prepared))
+
+        for conn_key in order:
+            batch = batches[conn_key]
+            pipelined = []
+            if len(batch) > 1:
+                pipelined = self._pipeline_batch(batch, method, headers)
+            for (index, prepared), result in map(None, batch, pipelined):
+                if result is None or result[0].status in [300, 301, 302, 303, 307, 401]:
+                    result = self.request(prepared, method, headers=headers)
+                results[index] = result
+        return results
+
+    def _pipeline_batch(self, batch, method, headers):
+        """Send the requests in 'batch', all for one connection, at once and
+        read back as many of the responses as the server gives."""
+        (uri, scheme, authority, request_uri, defrag_uri) = batch[0][1].target
+        conn = self._get_connection(batch[0][1].conn_key, scheme, authority,
+                self._get_proxy_info(scheme, authority))
+        if not isinstance(conn, (HTTPConnectionWithTimeout, HTTPSConnectionWithTimeout)):
+            return []
+
+        data = []
+        for (index, prepared) in batch:
+            (uri, scheme, authority, request_uri, defrag_uri) = prepared.target
+            if headers is None:
+                request_headers = dict(prepared.headers)
+            else:
+                request_headers = dict(prepared.headers, **self._normalize_headers(headers))
+            auths = [(auth.depth(request_uri), auth) for auth in self.authorizations if auth.inscope(authority, request_uri)]
+            auth = auths and sorted(auths)[0][1] or None
+            if auth:
+                auth.request(method, request_uri, request_headers, None)
+            data.append(_raw_request(method, request_uri, authority, request_headers))
+        data = "".join(data)
+
+        results = []
+        for i in range(2):
+            try:
+                if conn.sock is None:
+                    conn.connect()
+                conn.sock.sendall(data)
+                fp = _PipelinedFile(conn.sock.makefile('rb'))
+            except socket.timeout:
+                conn.close()
+                raise
+            except (socket.error, httplib.HTTPException):
+                conn.close()
+                continue
+            try:
+                for (index, prepared) in batch:
+                    response = httplib.HTTPResponse(fp, method=method)
+                    response.begin()
+                    if method == "HEAD":
+                        content = ""
+                        response.close()
+                    else:
+                        content = response.read()
+                    response = self.response_class(response)
+                    content = _decompressContent(response, content, self.max_decompressed_size)
+                    results.append((response, content))
+                    if response.version < 11 or response.get('connection', '').lower() == 'close':
+                        conn.close()
+                        break
+            except socket.timeout:
+                # Some of the requests may have been acted on, so don't
+                # send them again.
+                conn.close()
+                fp.fp.close()
+                raise
+            except (socket.error, httplib.HTTPException):
+                # The server reset or closed the connection. The requests
+                # are only sent again if no response had been started.
+                conn.close()
+            except:
+                # Whatever is left of the responses can't be read past.
+                conn.close()
+                fp.fp.close()
+                raise
+            fp.fp.close()
+            if results or fp.started:
+                break
+        conn.last_used = time.time()
+        return results
+
+    def _get_connection(self, conn_key, scheme, authority, proxy_info, connection_type=None):
+        """Return the pooled connection for 'conn_key', making it if need be.
+        A pooled connection that has gone stale, or was made through a
+        different proxy than 'proxy_info', is closed, to reconnect when it
+        is next used."""
+        if conn_key in self.connections:
+            conn = self.connections[conn_key]
+            if hasattr(conn, 'proxy_info') and \
+                    _proxy_tuple(conn.proxy_info) != _proxy_tuple(proxy_info):
+                conn.close()
+                conn.proxy_info = proxy_info
+            elif getattr(conn, 'sock', None) is not None and \
+                    _is_stale(conn, self.idle_timeout):
+                conn.close()
+        else:
+            if not connection_type:
+              connection_type = SCHEME_TO_CONNECTION[scheme]
+            certs = list(self.certificates.iter(authority))
+            if issubclass(connection_type, HTTPSConnectionWithTimeout):
+                if certs:
+                    conn = self.connections[conn_key] = connection_type(
+                            authority, key_file=certs[0][0],
+                            cert_file=certs[0][1], timeout=self.timeout,
+                            proxy_info=proxy_info,
+                            ca_certs=self.ca_certs,
+                            disable_ssl_certificate_validation=
+                                    self.disable_ssl_certificate_validation)
+                else:
+                    conn = self.connections[conn_key] = connection_type(
+                            authority, timeout=self.timeout,
+                            proxy_info=proxy_info,
+                            ca_certs=self.ca_certs,
+                            disable_ssl_certificate_validation=
+                                    self.disable_ssl_certificate_validation)
+            else:
+                conn = self.connections[conn_key] = connection_type(
+                        authority, timeout=self.timeout,
+                        proxy_info=proxy_info)
+            conn.set_debuglevel(debuglevel)
+            conn.tcp_keepalive = self.tcp_keepalive
+        return conn
+
+    def close_idle_connections(self, idle_timeout=None):
+        """Close pooled connections that the server has closed or that
+        have been idle for longer than 'idle_timeout' seconds (by default
+        the Http's idle_timeout). Handy to call from a timer in a long
+        running session, so idle sockets aren't held open."""
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+        for conn in self.connections.values():
+            if getattr(conn, 'sock', None) is not None and \
+                    _is_stale(conn, idle_timeout):
+                conn.close()
+
+    def _release_connection(self, conn_key, conn):
+        """Put a connection taken out of the pool for streaming back."""
+        conn.last_used = time.time()
+        if conn_key not in self.connections:
+            self.connections[conn_key] = conn
+        else:
+            conn.close()
+
     def _get_proxy_info(self, scheme, authority):
         """Return a ProxyInfo instance (or None) based on the scheme
         and authority.
         """
-        hostname, port = urllib.splitport(authority)
         proxy_info = self.proxy_info
+        if isinstance(proxy_info, ProxyResolver):
+            return proxy_info.resolve(scheme, authority)
+        hostname, port = urllib.splitport(authority)
         if callable(proxy_info):
             proxy_info = proxy_info(scheme)
 
@@ -1586,6 +2158,107 @@ a string that contains the response entity body.
         return proxy_info
 
 
+def _proxy_tuple(proxy_info):
+    """Return the settings of 'proxy_info', or None, for comparing."""
+    if proxy_info is None:
+        return None
+    return proxy_info.astuple()
+
+
+def _request_target(uri):
+    """Return (uri, scheme, authority, request_uri, defrag_uri) for a
+    request to 'uri'."""
+    uri = iri2uri(uri)
+
+    (scheme, authority, request_uri, defrag_uri) = urlnorm(uri)
+    domain_port = authority.split(":")[0:2]
+    if len(domain_port) == 2 and domain_port[1] == '443' and scheme == 'http':
+        scheme = 'https'
+        authority = domain_port[0]
+    return (uri, scheme, authority, request_uri, defrag_uri)
+
+
+def _raw_request(method, request_uri, host, headers):
+    """Return the bytes of an HTTP/1.1 request without a body."""
+    lines = ["%s %s HTTP/1.1" % (method, request_uri)]
+    if 'host' not in headers:
+        lines.append("Host: %s" % host)
+    for key, value in headers.iteritems():
+        lines.append("%s: %s" % (key, value))
+    lines.append("\r\n")
+    return "\r\n".join(lines)
+
+
+class _PipelinedFile(object):
+    """Stands in for the socket given to each httplib.HTTPResponse read
+    off a pipelined connection, so that they all share one buffered file
+    and a response closing its file does not lose the buffered data of
+    those behind it."""
+    def __init__(self, fp):
+        self.fp = fp
+        # Whether any of the responses has arrived.
+        self.started = False
+
+    def makefile(self, *args):
+        return self
+
+    def read(self, *args):
+        data = self.fp.read(*args)
+        self.started = self.started or bool(data)
+        return data
+
+    def readline(self, *args):
+        data = self.fp.readline(*args)
+        self.started = self.started or bool(data)
+        return data
+
+    def close(self):
+        pass
+
+
+class PreparedRequest(object):
+    """A request target that has been worked out once, up front.
+
+    Http.request() converts the URI from an IRI, parses and normalizes
+    it and normalizes the headers on every call. A PreparedRequest, made
+    with Http.prepare(), holds the results, so repeated requests to the
+    same endpoint skip all of that. Pass it to Http.request() in place
+    of a URI, or use its request() method. The proxy is still looked up
+    when each request is sent, so changes to it are picked up.
+    """
+    def __init__(self, http, uri, headers=None):
+        self.http = http
+        self.headers = http._default_headers(headers)
+        self.target = _request_target(uri)
+        (uri, scheme, authority, request_uri, defrag_uri) = self.target
+        self.conn_key = scheme + ":" + authority
+        if 'range' not in self.headers and 'accept-encoding' not in self.headers:
+            self.headers['accept-encoding'] = 'gzip, deflate'
+
+    def with_query(self, query):
+        """Return a copy of this request with 'query', a dict or an
+        already encoded string, added to the URI's query string."""
+        if not isinstance(query, basestring):
+            query = urllib.urlencode(query)
+        if not query:
+            return self
+        (uri, scheme, authority, request_uri, defrag_uri) = self.target
+        separator = '?' in request_uri and '&' or '?'
+        prepared = copy.copy(self)
+        prepared.target = (defrag_uri + separator + query, scheme, authority,
+                request_uri + separator + query, defrag_uri + separator + query)
+        return prepared
+
+    def request(self, method="GET", body=None, headers=None, query=None, **kwargs):
+        """Make the request, with 'query' added to the query string and
+        'headers' on top of the prepared ones. Other arguments are as for
+        Http.request()."""
+        prepared = self
+        if query:
+            prepared = self.with_query(query)
+        return self.http.request(prepared, method, body, headers, **kwargs)
+
+
 class Response(dict):
     """An object more like email.Message than httplib.HTTPResponse."""
 
@@ -1604,8 +2277,8 @@ class Response(dict):
     previous = None
 
     def __init__(self, info):
-        # info is either an email.Message or
-        # an httplib.HTTPResponse object.
+        # info is an httplib.HTTPResponse object, a dict
+        # of headers or an email.Message.
         if isinstance(info, httplib.HTTPResponse):
             for key, value in info.getheaders():
                 self[key.lower()] = value
@@ -1613,14 +2286,14 @@ class Response(dict):
             self['status'] = str(self.status)
             self.reason = info.reason
             self.version = info.version
-        elif isinstance(info, email.Message.Message):
-            for key, value in info.items():
-                self[key] = value
-            self.status = int(self['status'])
-        else:
+        elif isinstance(info, dict):
             for key, value in info.iteritems():
                 self[key] = value
             self.status = int(self.get('status', self.status))
+        else:
+            for key, value in info.items():
+                self[key] = value
+            self.status = int(self['status'])
 
 
     def __getattr__(self, name):
@@ -1628,3 +2301,285 @@ class Response(dict):
             return self
         else:
             raise AttributeError, name
+
+
+class CompactResponse(object):
+    """A Response that is cheaper to make and keep.
+
+    It has Response's attributes and mapping interface, but isn't a
+    dict. Instead of copying the headers httplib has already parsed, it
+    shares them, and only copies them if the response is changed; the
+    'status' entry is worked out from the status attribute when asked
+    for. Use it with Http.response_class = CompactResponse.
+    """
+    __slots__ = ('_headers', '_shared', 'status', 'reason', 'version',
+                 'fromcache', 'previous', '_stale_digest')
+
+    def __init__(self, info):
+        # info is an httplib.HTTPResponse object, a dict
+        # of headers or an email.Message.
+        self.fromcache = False
+        self.previous = None
+        if isinstance(info, httplib.HTTPResponse):
+            self._headers = info.msg.dict
+            self._shared = True
+            self.status = info.status
+            self.reason = info.reason
+            self.version = info.version
+        else:
+            self._headers = dict(info.items())
+            self._shared = False
+            self.status = int(self._headers.pop('status', 200))
+            self.reason = "Ok"
+            self.version = 11
+
+    def _own(self):
+        """Return the headers, copying them first if they're shared."""
+        if self._shared:
+            self._headers = dict(self._headers)
+            self._shared = False
+        return self._headers
+
+    def __copy__(self):
+        other = CompactResponse.__new__(CompactResponse)
+        for name in self.__slots__:
+            if hasattr(self, name):
+                setattr(other, name, getattr(self, name))
+        self._shared = other._shared = True
+        return other
+
+    def __getitem__(self, key):
+        if key == 'status':
+            return str(self.status)
+        return self._headers[key]
+
+    def __setitem__(self, key, value):
+        if key == 'status':
+            self.status = int(value)
+        else:
+            self._own()[key] = value
+
+    def __delitem__(self, key):
+        if key == 'status':
+            raise KeyError(key)
+        del self._own()[key]
+
+    def __contains__(self, key):
+        return key == 'status' or key in self._headers
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        if key == 'status':
+            return str(self.status)
+        return self._headers.get(key, default)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key == 'status':
+            raise KeyError(key)
+        if key not in self._headers:
+            return self._headers.pop(key, *default)
+        return self._own().pop(key)
+
+    def update(self, other):
+        for (key, value) in other.items():
+            self[key] = value
+
+    def keys(self):
+        return self._headers.keys() + ['status']
+
+    def iteritems(self):
+        for item in self._headers.iteritems():
+            yield item
+        yield ('status', str(self.status))
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return [value for (key, value) in self.iteritems()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._headers) + 1
+
+    def __eq__(self, other):
+        if not hasattr(other, 'items'):
+            return NotImplemented
+        return dict(self.iteritems()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'CompactResponse(%r)' % (dict(self.iteritems()),)
+
+    @property
+    def dict(self):
+        return self
+
+
+class ResponseStream(object):
+    """A read-only, file-like view of a response body.
+
+    This is the content returned by Http.request(..., stream=True). The
+    body is pulled off the socket as it is read and decompressed
+    incrementally, so it never has to fit in memory. Iterating over the
+    stream yields decoded chunks of at most 'chunk_size' bytes.
+
+    The connection the body arrives on stays busy until the stream has
+    been exhausted or closed, so don't leave streams half read.
+    """
+
+    """Number of bytes read off the socket at a time."""
+    chunk_size = 64 * 1024
+
+    def __init__(self, fp, response, encoding=None, connection=None,
+                 max_size=None):
+        # fp is the httplib.HTTPResponse the body is read from, or
+        # None if there is no body to read.
+        self.fp = fp
+        self.response = response
+        self.connection = connection
+        self.closed = False
+        self._buffer = ""
+        self._release = None
+        self._decoder = None
+        self._decoded = iter(())
+        if encoding is not None:
+            self._decoder = _ContentDecoder(response, encoding, max_size)
+
+    def _next_block(self):
+        """Read the next block of the body and return it decoded, or
+        None at the end of the body."""
+        try:
+            while True:
+                data = next(self._decoded, None)
+                if data is not None:
+                    return data
+                if self.fp is None:
+                    return None
+                data = self.fp.read(self.chunk_size)
+                if not data:
+                    if self._decoder is not None:
+                        data = self._decoder.flush()
+                    self._finish()
+                    return data or None
+                if self._decoder is None:
+                    return data
+                self._decoded = self._decoder.decode(data)
+        except FailedToDecompressContent:
+            self.close()
+            raise
+
+    def _finish(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+    def _release_to(self, callback):
+        """Call 'callback' once the connection is free for another
+        request, which may be right away."""
+        if self.fp is None:
+            callback()
+        else:
+            self._release = callback
+
+    def read(self, size=-1):
+        """Read up to 'size' decoded bytes, or everything that is left
+        if 'size' is negative."""
+        if size is None or size < 0:
+            if self._decoder is None and self.fp is not None:
+                data = self._buffer + self.fp.read()
+                self._buffer = ""
+                self._finish()
+                return data
+            chunks = [self._buffer]
+            self._buffer = ""
+            block = self._next_block()
+            while block is not None:
+                chunks.append(block)
+                block = self._next_block()
+            return "".join(chunks)
+        while len(self._buffer) < size:
+            block = self._next_block()
+            if block is None:
+                break
+            self._buffer += block
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def buffer(self):
+        """Read the rest of the body into memory, freeing up the
+        connection. The stream can still be read afterwards."""
+        self._buffer = self.read()
+
+    def __iter__(self):
+        if self._buffer:
+            data, self._buffer = self._buffer, ""
+            yield data
+        block = self._next_block()
+        while block is not None:
+            yield block
+            block = self._next_block()
+
+    def close(self):
+        """Discard whatever is left of the body. A connection with
+        unread data on it can't be reused, so it is closed too."""
+        if self.fp is not None and self.connection is not None:
+            self.connection.close()
+        self._buffer = ""
+        self.closed = True
+        self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# The names of httplib2.auth that are also names of httplib2, as they
+# were before the authentication schemes moved into their own module.
+_AUTH_NAMES = frozenset(['Authentication', 'BasicAuthentication',
+    'DigestAuthentication', 'HmacDigestAuthentication', 'WsseAuthentication',
+    'GoogleLoginAuthentication', 'AUTH_SCHEME_CLASSES'])
+
+class _Module(types.ModuleType):
+    """httplib2 as it is found in sys.modules: it passes everything
+    through to the module itself, except that the names in _AUTH_NAMES
+    import httplib2.auth the first time they're looked up."""
+
+    def __init__(self, module):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        types.ModuleType.__setattr__(self, '_module', module)
+
+    def __getattr__(self, name):
+        try:
+            return getattr(self._module, name)
+        except AttributeError:
+            if name not in _AUTH_NAMES:
+                raise
+        from . import auth
+        return getattr(auth, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._module, name, value)
+
+    def __delattr__(self, name):
+        delattr(self._module, name)
+
+    def __dir__(self):
+        return sorted(set(dir(self._module)) | _AUTH_NAMES)
+
+sys.modules[__name__] = _Module(sys.modules[__name__])
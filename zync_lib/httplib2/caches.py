@@ -0,0 +1,549 @@
+"""
+caches
+
+Cache backends for httplib2.Http. Each implements the same get/set/delete
+interface as httplib2.FileCache and can be passed as Http(cache=...).
+
+"""
+
+import os
+import sys
+import time
+import errno
+import zlib
+import tempfile
+import threading
+from collections import OrderedDict
+try:
+    from hashlib import md5 as _md5
+except ImportError:
+    import md5
+    _md5 = md5.new
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class _FileLock(object):
+    """An exclusive lock on a file, held across threads and processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._f = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            f = open(self.path, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except IOError:
+                        # LK_LOCK gives up after ten seconds; keep waiting.
+                        pass
+            self._f = f
+        except:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        f, self._f = self._f, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            f.close()
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _replace(src, dst):
+    """Rename src over dst, atomically where the platform allows it."""
+    try:
+        os.rename(src, dst)
+    except OSError:
+        if sys.platform != 'win32' or not os.path.exists(dst):
+            raise
+        # Windows won't rename over an existing file.
+        os.remove(dst)
+        os.rename(src, dst)
+
+
+class LRUFileCache(object):
+    """A directory cache that is safe to share between threads and
+    processes, with a size limit.
+
+    Entries are spread over 256 subdirectories and written to a temporary
+    file that is then renamed into place, so readers never see a partial
+    entry. The total size of the entries is kept under 'max_bytes' by
+    evicting the least recently used ones; an entry's modification time
+    records when it was last read. If 'compress' is true the entries are
+    stored zlib compressed.
+
+    Bookkeeping and eviction are serialized with a lock file in the cache
+    directory, reads take no lock at all.
+    """
+
+    """Evictions trim the cache down to this fraction of max_bytes, so
+    that they don't happen on every write."""
+    low_water = 0.9
+
+    """Reads only refresh an entry's access time if it is older than
+    this many seconds, to save a metadata write on every hit."""
+    touch_interval = 60
+
+    def __init__(self, cache, max_bytes=256 * 1024 * 1024, compress=False):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self.compress = compress
+        if not os.path.exists(cache):
+            try:
+                os.makedirs(cache)
+            except OSError, e:
+                # Another process may have just created it.
+                if e.errno != errno.EEXIST:
+                    raise
+        self._lock = _FileLock(os.path.join(cache, '.lock'))
+        self._usage_path = os.path.join(cache, '.usage')
+
+    def _path(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        name = _md5(key).hexdigest()
+        return os.path.join(self.cache, name[:2], name)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime
+        finally:
+            f.close()
+        if time.time() - mtime > self.touch_interval:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+        if data[:1] == 'z':
+            try:
+                return zlib.decompress(data[1:])
+            except zlib.error:
+                return None
+        if data[:1] == 'r':
+            return data[1:]
+        return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        if self.compress:
+            data = 'z' + zlib.compress(value)
+        else:
+            data = 'r' + value
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.mkdir(directory)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+        fd, tmp = tempfile.mkstemp(prefix='.tmp', dir=directory)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            self._lock.acquire()
+            try:
+                old_size = self._size(path)
+                _replace(tmp, path)
+                self._add_usage(len(data) - old_size)
+            finally:
+                self._lock.release()
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, key):
+        path = self._path(key)
+        self._lock.acquire()
+        try:
+            size = self._size(path)
+            if size:
+                try:
+                    os.remove(path)
+                except OSError:
+                    return
+                self._add_usage(-size)
+        finally:
+            self._lock.release()
+
+    def _size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _read_usage(self):
+        try:
+            f = open(self._usage_path, 'rb')
+            try:
+                return int(f.read() or 0)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+
+    def _write_usage(self, usage):
+        f = open(self._usage_path, 'wb')
+        try:
+            f.write(str(usage))
+        finally:
+            f.close()
+
+    def _add_usage(self, delta):
+        """Update the recorded total size; the lock must be held."""
+        usage = self._read_usage()
+        if usage is None:
+            usage = sum([size for (mtime, size, path) in self._entries()])
+        else:
+            usage = max(0, usage + delta)
+        if self.max_bytes is not None and usage > self.max_bytes:
+            usage = self._evict()
+        self._write_usage(usage)
+
+    def _entries(self):
+        """Return (mtime, size, path) for every entry in the cache."""
+        entries = []
+        for shard in os.listdir(self.cache):
+            directory = os.path.join(self.cache, shard)
+            if shard.startswith('.') or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.startswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is under
+        its low water mark, and return the new total size; the lock must
+        be held."""
+        entries = self._entries()
+        entries.sort()
+        usage = sum([size for (mtime, size, path) in entries])
+        target = self.max_bytes * self.low_water
+        for (mtime, size, path) in entries:
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            usage -= size
+        return usage
+
+
+class _MemoryEntry(object):
+    __slots__ = ('value', 'size', 'stored', 'accessed', 'hits')
+
+    def __init__(self, value):
+        self.value = value
+        self.size = len(value)
+        self.stored = self.accessed = time.time()
+        self.hits = 0
+
+
+class MemoryCache(object):
+    """An in-process cache with a size limit, safe to share between
+    threads.
+
+    The least recently used entries are evicted to keep the total size of
+    the stored values under 'max_bytes'. Hit and miss counts are kept for
+    the cache as a whole and for each entry; see stats().
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # Re-inserting moves the entry to the most recently used end.
+            self._entries[key] = entry
+            entry.hits += 1
+            entry.accessed = time.time()
+            self.hits += 1
+            return entry.value
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        entry = _MemoryEntry(value)
+        self._lock.acquire()
+        try:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if self.max_bytes is not None and entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self.size += entry.size
+            while self.max_bytes is not None and self.size > self.max_bytes:
+                (old_key, old) = self._entries.popitem(last=False)
+                self.size -= old.size
+                self.evictions += 1
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self.size = 0
+        finally:
+            self._lock.release()
+
+    def stats(self, key=None):
+        """Return a dict of statistics for the whole cache or, given a
+        key, for that entry (None if it isn't cached)."""
+        self._lock.acquire()
+        try:
+            if key is None:
+                return dict(entries=len(self._entries), size=self.size,
+                            max_bytes=self.max_bytes, hits=self.hits,
+                            misses=self.misses, evictions=self.evictions)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return dict(size=entry.size, stored=entry.stored,
+                        accessed=entry.accessed, hits=entry.hits)
+        finally:
+            self._lock.release()
+
+
+class SQLiteCache(object):
+    """A cache stored in a single SQLite database file, for caches with
+    many entries and for sharing between processes.
+
+    The database runs in WAL mode, so readers don't block the writer;
+    keep it on a local disk, as WAL doesn't work over network
+    filesystems. The total size of the stored values is kept under
+    'max_bytes' by evicting the least recently used entries. If 'ttl' is
+    given, entries expire that many seconds after they are stored, and
+    expired entries are swept out in bulk every 'sweep_interval' seconds
+    or on a call to expire().
+    """
+
+    """Reads only refresh an entry's access time if it is older than
+    this many seconds, to save a write on every hit."""
+    touch_interval = 60
+
+    """Evictions trim the cache down to this fraction of max_bytes."""
+    low_water = 0.9
+
+    def __init__(self, path, max_bytes=1024 * 1024 * 1024, ttl=None,
+                 sweep_interval=600, timeout=30.0):
+        if sqlite3 is None:
+            raise ImportError('SQLiteCache requires the sqlite3 module.')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._last_sweep = time.time()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        db = self._db()
+        self._begin(db)
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                       'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                       'size INTEGER NOT NULL, accessed REAL NOT NULL, '
+                       'expires REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_accessed '
+                       'ON entries (accessed)')
+            db.execute('CREATE INDEX IF NOT EXISTS entries_expires '
+                       'ON entries (expires)')
+            # The running total of entries.size, so that enforcing the
+            # size limit doesn't need a table scan.
+            db.execute('CREATE TABLE IF NOT EXISTS usage (total INTEGER NOT NULL)')
+            if db.execute('SELECT total FROM usage').fetchone() is None:
+                db.execute('INSERT INTO usage (total) '
+                           'SELECT COALESCE(SUM(size), 0) FROM entries')
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def _db(self):
+        """Return this thread's connection, opening one if needed.
+        Connections are never shared across threads or a fork."""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout,
+                                 isolation_level=None)
+            db.text_factory = str
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _begin(self, db):
+        # Take the write lock up front, so that two writers can't both
+        # read and then deadlock trying to upgrade.
+        db.execute('BEGIN IMMEDIATE')
+
+    def get(self, key):
+        db = self._db()
+        row = db.execute('SELECT value, accessed, expires FROM entries '
+                         'WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        (value, accessed, expires) = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            return None
+        if now - accessed > self.touch_interval:
+            db.execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                       (now, key))
+        return str(value)
+
+    def set(self, key, value):
+        now = time.time()
+        expires = None
+        if self.ttl is not None:
+            expires = now + self.ttl
+        db = self._db()
+        self._begin(db)
+        try:
+            row = db.execute('SELECT size FROM entries WHERE key = ?',
+                             (key,)).fetchone()
+            db.execute('INSERT OR REPLACE INTO entries '
+                       '(key, value, size, accessed, expires) '
+                       'VALUES (?, ?, ?, ?, ?)',
+                       (key, sqlite3.Binary(value), len(value), now, expires))
+            delta = len(value) - (row and row[0] or 0)
+            db.execute('UPDATE usage SET total = total + ?', (delta,))
+            if self.ttl is not None and now - self._last_sweep > self.sweep_interval:
+                self._expire(db, now)
+            if self.max_bytes is not None:
+                self._evict(db)
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def delete(self, key):
+        db = self._db()
+        self._begin(db)
+        try:
+            row = db.execute('SELECT size FROM entries WHERE key = ?',
+                             (key,)).fetchone()
+            if row is not None:
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                db.execute('UPDATE usage SET total = total - ?', (row[0],))
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def expire(self):
+        """Remove all expired entries. Returns how many were removed."""
+        db = self._db()
+        self._begin(db)
+        try:
+            count = self._expire(db, time.time())
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+        return count
+
+    def _expire(self, db, now):
+        self._last_sweep = now
+        (count, size) = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                                   'FROM entries WHERE expires <= ?',
+                                   (now,)).fetchone()
+        if count:
+            db.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+            db.execute('UPDATE usage SET total = total - ?', (size,))
+        return count
+
+    def _evict(self, db):
+        (total,) = db.execute('SELECT total FROM usage').fetchone()
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * self.low_water
+        victims = []
+        freed = 0
+        for (key, size) in db.execute('SELECT key, size FROM entries '
+                                      'ORDER BY accessed'):
+            if freed >= excess:
+                break
+            victims.append((key,))
+            freed += size
+        db.executemany('DELETE FROM entries WHERE key = ?', victims)
+        db.execute('UPDATE usage SET total = total - ?', (freed,))
+
+    def close(self):
+        """Close this thread's connection to the database."""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
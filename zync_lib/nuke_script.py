@@ -0,0 +1,169 @@
+"""
+Headless reading of the Write nodes in a Nuke script.
+
+Lists a script's Write nodes, whether each is enabled, where it writes
+and which frames it renders, without Nuke, so a NukeJob's write_node
+can be checked before it's submitted:
+
+    for node in nuke_script.write_nodes('/proj/comp/shot.nk'):
+        print node.name, node.enabled, node.path, node.first, node.last
+
+The script is memory mapped and searched with regular expressions,
+so even very large scripts are read in milliseconds. Knobs set by
+expressions can't be worked out without Nuke: a disable expression
+counts as enabled, and a frame limit expression as no limit.
+"""
+
+import os
+import re
+import mmap
+
+from zync_lib.scene_scan import nuke_value, nuke_node_body
+
+# Node classes that render.
+WRITE_CLASSES = ('Write', 'DeepWrite')
+
+# Node classes whose contents follow them, up to an end_group.
+GROUP_CLASSES = ('Group', 'LiveGroup')
+
+# Knobs read from Write nodes and from Root.
+KNOBS = ['name', 'file', 'disable', 'use_limit', 'first', 'last', 'first_frame', 'last_frame']
+
+# Only the nodes of interest are matched; the rest are skipped by the
+# regular expression without going back to Python.
+NODE_RE = re.compile(r'''
+    ^[ \t]*(?P<node>%s)\ \{[ \t\r]*$
+    |^[ \t]*(?P<end_group>end_group)\b
+''' % ('|'.join(('Root',) + WRITE_CLASSES + GROUP_CLASSES),), re.M | re.X)
+
+KNOB_RE = re.compile(r'^[ \t]*(%s)[ \t]+([^\n]*?)[ \t\r]*$' % ('|'.join(KNOBS),), re.M)
+
+class WriteNode(object):
+    """
+    A Write node: its full name, e.g. "Group1.Write1", whether it's
+    enabled, the path it writes to as the script has it, and the first
+    and last frames it renders.
+    """
+    def __init__(self, name, node_class, enabled, path, first, last):
+        self.name = name
+        self.node_class = node_class
+        self.enabled = enabled
+        self.path = path
+        self.first = first
+        self.last = last
+
+    def __repr__(self):
+        return 'WriteNode(%r, enabled=%r, path=%r, first=%r, last=%r)' % (
+            self.name, self.enabled, self.path, self.first, self.last)
+
+    def renders(self, frame_range):
+        """
+        Returns True if the node renders any of the frames in the given
+        frange.FrameRange.
+        """
+        for start, end, step in frame_range.ranges:
+            low = max(start, self.first)
+            low += -(low - start) % step
+            if low <= min(end, self.last):
+                return True
+        return False
+
+def _int(value, default):
+    try:
+        return int(float(nuke_value(value)))
+    except ValueError:
+        return default
+
+def _parse(text):
+    """
+    Returns the Root knobs and the (class, knobs, group names) of each
+    Write node, in the order they appear.
+    """
+    root = {}
+    writes = []
+    groups = []
+    pos = 0
+    while True:
+        match = NODE_RE.search(text, pos)
+        if match is None:
+            break
+        pos = match.end()
+        if match.group('end_group') is not None:
+            if groups:
+                groups.pop()
+            continue
+        node_class = match.group('node')
+        #
+        #   The body ends at the brace that closes the node, which isn't
+        #   always the first line that's just }.
+        #
+        body, pos = nuke_node_body(text, pos)
+        knobs = {}
+        for knob, value in KNOB_RE.findall(body):
+            knobs.setdefault(knob, value)
+        if node_class == 'Root':
+            root = knobs
+        elif node_class in GROUP_CLASSES:
+            #
+            #   The group's nodes follow it, up to its end_group.
+            #
+            groups.append(nuke_value(knobs.get('name', node_class)))
+        else:
+            writes.append((node_class, knobs, list(groups)))
+    return root, writes
+
+def write_nodes(path):
+    """
+    Returns the Write nodes in the Nuke script at path, in the order
+    they appear.
+    """
+    f = open(path, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            root, writes = _parse(text)
+        finally:
+            text.close()
+    finally:
+        f.close()
+    first_frame = _int(root.get('first_frame', '1'), 1)
+    last_frame = _int(root.get('last_frame', '100'), 100)
+    nodes = []
+    for node_class, knobs, groups in writes:
+        name = nuke_value(knobs.get('name', node_class))
+        first, last = first_frame, last_frame
+        if nuke_value(knobs.get('use_limit', 'false')) == 'true':
+            first = _int(knobs.get('first', str(first)), first)
+            last = _int(knobs.get('last', str(last)), last)
+        nodes.append(WriteNode('.'.join(groups + [name]), node_class,
+            nuke_value(knobs.get('disable', 'false')) != 'true',
+            nuke_value(knobs.get('file', '')), first, last))
+    return nodes
+
+def resolve(path, write_name='All', frame_range=None):
+    """
+    Returns the Write nodes that rendering write_name, a node's full name
+    or 'All', will use. Raises ValueError if there's no such node, it's
+    disabled, or, given a frange.FrameRange, it renders none of its
+    frames; for 'All', if no enabled node renders any of them.
+    """
+    nodes = write_nodes(path)
+    if write_name == 'All':
+        nodes = [node for node in nodes if node.enabled]
+        if not nodes:
+            raise ValueError('No enabled Write nodes in "%s".' % (path,))
+    else:
+        nodes = [node for node in nodes if node.name == write_name]
+        if not nodes:
+            raise ValueError('No Write node "%s" in "%s".' % (write_name, path))
+        if not nodes[0].enabled:
+            raise ValueError('Write node "%s" is disabled.' % (write_name,))
+    if frame_range is not None:
+        nodes = [node for node in nodes if node.renders(frame_range)]
+        if not nodes:
+            raise ValueError('%s renders none of frames %s.' % (
+                'No enabled Write node' if write_name == 'All' else 'Write node "%s"' % (write_name,),
+                frame_range))
+    return nodes
@@ -0,0 +1,160 @@
+"""
+Render capacity planning.
+
+Recommends the instance_type, num_instances and chunk_size for a job,
+given its frame range, an estimate of how long a frame takes to render
+and the instance types from Zync.get_instance_types():
+
+    plan = planner.plan('1-240', 90, z.INSTANCE_TYPES, deadline=3600)
+    z.submit_job('maya', scene, plan.apply(params))
+
+The job is modelled as its tasks (see frange.FrameRange.chunks) handed
+out, longest first, to whichever instance is free soonest. Every
+instance pays start_up seconds before its first task and every task
+pays task_overhead seconds, e.g. to load the scene, on top of its
+frames.
+"""
+
+from zync_lib import frange
+
+# The chunk sizes tried when none are given.
+CHUNK_SIZES = (1, 2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 25, 30, 40, 50, 75, 100)
+
+class Plan(object):
+    """
+    A recommended job configuration and what it is expected to take.
+    wall_time is in seconds; cost is in the units of the instance types'
+    hourly cost.
+    """
+    def __init__(self, instance_type, num_instances, chunk_size, wall_time, cost):
+        self.instance_type = instance_type
+        self.num_instances = num_instances
+        self.chunk_size = chunk_size
+        self.wall_time = wall_time
+        self.cost = cost
+
+    def __repr__(self):
+        return 'Plan(%r, num_instances=%d, chunk_size=%d, wall_time=%.0f, cost=%.2f)' % (
+            self.instance_type, self.num_instances, self.chunk_size, self.wall_time, self.cost)
+
+    def apply(self, params):
+        """
+        Sets instance_type, num_instances and chunk_size in the given
+        submit params dict, and returns it.
+        """
+        params['instance_type'] = self.instance_type
+        params['num_instances'] = self.num_instances
+        params['chunk_size'] = self.chunk_size
+        return params
+
+def _tasks(frames, chunk_size):
+    """
+    Returns the job's tasks as (frame count, number of tasks) pairs,
+    largest first. All but the short tasks, a range's last chunk or the
+    frames of a stepped range, render chunk_size frames.
+    """
+    counts = {}
+    full = frames.num_chunks(chunk_size)
+    for start, end, step in frames.ranges:
+        if step > 1:
+            size, number = 1, (end - start) // step + 1
+        else:
+            size, number = (end - start + 1) % chunk_size, 1
+        if 0 < size < chunk_size:
+            counts[size] = counts.get(size, 0) + number
+            full -= number
+    if full:
+        counts[chunk_size] = full
+    return sorted(counts.items(), reverse=True)
+
+def _finish_time(tasks, num_instances):
+    """
+    Returns when the last of num_instances instances finishes, if each
+    of the (duration, count) tasks, longest first, goes to the instance
+    that is free soonest. Instance loads are kept as a dict of load to
+    number of instances, since they take few distinct values.
+    """
+    loads = {0.0: num_instances}
+    for duration, count in tasks:
+        while count:
+            low = min(loads)
+            if len(loads) == 1 and count >= num_instances:
+                #
+                #   All the instances are level; give each a share.
+                #
+                rounds = count // num_instances
+                loads = {low + rounds * duration: num_instances}
+                count -= rounds * num_instances
+                continue
+            take = min(loads[low], count)
+            if take == loads[low]:
+                del loads[low]
+            else:
+                loads[low] -= take
+            loads[low + duration] = loads.get(low + duration, 0) + take
+            count -= take
+    return max(loads)
+
+def plan(frame_range, frame_time, instance_types, step=1, deadline=None,
+         max_instances=10, start_up=300.0, task_overhead=30.0, chunk_sizes=CHUNK_SIZES):
+    """
+    Returns the Plan that finishes soonest, or with a deadline in
+    seconds, the cheapest Plan that meets it (the fastest if none do).
+
+    frame_range is a frange expression or FrameRange. frame_time is the
+    seconds one frame takes to render, or a dict of that by instance
+    type; types missing from it aren't considered. instance_types is a
+    dict of instance type to its details, including its hourly 'cost',
+    as returned by Zync.get_instance_types(). Raises ValueError if
+    there are no frames or no instance types to plan with.
+    """
+    if not isinstance(frame_range, frange.FrameRange):
+        frame_range = frange.FrameRange(frame_range, step)
+    if not len(frame_range):
+        raise ValueError('No frames to render.')
+    if isinstance(frame_time, dict) and not set(frame_time) & set(instance_types):
+        raise ValueError('Unknown instance types in frame_time: %s.' % (
+            ', '.join(sorted(map(str, frame_time))) or 'none given',))
+    if not instance_types:
+        raise ValueError('No instance types to plan with.')
+    if any(range_step > 1 for start, end, range_step in frame_range.ranges):
+        #
+        #   ZYNC renders stepped ranges a frame per task.
+        #
+        chunk_sizes = (1,)
+
+    best = None
+    for chunk_size in sorted(set(chunk_sizes)):
+        if chunk_size > len(frame_range) and chunk_size != min(chunk_sizes):
+            continue
+        chunks = _tasks(frame_range, chunk_size)
+        num_tasks = frame_range.num_chunks(chunk_size)
+        for instance_type, details in instance_types.items():
+            if isinstance(frame_time, dict):
+                if instance_type not in frame_time:
+                    continue
+                seconds = float(frame_time[instance_type])
+            else:
+                seconds = float(frame_time)
+            hourly_cost = float(details.get('cost', 0) or 0)
+            tasks = [(size * seconds + task_overhead, count) for size, count in chunks]
+            busy_time = sum(duration * count for duration, count in tasks)
+            for num_instances in range(1, min(max_instances, num_tasks) + 1):
+                wall_time = start_up + _finish_time(tasks, num_instances)
+                cost = (busy_time + start_up * num_instances) * hourly_cost / 3600.0
+                candidate = Plan(instance_type, num_instances, chunk_size, wall_time, cost)
+                if best is None or _better(candidate, best, deadline):
+                    best = candidate
+    return best
+
+def _better(a, b, deadline):
+    """
+    Returns True if Plan a is preferable to Plan b.
+    """
+    if deadline is not None:
+        a_meets, b_meets = a.wall_time <= deadline, b.wall_time <= deadline
+        if a_meets != b_meets:
+            return a_meets
+        if a_meets:
+            return (a.cost, a.wall_time, a.num_instances) < (b.cost, b.wall_time, b.num_instances)
+    return (a.wall_time, a.cost, a.num_instances) < (b.wall_time, b.cost, b.num_instances)
@@ -0,0 +1,390 @@
+"""
+Headless dependency scanning of Maya ASCII (.ma), Nuke (.nk) and Arnold
+(.ass) files.
+
+Finds the files a scene reads, such as textures, caches, plates and
+referenced scenes, without opening it in Maya or Nuke, so a job's
+scene_info['files'] can be put together on machines without them:
+
+    found = scene_scan.scan(['/proj/scenes/shot.ma'])
+    files = sorted(set(path for refs in found.values() for path in refs or []))
+
+Each file is memory mapped and searched with regular expressions,
+files are scanned in parallel, and with a cache_path the results are
+remembered against each file's size and modification time.
+
+Paths are returned as the scene has them, including frame number
+patterns like #### or %04d, except that relative Nuke paths are joined
+to the script's project_directory when it has one. Paths built by
+TCL expressions can't be worked out without Nuke, and are skipped.
+"""
+
+import os
+import re
+import sys
+import fnmatch
+import json
+import mmap
+import tempfile
+import multiprocessing
+import multiprocessing.pool
+
+# Maya attributes holding a file path, by short and long name: file
+# textures, image planes, Alembic caches, Arnold stand-ins and GPU caches.
+MAYA_PATH_ATTRIBUTES = ['ftn', 'fileTextureName', 'imn', 'imageName', 'fn', 'filename',
+                        'fileName', 'dso', 'cfn', 'cacheFileName']
+
+# Nuke knobs holding a file path.
+NUKE_PATH_KNOBS = ['file', 'proxy', 'vfield_file', 'font']
+
+_QUOTED = r'"(?:[^"\\]|\\.)*"'
+
+# A MEL string: quoted strings joined with +, possibly in parentheses.
+_MEL_STRING = r'%s(?:\s*\+\s*%s)*' % (_QUOTED, _QUOTED)
+
+MAYA_RE = re.compile(r'''
+    ^[ \t]*setAttr\s+"\.(?:%s)"\s+-type\s+"string"\s+
+        (?P<value>%s|\(\s*%s\s*\))\s*;
+    |^file(?P<args>(?:\s+(?:%s|[^\s";]+))*)\s*;
+''' % ('|'.join(MAYA_PATH_ATTRIBUTES), _MEL_STRING, _MEL_STRING, _QUOTED), re.M | re.X)
+
+MAYA_TOKEN_RE = re.compile(r'%s|[^\s";]+' % (_QUOTED,))
+
+NUKE_NODE_RE = re.compile(r'^[ \t]*(\w+)\ \{[ \t\r]*$', re.M)
+
+NUKE_KNOB_RE = re.compile(r'^[ \t]*(%s|project_directory)[ \t]+([^\n]*?)[ \t\r]*$' % (
+    '|'.join(NUKE_PATH_KNOBS),), re.M)
+
+# What a Nuke node's braces are counted from: escaped characters,
+# braces and quotes.
+NUKE_BODY_RE = re.compile(r'\\.|[{}"]')
+
+NUKE_QUOTED_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+
+# Arnold parameters holding a file path: image and MayaFile textures,
+# procedurals and volumes.
+ASS_PATH_PARAMETERS = ['filename', 'dso']
+
+ASS_RE = re.compile(r'''
+    ^[ \t]*(?P<node>\w+)\s*\{
+    |^[ \t]*(?:%s)[ \t]+"(?P<value>[^"\n]*)"
+''' % ('|'.join(ASS_PATH_PARAMETERS),), re.M | re.X)
+
+# Ways of saying "the script's directory" in a Nuke project_directory.
+NUKE_SCRIPT_DIRECTORY = ['[python {nuke.script_directory()}]',
+                         '[file dirname [value root.name]]']
+
+def _unescape(value):
+    return re.sub(r'\\(.)', lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)), value)
+
+def _maya_string(value):
+    """
+    Returns the MEL string in value, which may be several quoted strings
+    joined with +, in parentheses or not.
+    """
+    return ''.join(_unescape(quoted[1:-1]) for quoted in re.findall(_QUOTED, value))
+
+def _scan_maya(path, text):
+    refs = []
+    for match in MAYA_RE.finditer(text):
+        if match.group('value') is not None:
+            refs.append(_maya_string(match.group('value')))
+            continue
+        #
+        #   A file command; references are loaded with -r, or -rdi for
+        #   nested references, and the path is the last argument.
+        #
+        args = MAYA_TOKEN_RE.findall(match.group('args'))
+        if args and ('-r' in args or '-rdi' in args) and args[-1].startswith('"'):
+            refs.append(_maya_string(args[-1]))
+    return refs
+
+def nuke_value(value):
+    """
+    Returns the knob value as a string. Nuke saves expressions with
+    their brackets escaped, as \[, so any [ means one.
+    """
+    if value.startswith('{') and value.endswith('}'):
+        value = value[1:-1]
+    elif value.startswith('"') and value.endswith('"') and len(value) > 1:
+        value = _unescape(value[1:-1])
+    return value
+
+def nuke_node_body(text, pos):
+    """
+    Returns the body of the Nuke node whose opening brace ends just
+    before pos, and where the node ends. Braces are counted, so a line
+    that's just } inside a knob value spanning several lines, such as a
+    script, doesn't end the node. Only the first line of such a value
+    is kept, so lines inside it aren't taken for knobs.
+    """
+    depth = 1
+    body = []
+    start = pos
+    while True:
+        match = NUKE_BODY_RE.search(text, pos)
+        if match is None:
+            body.append(text[start:])
+            return ''.join(body), len(text)
+        pos = match.end()
+        token = match.group()
+        if token == '"':
+            #
+            #   Quotes only mean something outside braces.
+            #
+            if depth == 1:
+                quoted = NUKE_QUOTED_RE.match(text, match.start())
+                if quoted is not None:
+                    pos = quoted.end()
+        elif token == '{':
+            if depth == 1:
+                opened = match.start()
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                body.append(text[start:match.start()])
+                return ''.join(body), pos
+            if depth == 1:
+                newline = text.find('\n', opened, match.start())
+                if newline != -1:
+                    body.append(text[start:newline])
+                    start = pos
+
+def _nuke_nodes(text):
+    """
+    Yields the class and body of each node in a Nuke script, in the
+    order they appear.
+    """
+    pos = 0
+    while True:
+        match = NUKE_NODE_RE.search(text, pos)
+        if match is None:
+            return
+        body, pos = nuke_node_body(text, match.end())
+        yield match.group(1), body
+
+def _scan_nuke(path, text):
+    refs = []
+    project_directory = None
+    for node, body in _nuke_nodes(text):
+        for knob, value in NUKE_KNOB_RE.findall(body):
+            if knob == 'project_directory':
+                if node == 'Root':
+                    value = nuke_value(value)
+                    if value in NUKE_SCRIPT_DIRECTORY:
+                        value = os.path.dirname(path)
+                    if '[' not in value:
+                        project_directory = value
+                continue
+            if node == 'Root' or node.startswith('Write') or node == 'DeepWrite':
+                #
+                #   Write nodes' files are outputs, not dependencies.
+                #
+                continue
+            value = nuke_value(value)
+            if value and '[' not in value:
+                refs.append(value)
+    if project_directory:
+        refs = [os.path.join(project_directory, ref) for ref in refs]
+    return refs
+
+def _scan_ass(path, text):
+    refs = []
+    node = None
+    for match in ASS_RE.finditer(text):
+        if match.group('node') is not None:
+            node = match.group('node')
+        elif match.group('value') and not (node or '').startswith('driver_'):
+            #
+            #   Drivers' filenames are outputs.
+            #
+            refs.append(match.group('value'))
+    return refs
+
+SCANNERS = {'.ma': _scan_maya, '.nk': _scan_nuke, '.ass': _scan_ass}
+
+def expand(pattern):
+    """
+    Returns the files matching a wildcard path, like
+    "/path/to/scene.*.ass", in order, from one listing of the directory.
+    A path without a wildcard is returned as it is, if it exists.
+    """
+    directory, name = os.path.split(pattern)
+    if not any(c in name for c in '*?['):
+        return [pattern] if os.path.exists(pattern) else []
+    try:
+        names = os.listdir(directory or '.')
+    except OSError:
+        return []
+    return [os.path.join(directory, match) for match in sorted(fnmatch.filter(names, name))]
+
+def scan_file(path):
+    """
+    Returns the files referenced by the scene file at path, in the order
+    they first appear.
+    """
+    scanner = SCANNERS.get(os.path.splitext(path)[1].lower())
+    if scanner is None:
+        raise ValueError('Can\'t scan "%s", only %s files.' % (path, ', '.join(sorted(SCANNERS))))
+    f = open(path, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            refs = scanner(path, text)
+        finally:
+            text.close()
+    finally:
+        f.close()
+    seen = set()
+    return [ref for ref in refs if not (ref in seen or seen.add(ref))]
+
+def _use_processes():
+    """
+    Returns False when running inside an application such as Maya or
+    Nuke, rather than a Python interpreter, as multiprocessing would
+    start new copies of the application on Windows.
+    """
+    return os.path.basename(sys.executable).lower().startswith('python')
+
+def _text(value):
+    """
+    Returns value as unicode, as JSON gives it back.
+    """
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+def _scan_entry(entry):
+    path, size, mtime = entry
+    try:
+        return path, size, mtime, scan_file(path)
+    except (IOError, OSError):
+        #
+        #   Deleted or made unreadable since it was listed.
+        #
+        return path, size, mtime, None
+
+def _load_cache(cache_path):
+    try:
+        f = open(os.path.expanduser(cache_path), 'rb')
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _save_cache(cache_path, cache):
+    """
+    Writes the cache, replacing the old one in one step.
+    """
+    cache_path = os.path.expanduser(cache_path)
+    directory = os.path.dirname(cache_path) or '.'
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        f = os.fdopen(fd, 'wb')
+        try:
+            json.dump(cache, f)
+        finally:
+            f.close()
+        if os.name == 'nt' and os.path.exists(cache_path):
+            os.remove(cache_path)
+        os.rename(temp, cache_path)
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def scan(paths, cache_path=None, workers=None, processes=None, recursive=True):
+    """
+    Scans the given scene files and returns a dict of each to the list
+    of files it references, or None if it's missing or can't be read.
+    With recursive, referenced scenes that exist are scanned too, and
+    included in the result.
+
+    cache_path is a JSON file of earlier results; files whose size and
+    modification time haven't changed aren't scanned again.
+
+    Scanning is CPU bound, so a process pool is used, with a process per
+    CPU, unless processes is False or, by default, when running inside
+    Maya or Nuke, where threads are used instead.
+    """
+    cache = {}
+    if cache_path:
+        cache = _load_cache(cache_path)
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if processes is None:
+        processes = _use_processes()
+    results = {}
+    pool = None
+    try:
+        pending = list(paths)
+        while pending:
+            todo = []
+            for path in set(pending):
+                if path in results:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    results[path] = None
+                    continue
+                cached = cache.get(_text(path))
+                if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+                    if isinstance(path, str):
+                        results[path] = [ref.encode('utf-8') for ref in cached[2]]
+                    else:
+                        results[path] = cached[2]
+                else:
+                    todo.append((path, stat.st_size, stat.st_mtime))
+            if len(todo) > 1 and pool is None:
+                if processes:
+                    pool = multiprocessing.Pool(workers)
+                else:
+                    pool = multiprocessing.pool.ThreadPool(workers)
+            if pool is not None:
+                scanned = pool.imap_unordered(_scan_entry, todo,
+                    max(1, len(todo) // (workers * 4)))
+            else:
+                scanned = map(_scan_entry, todo)
+            for path, size, mtime, refs in scanned:
+                results[path] = refs
+                if refs is not None:
+                    cache[_text(path)] = [size, mtime, [_text(ref) for ref in refs]]
+            if cache_path and todo:
+                _save_cache(cache_path, cache)
+            pending = []
+            if recursive:
+                for refs in filter(None, results.values()):
+                    pending.extend(ref for ref in refs if ref not in results
+                        and os.path.splitext(ref)[1].lower() in SCANNERS and os.path.isfile(ref))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results
+
+def dependencies(paths, **kwargs):
+    """
+    Returns the files the given scenes need, including the scenes they
+    reference, without duplicates. Takes the same arguments as scan().
+    Scenes that are missing are skipped.
+    """
+    found = scan(paths, **kwargs)
+    seen = set(paths)
+    files = []
+    for path in paths:
+        pending = [path]
+        while pending:
+            for ref in found.get(pending.pop(0)) or []:
+                if ref not in seen:
+                    seen.add(ref)
+                    files.append(ref)
+                    pending.append(ref)
+    return files
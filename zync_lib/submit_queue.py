@@ -0,0 +1,400 @@
+"""
+A durable local queue of ZYNC submissions and job controls.
+
+Lets a Maya or Nuke session hand work off in milliseconds, whether or
+not ZYNC is reachable, and have it sent by a background worker process:
+
+    queue = submit_queue.SubmitQueue()
+    op_id = queue.submit_job('nuke', '/proj/comp/shot.nk', 'All', params)
+    queue.start_worker('script_name', 'token', username='me', password='...')
+    ...
+    print queue.get(op_id)['state']
+
+Operations are kept in a SQLite database and sent in the order they
+were queued, one at a time per site, so e.g. a pause queued after a
+resume is never sent before it. While ZYNC can't be reached, or answers
+with a 5xx or 429 status, the operation at the head of the queue is
+retried with exponential backoff, and everything behind it waits; an
+error from ZYNC itself, such as a rejected submission, fails that
+operation and the queue moves on.
+
+The worker's credentials are handed to it on its stdin, and are never
+written to the database. Submissions aren't idempotent: if the
+connection drops after ZYNC has accepted one, it may be sent twice.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+DEFAULT_PATH = '~/.zync/submit_queue.db'
+
+# The Zync and Job methods that can be queued.
+OPERATIONS = ('submit_job', 'set_status', 'cancel', 'resume', 'pause', 'unpause', 'restart', 'retry')
+
+# A worker that hasn't checked in for this many seconds is taken to have
+# died.
+HEARTBEAT_TIMEOUT = 30.0
+
+class SubmitQueue(object):
+    """
+    The queue in the SQLite database at path. Operations are queued for
+    the ZYNC site at url, ZYNC_URL from config.py by default.
+
+    The database runs in WAL mode, so keep it on a local disk.
+    """
+    def __init__(self, path=DEFAULT_PATH, url=None, timeout=30.0):
+        if sqlite3 is None:
+            raise ImportError('SubmitQueue requires the sqlite3 module.')
+        if url is None:
+            import zync
+            zync.load_config()
+            url = zync.ZYNC_URL
+        self.path = os.path.expanduser(path)
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        db = self._db()
+        self._begin(db)
+        try:
+            db.execute('CREATE TABLE IF NOT EXISTS operations ('
+                       'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                       'url TEXT NOT NULL, method TEXT NOT NULL, args TEXT NOT NULL, '
+                       'state TEXT NOT NULL, attempts INTEGER NOT NULL, '
+                       'not_before REAL NOT NULL, result TEXT, error TEXT, '
+                       'created REAL NOT NULL, updated REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS operations_url_state '
+                       'ON operations (url, state, id)')
+            db.execute('CREATE TABLE IF NOT EXISTS workers ('
+                       'url TEXT PRIMARY KEY, pid INTEGER NOT NULL, heartbeat REAL NOT NULL)')
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def _db(self):
+        """
+        Returns this thread's connection, opening one if needed.
+        """
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _begin(self, db):
+        db.execute('BEGIN IMMEDIATE')
+
+    def put(self, method, args=(), kwargs=None):
+        """
+        Queues a call of the named method, one of OPERATIONS, with the
+        given arguments, which must be JSON serializable. Returns the
+        operation's id.
+        """
+        if method not in OPERATIONS:
+            raise ValueError('Can\'t queue "%s".' % (method,))
+        now = time.time()
+        data = json.dumps({'args': list(args), 'kwargs': kwargs or {}})
+        cursor = self._db().execute('INSERT INTO operations '
+            '(url, method, args, state, attempts, not_before, created, updated) '
+            'VALUES (?, ?, ?, ?, 0, ?, ?, ?)', (self.url, method, data, 'pending', now, now, now))
+        return cursor.lastrowid
+
+    def submit_job(self, job_type, *args, **kwargs):
+        """
+        Queues a Zync.submit_job() call.
+        """
+        return self.put('submit_job', (job_type,) + args, kwargs)
+
+    def set_status(self, job_id, status):
+        """
+        Queues a Job.set_status() call.
+        """
+        return self.put('set_status', (job_id, status))
+
+    def cancel(self, job_id):
+        return self.put('cancel', (job_id,))
+
+    def resume(self, job_id):
+        return self.put('resume', (job_id,))
+
+    def pause(self, job_id):
+        return self.put('pause', (job_id,))
+
+    def unpause(self, job_id):
+        return self.put('unpause', (job_id,))
+
+    def restart(self, job_id):
+        return self.put('restart', (job_id,))
+
+    def retry(self, job_id):
+        return self.put('retry', (job_id,))
+
+    def _row(self, row):
+        (op_id, method, state, attempts, result, error) = row
+        return {'id': op_id, 'method': method, 'state': state, 'attempts': attempts,
+                'result': result and json.loads(result), 'error': error}
+
+    def get(self, op_id):
+        """
+        Returns a dict of the operation's id, method, state ('pending',
+        'running', 'done' or 'failed'), attempts so far, and its result
+        or last error, or None if there's no such operation.
+        """
+        row = self._db().execute('SELECT id, method, state, attempts, result, error '
+                                 'FROM operations WHERE id = ?', (op_id,)).fetchone()
+        return row and self._row(row)
+
+    def pending(self):
+        """
+        Returns the operations for this queue's site that haven't been
+        sent yet, in the order they will be, as get() does.
+        """
+        return [self._row(row) for row in self._db().execute(
+            'SELECT id, method, state, attempts, result, error FROM operations '
+            'WHERE url = ? AND state IN (?, ?) ORDER BY id', (self.url, 'pending', 'running'))]
+
+    def purge(self, age=7 * 24 * 3600):
+        """
+        Removes finished operations older than age seconds. Returns how
+        many were removed.
+        """
+        return self._db().execute('DELETE FROM operations WHERE state IN (?, ?) AND updated < ?',
+                                  ('done', 'failed', time.time() - age)).rowcount
+
+    def claim(self, lease=300.0):
+        """
+        Takes the operation at the head of this site's queue, and marks
+        it running for lease seconds, after which another worker may take
+        it. Returns the (id, method, args, kwargs) of the operation and
+        None, or None and how many seconds to wait before trying again,
+        which is None if the queue is empty.
+        """
+        now = time.time()
+        db = self._db()
+        self._begin(db)
+        try:
+            row = db.execute('SELECT id, method, args, not_before FROM operations '
+                             'WHERE url = ? AND state IN (?, ?) ORDER BY id LIMIT 1',
+                             (self.url, 'pending', 'running')).fetchone()
+            if row is None or row[3] > now:
+                db.execute('COMMIT')
+                return None, row and row[3] - now
+            (op_id, method, data, not_before) = row
+            db.execute('UPDATE operations SET state = ?, attempts = attempts + 1, '
+                       'not_before = ?, updated = ? WHERE id = ?', ('running', now + lease, now, op_id))
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+        data = json.loads(data)
+        return (op_id, method, data['args'], data['kwargs']), None
+
+    def finish(self, op_id, result=None, error=None, retry_in=None):
+        """
+        Records the outcome of a claimed operation: done with result, or
+        failed with error, or, with retry_in, sent back to the head of
+        the queue to be tried again in that many seconds.
+        """
+        now = time.time()
+        if retry_in is not None:
+            state, not_before = 'pending', now + retry_in
+        else:
+            state, not_before = error is None and 'done' or 'failed', now
+        self._db().execute('UPDATE operations SET state = ?, not_before = ?, result = ?, '
+                           'error = ?, updated = ? WHERE id = ?',
+                           (state, not_before, json.dumps(result, default=str), error, now, op_id))
+
+    def heartbeat(self):
+        self._db().execute('INSERT OR REPLACE INTO workers (url, pid, heartbeat) VALUES (?, ?, ?)',
+                           (self.url, os.getpid(), time.time()))
+
+    def worker_running(self):
+        """
+        Returns True if a worker for this site has checked in recently.
+        """
+        row = self._db().execute('SELECT heartbeat FROM workers WHERE url = ?', (self.url,)).fetchone()
+        return row is not None and time.time() - row[0] < HEARTBEAT_TIMEOUT
+
+    def start_worker(self, script_name, token, username=None, password=None,
+                     python=None, idle_timeout=60.0):
+        """
+        Starts a worker process to send this site's queued operations,
+        unless one is running already, and returns its subprocess.Popen,
+        or None. The worker exits once the queue has been empty for
+        idle_timeout seconds.
+
+        python is the interpreter to run it with. Inside Maya or Nuke,
+        whose sys.executable is the application, pass e.g. mayapy's path.
+        """
+        import subprocess
+        if self.worker_running():
+            return None
+        if python is None:
+            python = sys.executable
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([root] + filter(None, [env.get('PYTHONPATH')]))
+        process = subprocess.Popen([python, '-m', 'zync_lib.submit_queue', self.path, self.url,
+                                    str(idle_timeout)], stdin=subprocess.PIPE, env=env, close_fds=os.name != 'nt')
+        process.stdin.write(json.dumps({'script_name': script_name, 'token': token,
+                                        'username': username, 'password': password}))
+        process.stdin.close()
+        return process
+
+    def close(self):
+        """
+        Closes this thread's connection to the database.
+        """
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+class Worker(object):
+    """
+    Sends the operations in a SubmitQueue to its site, as the given
+    ZYNC user.
+    """
+
+    # Seconds to wait before the first retry; each retry after that
+    # waits twice as long, up to max_delay.
+    base_delay = 2.0
+    max_delay = 300.0
+
+    def __init__(self, queue, script_name, token, username=None, password=None, timeout=10.0):
+        self.queue = queue
+        self.script_name = script_name
+        self.token = token
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.zync = None
+        self._failures = 0
+
+    def _connect(self):
+        import zync
+        if self.zync is None:
+            try:
+                z = zync.Zync(self.script_name, self.token, timeout=self.timeout, url=self.queue.url)
+            except ValueError, e:
+                #
+                #   Nothing but ZYNC's responses is parsed here, so it sent
+                #   something other than JSON, e.g. a proxy's error page.
+                #
+                raise zync.ZyncConnectionError('Unreadable response from ZYNC: %s' % (e,))
+            if self.username:
+                z.login(username=self.username, password=self.password)
+            self.zync = z
+        return self.zync
+
+    def _call(self, method, args, kwargs):
+        import zync
+        z = self._connect()
+        if method == 'submit_job':
+            return z.submit_job(*args, **kwargs)
+        job = zync.Job(z.cookie, z.url, validate=z.validate, http=z.http)
+        resp, content = getattr(job, method)(*args, **kwargs)
+        if resp.status >= 400:
+            raise zync.ZyncError('HTTP %d %s' % (resp.status, resp.reason), status=resp.status)
+        try:
+            response = zync.load_json(content)
+        except ValueError:
+            return content
+        if isinstance(response, dict) and response.get('code', 0) != 0:
+            raise zync.ZyncError(response.get('response'), status=resp.status)
+        return response
+
+    def _transient(self, error):
+        """
+        Returns True for errors that mean ZYNC couldn't be reached, or was
+        too busy to answer, and the operation should be tried again: a
+        ZyncError for a 5xx or 429 status, or a connection failure.
+        """
+        import socket
+        import httplib
+        import zync
+        import zync_lib.httplib2
+        status = getattr(error, 'status', None)
+        if isinstance(error, zync.ZyncError) and status is not None and (status >= 500 or status == 429):
+            return True
+        return isinstance(error, (zync.ZyncConnectionError, socket.error, httplib.HTTPException,
+                                  zync_lib.httplib2.ServerNotFoundError))
+
+    def run_once(self):
+        """
+        Sends the operation at the head of the queue, if it's due.
+        Returns how many seconds to wait before calling again: 0 if an
+        operation was sent, or None if the queue is empty.
+        """
+        operation, wait = self.queue.claim()
+        if operation is None:
+            return wait
+        op_id, method, args, kwargs = operation
+        try:
+            result = self._call(method, args, kwargs)
+        except Exception, e:
+            if self._transient(e):
+                #
+                #   Reconnect next time, and back off, with some jitter
+                #   so workers for different sites don't retry in step.
+                #
+                self.zync = None
+                delay = min(self.max_delay, self.base_delay * 2 ** self._failures)
+                self._failures += 1
+                self.queue.finish(op_id, error=str(e), retry_in=delay * random.uniform(0.5, 1.0))
+            else:
+                self.queue.finish(op_id, error='%s: %s' % (type(e).__name__, e))
+        else:
+            self._failures = 0
+            self.queue.finish(op_id, result=result)
+        return 0
+
+    def run(self, idle_timeout=60.0, poll_interval=1.0):
+        """
+        Sends operations as they're queued, until the queue has been
+        empty for idle_timeout seconds.
+        """
+        idle_since = time.time()
+        while True:
+            self.queue.heartbeat()
+            wait = self.run_once()
+            if wait == 0:
+                idle_since = time.time()
+                continue
+            if wait is None:
+                if time.time() - idle_since >= idle_timeout:
+                    return
+                wait = poll_interval
+            else:
+                idle_since = time.time()
+            time.sleep(min(wait, poll_interval * 10))
+
+def main(argv=None):
+    """
+    Runs a worker: the arguments are the queue's path, the site URL and
+    the idle timeout, and the credentials are read as JSON from stdin.
+    """
+    argv = argv or sys.argv[1:]
+    path, url, idle_timeout = argv[0], argv[1], float(argv[2])
+    credentials = json.load(sys.stdin)
+    queue = SubmitQueue(path, url=url)
+    worker = Worker(queue, credentials['script_name'], credentials['token'],
+                    username=credentials.get('username'), password=credentials.get('password'))
+    worker.run(idle_timeout=idle_timeout)
+
+if __name__ == '__main__':
+    main()